@@ -1,24 +1,45 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException, BackgroundTasks
+from fastapi import FastAPI, UploadFile, File, HTTPException, BackgroundTasks, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 import os
+import hashlib
 import tempfile
 import uuid
+from contextlib import asynccontextmanager
 from services.storage import get_storage_service
 from services.database import get_db_service
-from services.tasks import process_file_task
-from pdf_service.cache_manager import get_file_hash
+from services.results import get_pages, get_tables
+from services.storage_gc import GC_ENABLED, Sweeper, get_access_tracker
+from services.jobs import process_file, run_local_job
+from services.routing import classify_job
+from services.executor import LocalJobExecutor, QueueFullError, LOCAL_WORKERS
+from services.leases import new_lease, worker_id, LEASE_QUEUE_TTL_SECONDS
+from services.search import get_search_index
+from services.http_cache import result_etag, etag_matches, cache_headers, is_versioned
 import uvicorn
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse
+from starlette.background import BackgroundTask
+from starlette.concurrency import run_in_threadpool
 from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
 from slowapi.middleware import SlowAPIMiddleware
 
+@asynccontextmanager
+async def lifespan(app):
+    # Background services start with the server (not at import, so tests/CLIs stay quiet)
+    if GC_ENABLED:
+        gc_sweeper.start()
+    yield
+    gc_sweeper.stop()
+    if local_executor is not None:
+        local_executor.shutdown()
+
 limiter = Limiter(key_func=get_remote_address)
-app = FastAPI(title="AIKosh Harmonizer – Commercial API")
+app = FastAPI(title="AIKosh Harmonizer – Commercial API", lifespan=lifespan)
 app.state.limiter = limiter
 app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
 app.add_middleware(SlowAPIMiddleware)
@@ -32,6 +53,9 @@ async def add_request_id(request, call_next):
     response.headers["X-Request-ID"] = request_id
     return response
 
+# Negotiated response compression (Accept-Encoding: gzip) for large JSON bodies
+app.add_middleware(GZipMiddleware, minimum_size=int(os.getenv("GZIP_MIN_BYTES", "1024")))
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -43,11 +67,25 @@ app.add_middleware(
 # Initialize Services
 storage = get_storage_service()
 db = get_db_service()
+access_tracker = get_access_tracker()
+gc_sweeper = Sweeper(storage, db, access_tracker)
+
+def _local_job_failed(args, exc):
+    # Covers worker crashes (e.g. OOM kill) where the task never got to write its own error
+    file_hash = args[0]
+    record = db.get_metadata(file_hash)
+    if not record or record.get("status") == "processing":
+        db.save_metadata(file_hash, {"file_hash": file_hash, "status": "error", "error_message": f"Worker failed: {exc}"})
+
+local_executor = LocalJobExecutor(on_failure=_local_job_failed) if LOCAL_WORKERS > 0 else None
 
 # Config (Render: set MAX_UPLOAD_MB if needed; free tier often allows ~25MB request body)
 MAX_UPLOAD_MB = int(os.getenv("MAX_UPLOAD_MB", "25"))
 MAX_UPLOAD_BYTES = MAX_UPLOAD_MB * 1024 * 1024
 USE_CELERY = os.getenv("USE_CELERY", "false").lower() == "true"
+if USE_CELERY:
+    # Celery and the broker client load only when jobs are dispatched through them
+    from services.tasks import dispatch_file_task, dispatch_pdf_pipeline
 OUTPUT_DIR = "outputs"
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 
@@ -65,6 +103,8 @@ def health_check():
         "message": "Service is healthy",
         "mode": "Async" if USE_CELERY else "Sync",
         "max_upload_mb": MAX_UPLOAD_MB,
+        "storage_gc": gc_sweeper.last_stats if GC_ENABLED else "disabled",
+        "local_queue": local_executor.stats() if (local_executor and not USE_CELERY) else None,
     }
 
 @app.post("/harmonize")
@@ -75,104 +115,295 @@ async def harmonize_endpoint(background_tasks: BackgroundTasks, file: UploadFile
 async def process_pdf_endpoint(background_tasks: BackgroundTasks, file: UploadFile = File(..., description="PDF file")):
     return await handle_upload(file, "pdf", background_tasks)
 
-async def handle_upload(file: UploadFile, task_type: str, background_tasks: BackgroundTasks):
-    content = await file.read()
-    if len(content) > MAX_UPLOAD_BYTES:
-        raise HTTPException(
-            status_code=413,
-            detail=f"File too large. Max size: {MAX_UPLOAD_MB}MB. Your file: {len(content) / (1024*1024):.1f}MB.",
-        )
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+
+def _raise_queue_full(e: QueueFullError):
+    raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
 
-    file_hash = get_file_hash(content)
+async def handle_upload(file: UploadFile, task_type: str, background_tasks: BackgroundTasks):
+    # Hash in chunks; the upload itself stays in Starlette's spooled temp file
+    hasher = hashlib.sha256()
+    size = 0
+    while True:
+        chunk = await file.read(UPLOAD_CHUNK_BYTES)
+        if not chunk:
+            break
+        size += len(chunk)
+        if size > MAX_UPLOAD_BYTES:
+            raise HTTPException(
+                status_code=413,
+                detail=f"File too large. Max size: {MAX_UPLOAD_MB}MB. Your file: more than {MAX_UPLOAD_MB}MB.",
+            )
+        hasher.update(chunk)
+    await file.seek(0)
+
+    file_hash = hasher.hexdigest()
 
     # 2. Check DB (Cache)
     cached = db.get_metadata(file_hash)
+    if cached and cached.get("status") == "success":
+        print(f"Cache Hit: {file_hash} Status: success")
+        access_tracker.touch(file_hash)
+        return cached
+
+    # Backpressure: refuse early (before storing anything) when the local queue is full
+    if not USE_CELERY and local_executor is not None and local_executor.is_full():
+        _raise_queue_full(QueueFullError(local_executor.retry_after()))
+
+    # 3. Claim the job. A duplicate upload of a hash that is still in flight (live
+    # lease) attaches to that job; errors and expired leases (worker died) re-queue.
+    record = {
+        "status": "processing",
+        "file_hash": file_hash,
+        "original_filename": file.filename,
+        "task_type": task_type,
+        "size": size,
+        "lease": new_lease(f"queued:{worker_id()}", LEASE_QUEUE_TTL_SECONDS),
+    }
+    try:
+        # May wait on another API worker's claim of the same hash: not on the event loop
+        in_flight = await run_in_threadpool(db.claim_job, file_hash, record)
+    except TimeoutError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    if in_flight is not None:
+        print(f"Job {file_hash} already in flight; attaching")
+        access_tracker.touch(file_hash)
+        return {"status": "processing", "file_hash": file_hash,
+                "message": "Already processing; attached to existing job.", "coalesced": True}
     if cached:
-        print(f"Cache Hit: {file_hash} Status: {cached.get('status')}")
-        
-        # FIX: If it's stuck in "processing" for a re-upload, it's likely a zombie job.
-        # We should force re-process it.
-        if cached.get("status") == "success":
-             return cached
-        elif cached.get("status") == "error":
-             # Optional: retry if user wants, but for now return error
-             pass 
-        else:
-             # Status is "processing" (or None) but user submitted again.
-             # Assume zombie -> Fall through to dispatch new task.
-             print("Stale 'processing' job found. Re-queueing...")
-             pass
+        print(f"Re-queueing {file_hash} (previous status: {cached.get('status')})")
 
-    # 3. Upload to Storage (S3 or Local)
+    # 4. Upload to Storage (S3 or Local)
     # We use file_hash + extension as unique name
     ext = os.path.splitext(file.filename)[1]
     storage_filename = f"{file_hash}{ext}"
     
     try:
-        storage.save(content, storage_filename)
-        
-        # 4. Dispatch Task
-        # Initial status
-        db.save_metadata(file_hash, {"status": "processing", "file_hash": file_hash, "original_filename": file.filename})
-
         if USE_CELERY:
+            # Route by type/size/pages so small jobs never queue behind OCR
+            queue = await run_in_threadpool(classify_job, task_type, size, file.file)
+            print(f"Routing {file_hash} to queue '{queue}'")
+        # Multipart S3 upload of the whole file: a long transfer, keep it off the event loop
+        await run_in_threadpool(storage.save_stream, file.file, storage_filename)
+        access_tracker.touch(file_hash)
+
+        # 5. Dispatch Task
+        if USE_CELERY and task_type == "pdf":
+            # Phase 2: text/OCR and tables on separate workers, then finalize
+            dispatch_pdf_pipeline(file_hash, storage_filename, queue)
+        elif USE_CELERY:
             # Phase 2: Async Worker
-            process_file_task.delay(file_hash, storage_filename, task_type)
+            dispatch_file_task(file_hash, storage_filename, task_type, queue)
+        elif local_executor is not None:
+            # Local process pool: real parallelism, API threads stay free for requests
+            try:
+                local_executor.submit(run_local_job, file_hash, storage_filename, task_type)
+            except QueueFullError as e:
+                db.delete_metadata(file_hash)
+                _raise_queue_full(e)
         else:
             # Fallback: BackgroundTasks (Phase 1.5)
             # This runs in the same process but after response is sent (if we return) 
             # OR we can just await it for "Simple" mode users who don't want polling.
             # To support the "Polling" UI, we MUST return immediately.
-            background_tasks.add_task(process_file_task, file_hash, storage_filename, task_type)
+            background_tasks.add_task(process_file, file_hash, storage_filename, task_type)
 
         return {"status": "processing", "file_hash": file_hash, "message": "File uploaded, processing started."}
 
+    except HTTPException:
+        raise
     except Exception as e:
         import traceback
         traceback.print_exc()
+        # Release the claim so the next upload retries instead of attaching to a job that never started
+        db.save_metadata(file_hash, {"file_hash": file_hash, "status": "error", "error_message": str(e)})
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def _not_modified(request: Request, etag: Optional[str], immutable: bool = False) -> Optional[Response]:
+    """304 when the client's If-None-Match already names this representation."""
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=cache_headers(etag, immutable))
+    return None
+
+VERSION_QUERY = Query(None, description="Record version (completed_at from /status); makes the response immutable")
+
 @app.get("/status/{file_hash}")
-async def get_status(file_hash: str):
+async def get_status(file_hash: str, request: Request, response: Response):
     data = db.get_metadata(file_hash)
     if not data:
         raise HTTPException(status_code=404, detail="Job not found")
+    access_tracker.touch(file_hash)
+    etag = result_etag(file_hash, data, "status")
+    not_modified = _not_modified(request, etag)
+    if not_modified:
+        return not_modified
+    response.headers.update(cache_headers(etag))
     return data
 
+@app.get("/results/{file_hash}/pages")
+async def get_result_pages(file_hash: str, request: Request, response: Response,
+                           offset: int = Query(0, ge=0), limit: int = Query(20, ge=1, le=100),
+                           v: Optional[str] = VERSION_QUERY):
+    data = db.get_metadata(file_hash)
+    if not data or data.get("status") != "success":
+        raise HTTPException(status_code=404, detail="File not ready or not found")
+    access_tracker.touch(file_hash)
+    etag = result_etag(file_hash, data, "pages", offset, limit)
+    immutable = is_versioned(data, v)
+    not_modified = _not_modified(request, etag, immutable)
+    if not_modified:
+        return not_modified
+    try:
+        page = get_pages(storage, data, offset, limit)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Result pages not found in storage")
+    response.headers.update(cache_headers(etag, immutable))
+    return page
+
+@app.get("/results/{file_hash}/tables")
+async def get_result_tables(file_hash: str, request: Request, response: Response,
+                            offset: int = Query(0, ge=0), limit: int = Query(5, ge=1, le=20),
+                            v: Optional[str] = VERSION_QUERY):
+    data = db.get_metadata(file_hash)
+    if not data or data.get("status") != "success":
+        raise HTTPException(status_code=404, detail="File not ready or not found")
+    access_tracker.touch(file_hash)
+    etag = result_etag(file_hash, data, "tables", offset, limit)
+    immutable = is_versioned(data, v)
+    not_modified = _not_modified(request, etag, immutable)
+    if not_modified:
+        return not_modified
+    try:
+        page = get_tables(storage, data, offset, limit)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Result tables not found in storage")
+    response.headers.update(cache_headers(etag, immutable))
+    return page
+
+@app.get("/search")
+def search_catalog(
+    q: Optional[str] = Query(None, description="Words matched against title, description, keywords, provenance and coverage"),
+    sector: Optional[str] = None,
+    granularity: Optional[str] = None,
+    jurisdiction: Optional[str] = None,
+    year_from: Optional[int] = Query(None, ge=1800, le=2200),
+    year_to: Optional[int] = Query(None, ge=1800, le=2200),
+    offset: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=100),
+):
+    """Catalog search over successfully harmonized datasets, with facet counts for sector, granularity and jurisdiction."""
+    filters = {"sector": sector, "granularity": granularity, "jurisdiction": jurisdiction}
+    return get_search_index().search(q, filters, year_from, year_to, offset, limit)
+
+@app.get("/jobs")
+def list_jobs(
+    status: Optional[str] = None,
+    task_type: Optional[str] = Query(None, description="harmonize or pdf"),
+    filename: Optional[str] = Query(None, description="Original filename prefix (case-insensitive)"),
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page"),
+):
+    """Jobs, most recently updated first. Page with next_cursor until it is null."""
+    try:
+        return db.list_jobs(status=status, task_type=task_type, filename=filename, limit=limit, cursor=cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def _remove_quietly(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
 def _idmo_from_metadata(metadata: dict) -> dict:
     """Get IDMO blob: for harmonize it's top-level; for PDF it's under 'metadata'."""
     return metadata.get("metadata") or metadata
 
 
+def _download_name(cat: dict, suffix: str) -> str:
+    output_filename = f"harmonized_{cat.get('title', 'data')}{suffix}"
+    return "".join([c for c in output_filename if c.isalpha() or c.isdigit() or c in (' ', '.', '_')]).strip() or f"harmonized_data{suffix}"
+
+async def _columnar_download(file_hash: str, metadata: dict, ext: str, storage_filename: str, fmt: str, headers: dict):
+    """Typed Parquet/Arrow export, converted once per hash and then served from storage."""
+    from services.exports import EXPORT_FORMATS, TABULAR_EXTENSIONS, PYARROW_AVAILABLE, build_export
+    if not PYARROW_AVAILABLE:
+        raise HTTPException(status_code=501, detail=f"{fmt} export is not available (pyarrow not installed)")
+    if ext.lower() not in TABULAR_EXTENSIONS:
+        raise HTTPException(status_code=400, detail=f"{fmt} export is only available for CSV/Excel files")
+    idmo = _idmo_from_metadata(metadata)
+    schema = idmo.get("technical_metadata", {}).get("schema_details", [])
+    suffix = EXPORT_FORMATS[fmt]
+    fd, output_path = tempfile.mkstemp(suffix=suffix, prefix="aikosh_export_")
+    os.close(fd)
+    try:
+        # Reads the whole source and writes Parquet/Arrow: keep it off the event loop
+        cached = await run_in_threadpool(build_export, storage, file_hash, storage_filename, schema, fmt, output_path)
+    except FileNotFoundError:
+        _remove_quietly(output_path)
+        raise HTTPException(status_code=404, detail="Source file not found in storage")
+    except Exception as e:
+        _remove_quietly(output_path)
+        raise HTTPException(status_code=500, detail=str(e))
+    access_tracker.touch(file_hash)
+    media_type = "application/vnd.apache.parquet" if fmt == "parquet" else "application/vnd.apache.arrow.file"
+    return FileResponse(output_path, filename=_download_name(idmo.get("catalog_info", {}), suffix), media_type=media_type,
+                        headers={**headers, "X-Export-Cache": "hit" if cached else "miss"},
+                        background=BackgroundTask(_remove_quietly, output_path))
+
+
+def _harmonized_csv(input_path: str, ext: str, schema: list) -> str:
+    """Writes the source with standardized headers to a per-request temp CSV and returns its path."""
+    import pandas as pd
+    df = pd.read_csv(input_path) if ext == '.csv' else pd.read_excel(input_path)
+    rename_map = {item["column"]: item["standardized_header"] for item in schema if "column" in item}
+    if rename_map:
+        df.rename(columns=rename_map, inplace=True)
+    # Removed once the response is sent (nothing accumulates in outputs/)
+    fd, output_path = tempfile.mkstemp(suffix=".csv", prefix="aikosh_harmonized_")
+    os.close(fd)
+    try:
+        df.to_csv(output_path, index=False)
+    except Exception:
+        _remove_quietly(output_path)
+        raise
+    return output_path
+
+
 @app.get("/download-harmonized/{file_hash}")
-async def download_harmonized(file_hash: str):
+async def download_harmonized(file_hash: str, request: Request, format: str = Query("csv", pattern="^(csv|parquet|arrow)$"),
+                              v: Optional[str] = VERSION_QUERY):
     metadata = db.get_metadata(file_hash)
     if not metadata or metadata.get("status") == "processing":
         raise HTTPException(status_code=404, detail="File not ready or not found")
 
+    # Revalidation of a finished download answers from the record alone (no storage read)
+    etag = result_etag(file_hash, metadata, "download", format)
+    immutable = is_versioned(metadata, v)
+    not_modified = _not_modified(request, etag, immutable)
+    if not_modified:
+        access_tracker.touch(file_hash)
+        return not_modified
+    headers = cache_headers(etag, immutable)
+
     ext = os.path.splitext(metadata.get("original_filename", "data.csv"))[1] or ".csv"
     storage_filename = f"{file_hash}{ext}"
-
-    try:
-        content = storage.get(storage_filename)
-    except Exception:
-        raise HTTPException(status_code=404, detail="Source file not found in storage")
+    if format != "csv":
+        return await _columnar_download(file_hash, metadata, ext, storage_filename, format, headers)
 
     # Safe temp file per request (no collision with concurrent requests)
-    tmp = tempfile.NamedTemporaryFile(delete=False, suffix=ext, prefix="aikosh_dl_")
-    temp_input = tmp.name
+    fd, temp_input = tempfile.mkstemp(suffix=ext, prefix="aikosh_dl_")
+    os.close(fd)
     try:
-        tmp.write(content)
-        tmp.close()
+        await run_in_threadpool(storage.download_to, storage_filename, temp_input)
     except Exception:
-        if os.path.exists(temp_input):
-            os.remove(temp_input)
-        raise HTTPException(status_code=500, detail="Failed to write temp file")
+        _remove_quietly(temp_input)
+        raise HTTPException(status_code=404, detail="Source file not found in storage")
+    access_tracker.touch(file_hash)
 
     temp_used_as_response = False
     try:
-        import pandas as pd
         idmo = _idmo_from_metadata(metadata)
         tech = idmo.get("technical_metadata", {})
         cat = idmo.get("catalog_info", {})
@@ -180,38 +411,26 @@ async def download_harmonized(file_hash: str):
         if ext not in ('.csv', '.xlsx', '.xls'):
             temp_used_as_response = True
             orig_name = metadata.get("original_filename") or ("download" + ext)
-            return FileResponse(temp_input, filename=orig_name)
-
-        if ext == '.csv':
-            df = pd.read_csv(temp_input)
-        else:
-            df = pd.read_excel(temp_input)
-
-        schema = tech.get("schema_details", [])
-        rename_map = {item["column"]: item["standardized_header"] for item in schema if "column" in item}
-        if rename_map:
-            df.rename(columns=rename_map, inplace=True)
-
-        output_filename = f"harmonized_{cat.get('title', 'data')}.csv"
-        output_filename = "".join([c for c in output_filename if c.isalpha() or c.isdigit() or c in (' ', '.', '_')]).strip() or "harmonized_data.csv"
-        output_path = os.path.join(OUTPUT_DIR, output_filename)
-        df.to_csv(output_path, index=False)
-
-        return FileResponse(output_path, filename=output_filename)
+            return FileResponse(temp_input, filename=orig_name, headers=headers,
+                                background=BackgroundTask(_remove_quietly, temp_input))
+
+        # Parsing and rewriting the whole sheet is CPU-bound: off the event loop
+        output_path = await run_in_threadpool(_harmonized_csv, temp_input, ext, tech.get("schema_details", []))
+        output_filename = _download_name(cat, ".csv")
+        return FileResponse(output_path, filename=output_filename, headers=headers,
+                            background=BackgroundTask(_remove_quietly, output_path))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     finally:
-        if not temp_used_as_response and os.path.exists(temp_input):
-            try:
-                os.remove(temp_input)
-            except OSError:
-                pass
+        if not temp_used_as_response:
+            _remove_quietly(temp_input)
 
 @app.post("/synthesize")
 async def synthesize_endpoint(metadata_list: List[Dict[Any, Any]]):
     from synthesizer import synthesize_metadata
     try:
-        return synthesize_metadata(metadata_list)
+        # Several blocking Gemini calls: run them off the event loop so other requests keep flowing
+        return await run_in_threadpool(synthesize_metadata, metadata_list)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
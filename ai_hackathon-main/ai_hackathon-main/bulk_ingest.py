@@ -0,0 +1,288 @@
+"""
+Bulk (backfill) ingestion of CSV, Excel and PDF files.
+
+    python bulk_ingest.py legacy_data/                    # local directory tree
+    python bulk_ingest.py storage:legacy/ --workers 4     # objects under a storage prefix
+
+Files are processed in a process pool exactly like uploads: stored as <hash><ext>,
+claimed in the DB and run through process_file, so results are served by the
+API afterwards. Content already in the DB with status "success" is skipped. Every
+finished file is appended to a checkpoint, so re-running the same command after an
+interruption resumes where it stopped.
+"""
+import os
+import sys
+import json
+import time
+import hashlib
+import tempfile
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from typing import Dict, Any, Iterator
+
+BULK_WORKERS = int(os.getenv("BULK_WORKERS", str(os.cpu_count() or 1)))
+# Concurrent Gemini calls across all workers (0 = one per worker)
+BULK_LLM_CONCURRENCY = int(os.getenv("BULK_LLM_CONCURRENCY", "0"))
+BULK_CHECKPOINT = os.getenv("BULK_CHECKPOINT", "outputs/bulk_checkpoint.jsonl")
+BULK_MAX_TASKS_PER_CHILD = int(os.getenv("BULK_MAX_TASKS_PER_CHILD", "50"))
+PROGRESS_INTERVAL_SECONDS = 5
+
+TASK_TYPES = {".csv": "harmonize", ".xlsx": "harmonize", ".xls": "harmonize", ".pdf": "pdf"}
+STORAGE_SCHEME = "storage:"
+HASH_CHUNK_BYTES = 1024 * 1024
+
+# Outcomes that are final for a source file; anything else is retried on the next run
+DONE_STATUSES = {"success", "error", "duplicate"}
+
+
+def discover(source: str) -> Iterator[Dict[str, Any]]:
+    """Yields {"key", "size", "mtime"} for every supported file under a directory or storage: prefix."""
+    if source.startswith(STORAGE_SCHEME):
+        from services.storage import get_storage_service
+        for key, size, mtime in get_storage_service().iter_objects(source[len(STORAGE_SCHEME):]):
+            if os.path.splitext(key)[1].lower() in TASK_TYPES:
+                yield {"key": STORAGE_SCHEME + key, "size": size, "mtime": mtime}
+        return
+    for root, dirs, files in os.walk(source):
+        dirs.sort()
+        for name in sorted(files):
+            if os.path.splitext(name)[1].lower() not in TASK_TYPES:
+                continue
+            path = os.path.join(root, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            yield {"key": os.path.abspath(path), "size": st.st_size, "mtime": st.st_mtime}
+
+
+def _entry_id(entry: Dict[str, Any]) -> str:
+    # A file changed since it was checkpointed counts as new
+    return f"{entry['key']}|{entry['size']}|{int(entry['mtime'])}"
+
+
+def load_checkpoint(path: str) -> Dict[str, str]:
+    """{entry id: status} of finished files. A torn last line (killed mid-write) is ignored."""
+    done = {}
+    try:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    row = json.loads(line)
+                except ValueError:
+                    continue
+                if row.get("status") in DONE_STATUSES:
+                    done[row["id"]] = row["status"]
+    except FileNotFoundError:
+        pass
+    return done
+
+
+class Checkpoint:
+    """Append-only JSONL log of finished files, flushed per line."""
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.f = open(path, "a", encoding="utf-8")
+
+    def record(self, entry: Dict[str, Any], outcome: Dict[str, Any]):
+        row = {"id": _entry_id(entry), "status": outcome["status"], "file_hash": outcome.get("file_hash")}
+        self.f.write(json.dumps(row) + "\n")
+        self.f.flush()
+
+    def close(self):
+        self.f.close()
+
+
+class Progress:
+    """Counts outcomes and renders done/total, files/sec and ETA."""
+
+    def __init__(self, total: int, skipped: int = 0):
+        self.total = total
+        self.skipped = skipped
+        self.counts: Dict[str, int] = {}
+        self.done = 0
+        self.started = time.monotonic()
+
+    def update(self, status: str):
+        self.done += 1
+        self.counts[status] = self.counts.get(status, 0) + 1
+
+    def line(self) -> str:
+        elapsed = max(time.monotonic() - self.started, 1e-6)
+        rate = self.done / elapsed
+        remaining = self.total - self.done
+        eta = _format_seconds(remaining / rate) if rate > 0 else "?"
+        counts = " ".join(f"{k} {v}" for k, v in sorted(self.counts.items()))
+        pct = 100.0 * self.done / self.total if self.total else 100.0
+        return (f"[Bulk] {self.done}/{self.total} ({pct:.1f}%) {rate:.2f} files/s "
+                f"ETA {eta} | {counts or '-'} | resumed past {self.skipped}")
+
+
+def _format_seconds(seconds: float) -> str:
+    seconds = int(seconds)
+    hours, rest = divmod(seconds, 3600)
+    return f"{hours}h{rest // 60:02d}m" if hours else f"{rest // 60}m{rest % 60:02d}s"
+
+
+# --- Worker side ---
+
+_worker_db = None
+_worker_storage = None
+
+
+def _init_worker(llm_slots, quiet: bool, workers: int):
+    global _worker_db, _worker_storage
+    if quiet:
+        sys.stdout = open(os.devnull, "w")
+    from services.storage import get_storage_service
+    from services.database import get_db_service
+    from pdf_service.metadata_generator import set_llm_limiter
+    from pdf_service.text_extractor import set_outer_pool_size
+    _worker_storage = get_storage_service()
+    _worker_db = get_db_service()
+    set_llm_limiter(llm_slots)
+    set_outer_pool_size(workers)
+
+
+def _hash_file(path: str) -> str:
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_BYTES), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def ingest_one(entry: Dict[str, Any], db=None, storage=None) -> Dict[str, Any]:
+    """
+    Processes one source file. Returns {"status", "file_hash"} with status one of
+    success/error/duplicate (content already harmonized) or attached (the same
+    content is being processed right now, by this run or the API).
+    """
+    from services.leases import new_lease, worker_id, LEASE_QUEUE_TTL_SECONDS
+    db = db or _worker_db
+    storage = storage or _worker_storage
+    key = entry["key"]
+    ext = os.path.splitext(key)[1].lower()
+    temp_path = None
+    try:
+        if key.startswith(STORAGE_SCHEME):
+            fd, temp_path = tempfile.mkstemp(suffix=ext, prefix="aikosh_bulk_")
+            os.close(fd)
+            storage.download_to(key[len(STORAGE_SCHEME):], temp_path)
+            local_path = temp_path
+        else:
+            local_path = key
+        file_hash = _hash_file(local_path)
+
+        cached = db.get_metadata(file_hash)
+        if cached and cached.get("status") == "success":
+            return {"status": "duplicate", "file_hash": file_hash}
+        record = {
+            "status": "processing",
+            "file_hash": file_hash,
+            "original_filename": os.path.basename(key),
+            "task_type": TASK_TYPES[ext],
+            "size": entry["size"],
+            "lease": new_lease(f"bulk:{worker_id()}", LEASE_QUEUE_TTL_SECONDS),
+        }
+        if db.claim_job(file_hash, record) is not None:
+            return {"status": "attached", "file_hash": file_hash}
+
+        storage_filename = f"{file_hash}{ext}"
+        try:
+            with open(local_path, "rb") as f:
+                storage.save_stream(f, storage_filename)
+        except Exception as e:
+            db.save_metadata(file_hash, {"file_hash": file_hash, "status": "error", "error_message": str(e)})
+            raise
+        from services.jobs import process_file
+        try:
+            result = process_file(file_hash, storage_filename, TASK_TYPES[ext])
+        except Exception:
+            return {"status": "error", "file_hash": file_hash}  # saved to the DB by the job
+        return {"status": result.get("status", "error"), "file_hash": file_hash}
+    finally:
+        if temp_path and os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+# --- Driver ---
+
+def run(source: str, workers: int = BULK_WORKERS, llm_concurrency: int = BULK_LLM_CONCURRENCY,
+        checkpoint_path: str = BULK_CHECKPOINT, quiet: bool = False) -> Dict[str, int]:
+    """Ingests everything under source not already in the checkpoint. Returns outcome counts."""
+    workers = max(1, workers)
+    done = load_checkpoint(checkpoint_path)
+    print(f"[Bulk] Scanning {source} ...")
+    entries = [e for e in discover(source) if _entry_id(e) not in done]
+    progress = Progress(len(entries), skipped=len(done))
+    print(f"[Bulk] {len(entries)} files to ingest ({len(done)} already done per {checkpoint_path})")
+    if not entries:
+        return progress.counts
+
+    ctx = multiprocessing.get_context("spawn")  # workers never inherit our open files or threads
+    llm_slots = ctx.BoundedSemaphore(llm_concurrency) if llm_concurrency > 0 else None
+    checkpoint = Checkpoint(checkpoint_path)
+    pool = ProcessPoolExecutor(max_workers=workers, mp_context=ctx, initializer=_init_worker,
+                               initargs=(llm_slots, quiet, workers),
+                               max_tasks_per_child=BULK_MAX_TASKS_PER_CHILD or None)
+    pending = {}
+    queue = iter(entries)
+    last_report = time.monotonic()
+    try:
+        while True:
+            # Sliding window: a few jobs per worker queued, not tens of thousands of futures
+            while len(pending) < workers * 2:
+                entry = next(queue, None)
+                if entry is None:
+                    break
+                pending[pool.submit(ingest_one, entry)] = entry
+            if not pending:
+                break
+            finished, _ = wait(pending, timeout=PROGRESS_INTERVAL_SECONDS, return_when=FIRST_COMPLETED)
+            for future in finished:
+                entry = pending.pop(future)
+                try:
+                    outcome = future.result()
+                except Exception as e:
+                    print(f"[Bulk] Failed {entry['key']}: {e}")
+                    outcome = {"status": "failed"}  # not checkpointed: retried next run
+                if outcome["status"] in DONE_STATUSES:
+                    checkpoint.record(entry, outcome)
+                progress.update(outcome["status"])
+            if time.monotonic() - last_report >= PROGRESS_INTERVAL_SECONDS:
+                print(progress.line(), flush=True)
+                last_report = time.monotonic()
+    except KeyboardInterrupt:
+        print("\n[Bulk] Interrupted; re-run the same command to resume.")
+        pool.shutdown(wait=False, cancel_futures=True)
+        raise
+    finally:
+        checkpoint.close()
+    pool.shutdown()
+    print(progress.line())
+    if progress.counts.get("attached"):
+        print("[Bulk] Some files matched content still in flight; re-run to confirm them.")
+    return progress.counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk-ingest CSV/Excel/PDF files into the harmonizer.")
+    parser.add_argument("source", help="directory to walk, or storage:<prefix> for stored objects")
+    parser.add_argument("--workers", type=int, default=BULK_WORKERS, help="worker processes")
+    parser.add_argument("--llm-concurrency", type=int, default=BULK_LLM_CONCURRENCY,
+                        help="max concurrent Gemini calls across workers (0 = no extra limit)")
+    parser.add_argument("--checkpoint", default=BULK_CHECKPOINT, help="progress file used to resume")
+    parser.add_argument("--quiet", action="store_true", help="silence per-file pipeline logs")
+    args = parser.parse_args(argv)
+    try:
+        counts = run(args.source, args.workers, args.llm_concurrency, args.checkpoint, args.quiet)
+    except KeyboardInterrupt:
+        return 130
+    return 1 if counts.get("failed") else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
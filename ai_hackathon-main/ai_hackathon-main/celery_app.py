@@ -1,6 +1,9 @@
 from celery import Celery
+from celery.signals import celeryd_init
+from kombu import Queue
 import os
 from dotenv import load_dotenv
+from services.routing import QUEUE_FAST, QUEUE_SETTINGS
 
 load_dotenv()
 
@@ -24,9 +27,47 @@ celery_app.conf.update(
     worker_concurrency=int(os.getenv("WORKER_CONCURRENCY", 1)), # Default to 1 for low memory envs
     task_time_limit=300, # 5 minutes hard limit
     task_soft_time_limit=240,
-    worker_max_tasks_per_child=5, # Recycle worker after 5 tasks to free memory leaks
+    # Children are recycled on memory growth (see services/worker_boot.py); an optional task cap on top
+    worker_max_tasks_per_child=int(os.getenv("WORKER_MAX_TASKS_PER_CHILD", "0")) or None,
     worker_prefetch_multiplier=1, # Don't hoard tasks
+    # Separate queues per job class (see services/routing.py); tasks are routed at dispatch
+    task_queues=[Queue(name) for name in QUEUE_SETTINGS],
+    task_default_queue=QUEUE_FAST,
 )
 
+@celeryd_init.connect
+def configure_queue_pool(sender=None, conf=None, options=None, **kwargs):
+    """A worker dedicated to one queue (-Q ocr) takes that queue's concurrency, limits and recycling."""
+    queues = (options or {}).get("queues") or []
+    if isinstance(queues, str):
+        queues = queues.split(",")
+    if len(queues) != 1 or queues[0] not in QUEUE_SETTINGS:
+        return
+    settings = QUEUE_SETTINGS[queues[0]]
+    if "WORKER_CONCURRENCY" not in os.environ:
+        conf.worker_concurrency = settings["concurrency"]
+    if settings["max_tasks_per_child"] > 0:
+        conf.worker_max_tasks_per_child = settings["max_tasks_per_child"]
+    conf.task_time_limit = settings["time_limit"]
+    conf.task_soft_time_limit = settings["soft_time_limit"]
+
+@celeryd_init.connect
+def preload_worker(sender=None, conf=None, options=None, **kwargs):
+    """Loads libraries and OCR models in the parent so prefork children share them copy-on-write."""
+    from services.worker_boot import preload_pipeline, memory_limit_kb
+    queues = (options or {}).get("queues") or []
+    if isinstance(queues, str):
+        queues = queues.split(",")
+    try:
+        stats = preload_pipeline(queues)
+        print(f"[Worker] Preloaded {stats['preloaded']} in {stats['seconds']}s, RSS {stats['rss_mb']}MB")
+    except Exception as e:
+        # Children fall back to importing lazily on first use
+        print(f"[Worker] Preload failed: {e}")
+    # Limit is measured after preloading: a child is recycled once it has grown by the allowance
+    limit = memory_limit_kb()
+    if limit and not conf.worker_max_memory_per_child:
+        conf.worker_max_memory_per_child = limit
+
 # Import tasks so they are registered
 import services.tasks
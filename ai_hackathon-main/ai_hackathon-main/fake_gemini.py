@@ -0,0 +1,271 @@
+"""
+Local stand-in for the Gemini API, for offline benchmarks of retry, backoff,
+model fallback and LLM concurrency.
+
+    python fake_gemini.py --port 8090 --rate-429 0.1 --latency-ms 800 --p95-ms 2500
+    python fake_gemini.py --config fake_gemini.json
+    GEMINI_BASE_URL=http://127.0.0.1:8090 GEMINI_API_KEY=fake uvicorn api:app
+
+Serves the two calls the app makes (models.list and models.generate_content) in
+the REST shapes the google-genai client expects, so get_prioritized_models and
+generate_metadata_with_retry run unchanged. Per model, the config sets a latency
+distribution, the share of 429/503/400 errors, blocked and empty responses and
+malformed JSON, and optional quotas (max concurrent requests, requests per
+minute) that answer 429 when exceeded:
+
+    {
+      "seed": 7,
+      "models": ["gemini-1.5-flash", "gemini-1.5-pro"],
+      "defaults": {"latency_ms": {"median": 800, "p95": 2500}, "rate_429": 0.05},
+      "per_model": {"gemini-1.5-flash": {"max_concurrent": 4, "rate_malformed": 0.02},
+                    "gemini-1.5-pro": {"latency_ms": {"min": 2000, "max": 6000}, "rate_400": 1.0}}
+    }
+
+GET /_fake/stats returns per-model outcome counts; POST /_fake/config swaps the
+config (and resets the counters) without a restart.
+"""
+import re
+import ast
+import sys
+import json
+import math
+import time
+import random
+import asyncio
+import argparse
+from collections import deque
+from typing import Dict, Any, Optional
+
+DEFAULT_MODELS = ["gemini-1.5-flash", "gemini-1.5-pro", "gemini-1.5-flash-8b"]
+DEFAULT_PROFILE = {
+    # Milliseconds: a number (fixed), {"median", "p95"} (lognormal) or {"min", "max"} (uniform)
+    "latency_ms": {"median": 800, "p95": 2500},
+    "error_latency_ms": 50,  # errors come back quickly, like the real API
+    "rate_429": 0.0,
+    "rate_503": 0.0,
+    "rate_400": 0.0,
+    "rate_blocked": 0.0,    # no candidates, promptFeedback.blockReason set
+    "rate_empty": 0.0,      # a candidate without text
+    "rate_malformed": 0.0,  # text that is not valid JSON
+    "max_concurrent": 0,    # in-flight requests per model beyond this get 429 (0 = unlimited)
+    "rpm": 0,               # requests per minute per model beyond this get 429 (0 = unlimited)
+}
+FAULTS = ("429", "503", "400", "blocked", "empty", "malformed")
+ERRORS = {
+    "429": (429, "RESOURCE_EXHAUSTED", "Resource has been exhausted (e.g. check quota)."),
+    "429_quota": (429, "RESOURCE_EXHAUSTED", "Quota exceeded for requests per model."),
+    "503": (503, "UNAVAILABLE", "The model is overloaded. Please try again later."),
+    "400": (400, "INVALID_ARGUMENT", "Request contains an invalid argument."),
+}
+
+
+def sample_latency(spec, rng: random.Random) -> float:
+    """Seconds drawn from a latency_ms spec."""
+    if isinstance(spec, (int, float)):
+        return spec / 1000
+    if "min" in spec:
+        return rng.uniform(spec["min"], spec.get("max", spec["min"])) / 1000
+    median = spec["median"]
+    p95 = spec.get("p95", median)
+    # Lognormal through the given median and 95th percentile (z = 1.645)
+    sigma = math.log(p95 / median) / 1.645 if p95 > median > 0 else 0.0
+    return rng.lognormvariate(math.log(max(median, 1e-3)), sigma) / 1000
+
+
+class FakeGemini:
+    """Outcome and latency decisions plus counters; independent of the HTTP layer."""
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None):
+        self.configure(config or {})
+
+    def configure(self, config: Dict[str, Any]):
+        self.models = [m.replace("models/", "") for m in config.get("models") or DEFAULT_MODELS]
+        unknown = set(config.get("defaults", {})).union(*config.get("per_model", {}).values()) - set(DEFAULT_PROFILE)
+        if unknown:
+            raise ValueError(f"Unknown profile settings: {', '.join(sorted(unknown))}")
+        self.default_profile = {**DEFAULT_PROFILE, **config.get("defaults", {})}
+        self.profiles = {m: {**self.default_profile, **config.get("per_model", {}).get(m, {})} for m in self.models}
+        self.rng = random.Random(config.get("seed"))
+        self.in_flight = {m: 0 for m in self.models}
+        self.recent = {m: deque() for m in self.models}
+        self.stats = {m: {} for m in self.models}
+
+    def choose(self, model: str) -> str:
+        """ok, 429_quota or one of FAULTS for the next request to model."""
+        profile = self.profiles[model]
+        if profile["max_concurrent"] and self.in_flight[model] >= profile["max_concurrent"]:
+            return "429_quota"
+        if profile["rpm"]:
+            now = time.monotonic()
+            window = self.recent[model]
+            while window and now - window[0] > 60:
+                window.popleft()
+            if len(window) >= profile["rpm"]:
+                return "429_quota"
+            window.append(now)
+        draw, cumulative = self.rng.random(), 0.0
+        for fault in FAULTS:
+            cumulative += profile[f"rate_{fault}"]
+            if draw < cumulative:
+                return fault
+        return "ok"
+
+    def latency(self, model: str, outcome: str) -> float:
+        profile = self.profiles[model]
+        if outcome in ERRORS:
+            return sample_latency(profile["error_latency_ms"], self.rng)
+        return sample_latency(profile["latency_ms"], self.rng)
+
+    def record(self, model: str, outcome: str):
+        counts = self.stats[model]
+        counts[outcome] = counts.get(outcome, 0) + 1
+
+
+def _prompt_text(body: Dict[str, Any]) -> str:
+    contents = body.get("contents") or []
+    if isinstance(contents, dict):
+        contents = [contents]
+    return "\n".join(part.get("text", "") for content in contents for part in content.get("parts", []))
+
+
+def _prompt_columns(prompt: str) -> list:
+    """Column names from a harmonizer prompt ("- Headers: ['District (Type: ...)', ...]")."""
+    match = re.search(r"Headers:\s*(\[.*\])", prompt)
+    if not match:
+        return []
+    try:
+        headers = ast.literal_eval(match.group(1))
+    except (ValueError, SyntaxError):
+        return []
+    return [str(h).split(" (Type:")[0] for h in headers]
+
+
+def metadata_text(prompt: str) -> str:
+    """A well-formed IDMO answer; spreadsheet prompts get a schema for their columns."""
+    columns = _prompt_columns(prompt)
+    metadata = {
+        "catalog_info": {"title": "Synthetic Dataset", "description": "Generated by the fake Gemini server.",
+                         "sector": "Governance", "keywords": ["synthetic"]},
+        "provenance": {"source": "Fake Gemini", "jurisdiction": "India", "data_owner": "Fake Gemini"},
+        "spatial_temporal": {"temporal_range": "2020-2021", "spatial_coverage": "India", "granularity": "State"},
+        "technical_metadata": {"format": "CSV/Excel" if columns else "PDF", "ai_readiness_level": 0.8,
+                               "machine_readable": bool(columns)},
+    }
+    if columns:
+        metadata["technical_metadata"]["schema_details"] = [
+            {"column": c, "standardized_header": re.sub(r"\W+", "_", c).strip("_").lower() or "column",
+             "type": "String", "description": c}
+            for c in columns
+        ]
+    return json.dumps(metadata)
+
+
+def response_body(outcome: str, prompt: str) -> Dict[str, Any]:
+    """generateContent response JSON for a non-error outcome."""
+    if outcome == "blocked":
+        return {"candidates": [], "promptFeedback": {"blockReason": "SAFETY"}}
+    if outcome == "empty":
+        return {"candidates": [{"content": {"role": "model", "parts": []}, "finishReason": "OTHER", "index": 0}]}
+    text = metadata_text(prompt)
+    if outcome == "malformed":
+        text = "```json\n" + text[: len(text) // 2]  # cut mid-object, as with a truncated answer
+    return {
+        "candidates": [{"content": {"role": "model", "parts": [{"text": text}]}, "finishReason": "STOP", "index": 0}],
+        "usageMetadata": {"promptTokenCount": len(prompt) // 4, "candidatesTokenCount": len(text) // 4},
+    }
+
+
+def create_app(fake: FakeGemini):
+    from fastapi import FastAPI, Request
+    from fastapi.responses import JSONResponse
+
+    app = FastAPI(title="Fake Gemini")
+
+    def _error(code: int, status: str, message: str) -> JSONResponse:
+        return JSONResponse(status_code=code, content={"error": {"code": code, "message": message, "status": status}})
+
+    @app.get("/_fake/stats")
+    def stats():
+        return {"models": fake.stats, "in_flight": fake.in_flight}
+
+    @app.post("/_fake/config")
+    async def configure(request: Request):
+        try:
+            fake.configure(await request.json())
+        except (ValueError, TypeError, AttributeError) as e:
+            return _error(400, "INVALID_ARGUMENT", str(e))
+        return {"models": fake.models}
+
+    @app.get("/{version}/models")
+    def list_models(version: str):
+        return {"models": [{"name": f"models/{m}", "displayName": m, "supportedActions": ["generateContent"]}
+                           for m in fake.models]}
+
+    @app.post("/{version}/models/{model_action}")
+    async def generate(version: str, model_action: str, request: Request):
+        model, _, action = model_action.partition(":")
+        if action != "generateContent" or model not in fake.profiles:
+            return _error(404, "NOT_FOUND", f"models/{model} is not found for API version {version}, "
+                                            f"or is not supported for {action or 'this call'}.")
+        body = await request.json()
+        outcome = fake.choose(model)
+        fake.record(model, outcome)
+        # /_fake/config may swap in a new model set mid-request: settle the count it was taken in
+        in_flight = fake.in_flight
+        in_flight[model] += 1
+        try:
+            await asyncio.sleep(fake.latency(model, outcome))
+        finally:
+            in_flight[model] -= 1
+        if outcome in ERRORS:
+            return _error(*ERRORS[outcome])
+        return response_body(outcome, _prompt_text(body))
+
+    return app
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local fake Gemini API with latency and fault injection.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--config", help="JSON file with models, defaults and per_model profiles")
+    parser.add_argument("--models", help="comma-separated model names (overrides the config)")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--latency-ms", type=float, help="median latency for all models")
+    parser.add_argument("--p95-ms", type=float, help="95th percentile latency (lognormal with --latency-ms)")
+    for fault in FAULTS:
+        parser.add_argument(f"--rate-{fault}", type=float, help=f"share of {fault} responses (0-1)")
+    parser.add_argument("--max-concurrent", type=int, help="per-model in-flight limit, 429 beyond it")
+    parser.add_argument("--rpm", type=int, help="per-model requests per minute, 429 beyond it")
+    args = parser.parse_args(argv)
+
+    config: Dict[str, Any] = {}
+    if args.config:
+        with open(args.config, encoding="utf-8") as f:
+            config = json.load(f)
+    defaults = config.setdefault("defaults", {})
+    if args.models:
+        config["models"] = [m.strip() for m in args.models.split(",") if m.strip()]
+    if args.seed is not None:
+        config["seed"] = args.seed
+    if args.latency_ms is not None:
+        defaults["latency_ms"] = {"median": args.latency_ms, "p95": args.p95_ms or args.latency_ms}
+    for fault in FAULTS:
+        rate = getattr(args, f"rate_{fault}")
+        if rate is not None:
+            defaults[f"rate_{fault}"] = rate
+    if args.max_concurrent is not None:
+        defaults["max_concurrent"] = args.max_concurrent
+    if args.rpm is not None:
+        defaults["rpm"] = args.rpm
+
+    import uvicorn
+    fake = FakeGemini(config)
+    print(f"[FakeGemini] Serving {', '.join(fake.models)} on http://{args.host}:{args.port}")
+    print(f"[FakeGemini] Point the app at it: GEMINI_BASE_URL=http://{args.host}:{args.port} GEMINI_API_KEY=fake")
+    uvicorn.run(create_app(fake), host=args.host, port=args.port, log_level="warning")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
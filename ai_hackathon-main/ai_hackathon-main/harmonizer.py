@@ -2,16 +2,15 @@ import os
 import json
 import glob
 from dotenv import load_dotenv
-from google import genai
 from ingester import extract_file_info  # Import your working ingester logic
-from pdf_service.metadata_generator import get_prioritized_models, generate_metadata_with_retry
+from pdf_service.metadata_generator import get_prioritized_models, generate_metadata_with_retry, make_client
 
 # --- 1. SETUP & CONFIG ---
 load_dotenv()
 api_key = os.getenv("GEMINI_API_KEY")
 
 if api_key:
-    client = genai.Client(api_key=api_key)
+    client = make_client(api_key)
 else:
     client = None
     print("WARNING: GEMINI_API_KEY not found. Harmonization will fail.")
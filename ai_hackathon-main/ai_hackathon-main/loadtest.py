@@ -0,0 +1,387 @@
+"""
+Load test of the upload -> process -> status -> download flow, with the LLM stubbed out.
+
+    python loadtest.py run --concurrency 1,4,16 --jobs 40        # app in-process
+    python loadtest.py run --url http://127.0.0.1:8000 --duration 60 --mix csv=8,pdf=2
+    python loadtest.py serve --port 8000                          # API with the LLM stubbed
+    python loadtest.py worker -Q fast                             # Celery worker with the LLM stubbed
+
+Each virtual user uploads a freshly generated file (unique content, so never a
+cache hit) drawn from the --mix, polls /status until the job finishes and then
+downloads the harmonized CSV. Every concurrency level is one step; the per-step
+lines (time-to-complete percentiles, errors, jobs/s, peak local queue) form the
+throughput curve. Run `serve` with USE_CELERY=true plus `worker`s, or with
+LOCAL_WORKERS=N, to compare the Celery and local-pool modes over a socket.
+With GEMINI_BASE_URL set (e.g. to fake_gemini.py) the stub is not installed.
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import asyncio
+import argparse
+from typing import Dict, Any, List, Optional
+
+# Seconds each stubbed LLM call takes (read by API, pool and Celery processes alike)
+LOADTEST_LLM_LATENCY = float(os.getenv("LOADTEST_LLM_LATENCY", "1.0"))
+POLL_INTERVAL_SECONDS = 0.5
+JOB_TIMEOUT_SECONDS = 600
+HEALTH_SAMPLE_SECONDS = 1.0
+
+UPLOADS = {
+    "csv": ("/harmonize", "text/csv"),
+    "pdf": ("/process-pdf", "application/pdf"),
+}
+FINAL_STATUSES = {"success", "error"}
+
+
+# --- LLM stub ---
+
+def _stub_catalog(title: str, fmt: str) -> Dict[str, Any]:
+    return {
+        "catalog_info": {"title": title, "description": f"Load test dataset {title}", "sector": "Governance",
+                         "keywords": ["loadtest"]},
+        "provenance": {"source": "Load Test", "jurisdiction": "India", "data_owner": "Load Test"},
+        "spatial_temporal": {"temporal_range": "2020-2021", "spatial_coverage": "India", "granularity": "District"},
+        "technical_metadata": {"format": fmt, "ai_readiness_level": 0.9, "machine_readable": fmt != "PDF"},
+    }
+
+
+def _stub_harmonizer_metadata(raw_data):
+    time.sleep(LOADTEST_LLM_LATENCY)
+    metadata = _stub_catalog(os.path.splitext(os.path.basename(str(raw_data.filename)))[0], "CSV/Excel")
+    # The ingester describes columns as "<name> (Type: ..., Unique: [...])"
+    names = [str(col).split(" (Type:")[0] for col in raw_data.columns]
+    metadata["technical_metadata"]["schema_details"] = [
+        {"column": name, "standardized_header": name.strip().lower().replace(" ", "_"), "type": "String",
+         "description": name}
+        for name in names
+    ]
+    return metadata
+
+
+def _stub_pdf_metadata(pages_data):
+    time.sleep(LOADTEST_LLM_LATENCY)
+    return _stub_catalog(f"Load test document ({len(pages_data)} pages)", "PDF")
+
+
+def install_llm_stub():
+    """Replaces the Gemini calls of both pipelines in this process with a fixed sleep."""
+    if os.getenv("GEMINI_BASE_URL"):
+        return  # real client against a stand-in (fake_gemini.py): retries and fallback run too
+    import harmonizer
+    import pdf_service.metadata_generator as metadata_generator
+    import pdf_service.orchestrator as orchestrator
+    harmonizer.get_aikosh_metadata = _stub_harmonizer_metadata
+    metadata_generator.generate_metadata = _stub_pdf_metadata
+    orchestrator.generate_metadata = _stub_pdf_metadata
+
+
+def run_stubbed_local_job(file_hash: str, filename: str, task_type: str = "harmonize"):
+    """Local pool entry point: spawned workers do not inherit the parent's patches."""
+    install_llm_stub()
+    from services.jobs import run_local_job
+    run_local_job(file_hash, filename, task_type)
+
+
+def _stub_api(api):
+    install_llm_stub()
+    api.run_local_job = run_stubbed_local_job
+
+
+# --- Synthetic inputs ---
+
+def make_csv(rows: int) -> bytes:
+    token = uuid.uuid4().hex  # unique content -> unique hash -> a real job every time
+    lines = ["District,Year,Population,Literacy Rate,Note"]
+    for i in range(rows):
+        lines.append(f"District {i % 700},{2011 + i % 10},{random.randint(10_000, 5_000_000)},"
+                     f"{random.uniform(40, 99):.2f},{token if i == 0 else ''}")
+    return ("\n".join(lines) + "\n").encode()
+
+
+def make_pdf(pages: int) -> bytes:
+    import fitz
+    token = uuid.uuid4().hex
+    doc = fitz.open()
+    for i in range(pages):
+        page = doc.new_page()
+        text = "\n".join([f"Annual Report {token} - page {i + 1}"] +
+                         [f"District {j}: enrolment {random.randint(100, 90_000)}, schools {random.randint(5, 900)}"
+                          for j in range(40)])
+        page.insert_text((50, 60), text, fontsize=9)
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+# --- Measurements ---
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile; None for no samples."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * pct // 100))
+    return ordered[int(rank) - 1]
+
+
+class StepStats:
+    """Outcomes and latencies of one concurrency step."""
+
+    def __init__(self, concurrency: int, time_uploads: bool = True):
+        self.concurrency = concurrency
+        self.time_uploads = time_uploads
+        self.started = time.monotonic()
+        self.elapsed = 0.0
+        self.outcomes: Dict[str, int] = {}
+        self.rejected = 0  # 503 queue-full answers (retried after Retry-After)
+        self.polls = 0
+        self.upload: List[float] = []
+        self.complete: List[float] = []
+        self.download: List[float] = []
+        self.max_queued = None
+
+    def outcome(self, status: str):
+        self.outcomes[status] = self.outcomes.get(status, 0) + 1
+
+    def finish(self):
+        self.elapsed = time.monotonic() - self.started
+
+    def summary(self) -> Dict[str, Any]:
+        def pcts(values):
+            return {f"p{p}": percentile(values, p) for p in (50, 95, 99)}
+        done = self.outcomes.get("success", 0)
+        return {
+            "concurrency": self.concurrency,
+            "seconds": round(self.elapsed, 2),
+            "jobs": sum(self.outcomes.values()),
+            "outcomes": dict(sorted(self.outcomes.items())),
+            "rejected_503": self.rejected,
+            "status_polls": self.polls,
+            "throughput_jobs_per_s": round(done / self.elapsed, 3) if self.elapsed else 0.0,
+            "time_to_complete_s": pcts(self.complete),
+            "upload_s": pcts(self.upload) if self.time_uploads else None,
+            "download_s": pcts(self.download),
+            "max_local_queued": self.max_queued,
+        }
+
+    def line(self) -> str:
+        s = self.summary()
+        ttc, up, dl = s["time_to_complete_s"], s["upload_s"] or {"p95": None}, s["download_s"]
+        errors = s["jobs"] - s["outcomes"].get("success", 0)
+        return (f"[Load] c={self.concurrency:<3} jobs {s['jobs']} ok {s['outcomes'].get('success', 0)} "
+                f"errors {errors} rejected {self.rejected} | {s['throughput_jobs_per_s']:.2f} jobs/s | "
+                f"complete p50 {_fmt(ttc['p50'])} p95 {_fmt(ttc['p95'])} p99 {_fmt(ttc['p99'])} | "
+                f"upload p95 {_fmt(up['p95'])} | download p95 {_fmt(dl['p95'])} | "
+                f"max queued {'-' if self.max_queued is None else self.max_queued}")
+
+
+def _fmt(seconds: Optional[float]) -> str:
+    if seconds is None:
+        return "-"
+    return f"{seconds * 1000:.0f}ms" if seconds < 1 else f"{seconds:.2f}s"
+
+
+# --- Driver ---
+
+async def one_job(client, kind: str, stats: StepStats, args):
+    endpoint, content_type = UPLOADS[kind]
+    content = make_csv(args.csv_rows) if kind == "csv" else await asyncio.to_thread(make_pdf, args.pdf_pages)
+    name = f"loadtest_{uuid.uuid4().hex[:8]}.{kind}"
+    started = time.monotonic()
+    while True:
+        sent = time.monotonic()
+        resp = await client.post(endpoint, files={"file": (name, content, content_type)})
+        if resp.status_code != 503:
+            break
+        # Local queue full: back off like a well-behaved client; the wait counts toward completion
+        stats.rejected += 1
+        await asyncio.sleep(float(resp.headers.get("Retry-After", "1")))
+    stats.upload.append(time.monotonic() - sent)
+    if resp.status_code != 200:
+        stats.outcome(f"http_{resp.status_code}")
+        return
+    body = resp.json()
+    file_hash, status = body.get("file_hash"), body.get("status")
+    while status not in FINAL_STATUSES:
+        if time.monotonic() - started > args.timeout:
+            stats.outcome("timeout")
+            return
+        await asyncio.sleep(args.poll_interval)
+        resp = await client.get(f"/status/{file_hash}")
+        stats.polls += 1
+        if resp.status_code != 200:
+            stats.outcome(f"http_{resp.status_code}")
+            return
+        status = resp.json().get("status")
+    stats.complete.append(time.monotonic() - started)
+    if status == "success" and kind == "csv" and args.download:
+        sent = time.monotonic()
+        resp = await client.get(f"/download-harmonized/{file_hash}")
+        stats.download.append(time.monotonic() - sent)
+        if resp.status_code != 200:
+            stats.outcome("download_error")
+            return
+    stats.outcome(status)
+
+
+async def _virtual_user(client, stats: StepStats, mix: Dict[str, int], budget: List[int], deadline: float, args):
+    kinds, weights = list(mix), list(mix.values())
+    while budget[0] > 0 and time.monotonic() < deadline:
+        budget[0] -= 1
+        try:
+            await one_job(client, random.choices(kinds, weights)[0], stats, args)
+        except Exception as e:
+            stats.outcome(f"exception:{type(e).__name__}")
+
+
+async def _sample_health(client, stats: StepStats):
+    """Peak queued jobs in the local pool (null in Celery mode, which reports no local queue)."""
+    while True:
+        try:
+            local = (await client.get("/health")).json().get("local_queue")
+            if local:
+                stats.max_queued = max(stats.max_queued or 0, local.get("queued", 0))
+        except Exception:
+            pass
+        await asyncio.sleep(HEALTH_SAMPLE_SECONDS)
+
+
+async def run_step(client, concurrency: int, mix: Dict[str, int], args, time_uploads: bool = True) -> StepStats:
+    stats = StepStats(concurrency, time_uploads)
+    budget = [args.jobs if args.jobs else sys.maxsize]
+    deadline = time.monotonic() + args.duration if args.duration else float("inf")
+    sampler = asyncio.create_task(_sample_health(client, stats))
+    try:
+        await asyncio.gather(*(_virtual_user(client, stats, mix, budget, deadline, args) for _ in range(concurrency)))
+    finally:
+        sampler.cancel()
+    stats.finish()
+    return stats
+
+
+def _make_client(url: Optional[str]):
+    import httpx
+    timeout = httpx.Timeout(120.0)
+    if url:
+        return httpx.AsyncClient(base_url=url, timeout=timeout), None
+    import api
+    _stub_api(api)
+    transport = httpx.ASGITransport(app=api.app)
+    return httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=timeout), api
+
+
+async def run(args) -> List[Dict[str, Any]]:
+    mix = parse_mix(args.mix)
+    client, api = _make_client(args.url)
+    target = args.url or (f"in-process (USE_CELERY={os.getenv('USE_CELERY', 'false')}, "
+                          f"LOCAL_WORKERS={os.getenv('LOCAL_WORKERS', '1')})")
+    # Over a socket the stub latency is whatever the server was started with
+    llm_latency = None if args.url or os.getenv("GEMINI_BASE_URL") else LOADTEST_LLM_LATENCY
+    if os.getenv("GEMINI_BASE_URL"):
+        llm = f"Gemini client -> {os.getenv('GEMINI_BASE_URL')}"
+    else:
+        llm = f"LLM stub latency {'set by the server' if llm_latency is None else f'{llm_latency}s'}"
+    print(f"[Load] Target {target}, mix {mix}, {llm}")
+    # In-process without a worker pool, ASGITransport only returns the upload response
+    # after its BackgroundTasks, i.e. after the whole job: upload times would be job times
+    time_uploads = api is None or api.USE_CELERY or api.local_executor is not None
+    if not time_uploads:
+        print("[Load] LOCAL_WORKERS=0 in-process: jobs run inside the upload request, upload latency not reported")
+    results = []
+    try:
+        if args.warmup:
+            # First jobs pay for imports and pool start-up; keep them out of the numbers
+            await run_step(client, 1, mix, argparse.Namespace(**{**vars(args), "jobs": args.warmup, "duration": 0}))
+        for concurrency in args.concurrency:
+            stats = await run_step(client, concurrency, mix, args, time_uploads)
+            print(stats.line(), flush=True)
+            results.append(stats.summary())
+    finally:
+        await client.aclose()
+        if api is not None and api.local_executor is not None:
+            api.local_executor.shutdown()
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"target": target, "mix": mix, "llm_latency_s": llm_latency, "steps": results}, f, indent=2)
+        print(f"[Load] Wrote {args.json}")
+    return results
+
+
+def parse_mix(spec: str) -> Dict[str, int]:
+    """"csv=8,pdf=2" -> {"csv": 8, "pdf": 2}."""
+    mix = {}
+    for part in spec.split(","):
+        kind, _, weight = part.partition("=")
+        kind = kind.strip().lower()
+        if kind not in UPLOADS:
+            raise argparse.ArgumentTypeError(f"unknown file kind {kind!r} (expected one of {', '.join(UPLOADS)})")
+        mix[kind] = int(weight or 1)
+    if not any(mix.values()):
+        raise argparse.ArgumentTypeError("the mix needs at least one positive weight")
+    return mix
+
+
+def serve(host: str, port: int):
+    import uvicorn
+    import api
+    _stub_api(api)
+    uvicorn.run(api.app, host=host, port=port)
+
+
+def worker(celery_args: List[str]):
+    install_llm_stub()  # prefork children inherit the patched modules
+    from celery_app import celery_app
+    celery_app.worker_main(["worker", *celery_args])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test the harmonizer with the LLM stubbed out.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_run = sub.add_parser("run", help="drive uploads and report latency percentiles per concurrency step")
+    p_run.add_argument("--url", help="base URL of a running server (default: the app in-process)")
+    p_run.add_argument("--concurrency", type=lambda s: [int(c) for c in s.split(",")], default=[1, 4, 8],
+                       help="comma-separated virtual users per step, e.g. 1,4,16")
+    p_run.add_argument("--jobs", type=int, default=20, help="jobs per step (0 = until --duration)")
+    p_run.add_argument("--duration", type=float, default=0, help="seconds per step in which new jobs start")
+    p_run.add_argument("--mix", default="csv=1", help="file kinds and weights, e.g. csv=8,pdf=2")
+    p_run.add_argument("--csv-rows", type=int, default=1000)
+    p_run.add_argument("--pdf-pages", type=int, default=5)
+    p_run.add_argument("--poll-interval", type=float, default=POLL_INTERVAL_SECONDS)
+    p_run.add_argument("--timeout", type=float, default=JOB_TIMEOUT_SECONDS, help="per-job time limit")
+    p_run.add_argument("--no-download", dest="download", action="store_false",
+                       help="skip /download-harmonized after CSV jobs")
+    p_run.add_argument("--warmup", type=int, default=1, help="untimed jobs before the first step")
+    p_run.add_argument("--json", help="write the step summaries to this file")
+
+    p_serve = sub.add_parser("serve", help="run the API with the LLM stubbed")
+    p_serve.add_argument("--host", default="127.0.0.1")
+    p_serve.add_argument("--port", type=int, default=8000)
+
+    sub.add_parser("worker", help="run a Celery worker with the LLM stubbed (extra args go to celery)")
+
+    args, extra = parser.parse_known_args(argv)
+    if args.command == "worker":
+        worker(extra)
+        return 0
+    if extra:
+        parser.error(f"unrecognized arguments: {' '.join(extra)}")
+    if args.command == "serve":
+        serve(args.host, args.port)
+        return 0
+    if not args.jobs and not args.duration:
+        parser.error("--jobs 0 needs a --duration")
+    try:
+        parse_mix(args.mix)
+    except argparse.ArgumentTypeError as e:
+        parser.error(str(e))
+    results = asyncio.run(run(args))
+    return 1 if any(r["jobs"] != r["outcomes"].get("success", 0) for r in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
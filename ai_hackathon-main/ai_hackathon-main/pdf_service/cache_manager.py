@@ -3,6 +3,7 @@ import hashlib
 import json
 import shutil
 from pathlib import Path
+from services.compression import get_codec, compress, decompress
 
 CACHE_DIR = "outputs/cache"
 os.makedirs(CACHE_DIR, exist_ok=True)
@@ -16,8 +17,8 @@ def get_cached_metadata(file_hash: str):
     cache_path = os.path.join(CACHE_DIR, f"{file_hash}.json")
     if os.path.exists(cache_path):
         try:
-            with open(cache_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
+            with open(cache_path, 'rb') as f:
+                data = json.loads(decompress(f.read()))
             # Add a flag to indicate it came from cache
             if isinstance(data, dict):
                 data["_is_cached"] = True
@@ -30,8 +31,9 @@ def save_to_cache(file_hash: str, metadata: dict):
     """Saves metadata to cache."""
     cache_path = os.path.join(CACHE_DIR, f"{file_hash}.json")
     try:
-        with open(cache_path, 'w', encoding='utf-8') as f:
-            json.dump(metadata, f, indent=4)
+        payload = json.dumps(metadata, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+        with open(cache_path, 'wb') as f:
+            f.write(compress(payload, get_codec("RESULT_COMPRESSION")))
     except Exception as e:
         print(f"Failed to save to cache: {e}")
 
@@ -1,18 +1,84 @@
+import os
+import math
 import fitz
 
-def detect_pdf_type(pdf_path: str) -> str:
-    """Detect scanned (image-based) vs digital (text-based) PDF. Safe for corrupted/invalid PDFs."""
+# A page with more than this much text has a usable text layer (same threshold as ocr_pdf)
+PAGE_TEXT_MIN_CHARS = 10
+# Documents with at least this many pages are sampled first and may stop early
+DETECT_SAMPLE_MIN_PAGES = int(os.getenv("DETECT_SAMPLE_MIN_PAGES", "30"))
+# Stop sampling once unanimous samples give this confidence (rule of three: 1 - 3/n)
+DETECT_CONFIDENCE = float(os.getenv("DETECT_CONFIDENCE", "0.85"))
+
+
+def _classify_page(page) -> str:
+    if len(page.get_text().strip()) > PAGE_TEXT_MIN_CHARS:
+        return "digital"
+    # No text layer: needs OCR if there is something to read; blank pages count as digital
+    return "scanned" if page.get_images() else "digital"
+
+
+def _sample_order(page_count: int) -> list:
+    """First, last, then progressively finer strides, so any prefix is spread over the document."""
+    order, seen = [], set()
+    step = page_count
+    while step >= 1:
+        for i in list(range(0, page_count, step)) + [page_count - 1]:
+            if i not in seen:
+                seen.add(i)
+                order.append(i)
+        step //= 2
+    return order
+
+
+def classify_pages(pdf_path: str) -> dict:
+    """
+    Per-page scanned/digital map. Large documents are sampled spread-out first;
+    if the samples agree with DETECT_CONFIDENCE, the remaining pages get the same
+    label without being opened. Those labels are provisional: extract_text flags
+    pages that turn out to have no text layer, and ocr_pdf keeps the text layer of
+    pages that have one. Mixed documents are classified page by page.
+
+    Returns {"pdf_type": "digital"|"scanned"|"mixed", "pages": {page_no: label},
+    "provisional": [page_no], "page_count", "inspected", "sampled"} with 1-based
+    page numbers.
+    """
     doc = None
     try:
         doc = fitz.open(pdf_path)
-        total_text = 0
-        total_images = 0
-        for page in doc:
-            total_text += len(page.get_text().strip())
-            total_images += len(page.get_images())
-        if total_text < 200 and total_images > 0:
-            return "scanned"
-        return "digital"
+        page_count = doc.page_count
+        labels = {}
+        sampled = False
+        if page_count >= DETECT_SAMPLE_MIN_PAGES:
+            needed = math.ceil(3 / max(1e-6, 1 - DETECT_CONFIDENCE))
+            for n, i in enumerate(_sample_order(page_count), start=1):
+                labels[i] = _classify_page(doc[i])
+                if len(set(labels.values())) > 1:
+                    break  # mixed: every page needs its own label
+                if n >= needed:
+                    sampled = True
+                    break
+        provisional = []
+        if sampled:
+            label = next(iter(labels.values()))
+            provisional = [i + 1 for i in range(page_count) if i not in labels]
+            labels = {**{i: label for i in range(page_count)}, **labels}
+            inspected = n
+        else:
+            for i in range(page_count):
+                if i not in labels:
+                    labels[i] = _classify_page(doc[i])
+            inspected = page_count
+
+        kinds = set(labels.values())
+        pdf_type = "mixed" if len(kinds) > 1 else (kinds.pop() if kinds else "digital")
+        return {
+            "pdf_type": pdf_type,
+            "pages": {i + 1: labels[i] for i in sorted(labels)},
+            "provisional": provisional,
+            "page_count": page_count,
+            "inspected": inspected,
+            "sampled": sampled,
+        }
     except Exception as e:
         raise RuntimeError(f"PDF detection failed: {e}") from e
     finally:
@@ -21,3 +87,9 @@ def detect_pdf_type(pdf_path: str) -> str:
                 doc.close()
             except Exception:
                 pass
+
+
+def detect_pdf_type(pdf_path: str) -> str:
+    """Detect scanned (image-based) vs digital (text-based) PDF. Safe for corrupted/invalid PDFs."""
+    pdf_type = classify_pages(pdf_path)["pdf_type"]
+    return "scanned" if pdf_type == "scanned" else "digital"
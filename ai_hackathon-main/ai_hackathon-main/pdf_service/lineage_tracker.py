@@ -1,9 +1,13 @@
 import datetime
 
-def track_lineage(filename, confidence, method="Standard"):
-    return {
+def track_lineage(filename, confidence, method="Standard", details=None):
+    lineage = {
         "source": filename,
         "processed_at": datetime.datetime.utcnow().isoformat(),
         "confidence": confidence,
         "extraction_method": method
     }
+    if details:
+        # Per-stage processing figures (e.g. OCR render settings and peak memory)
+        lineage.update(details)
+    return lineage
@@ -6,12 +6,30 @@ from dotenv import load_dotenv
 
 load_dotenv()
 api_key = os.getenv("GEMINI_API_KEY")
+# Alternative Gemini endpoint, e.g. the local fake_gemini.py server for offline benchmarks
+GEMINI_BASE_URL = os.getenv("GEMINI_BASE_URL")
+
+def make_client(api_key, base_url=None):
+    """Gemini client, pointed at base_url (default GEMINI_BASE_URL) when one is set."""
+    base_url = base_url or GEMINI_BASE_URL
+    if base_url:
+        return genai.Client(api_key=api_key, http_options=genai.types.HttpOptions(base_url=base_url))
+    return genai.Client(api_key=api_key)
 
 if api_key:
-    client = genai.Client(api_key=api_key)
+    client = make_client(api_key)
 else:
     client = None
 
+# Optional cap on concurrent Gemini calls, shared across processes (set by the bulk
+# ingestion CLI so a large process pool does not stampede the API quota).
+_llm_slots = None
+
+def set_llm_limiter(semaphore):
+    """Installs a (multiprocessing) semaphore that every generate call must hold; None removes it."""
+    global _llm_slots
+    _llm_slots = semaphore
+
 def get_prioritized_models(client):
     """
     Returns a list of available models sorted by preference.
@@ -76,6 +94,9 @@ def generate_metadata_with_retry(model_id, prompt, max_retries=5):
     
     for attempt in range(max_retries):
         try:
+            if _llm_slots is not None:
+                with _llm_slots:
+                    return client.models.generate_content(model=model_id, contents=prompt)
             response = client.models.generate_content(
                 model=model_id,
                 contents=prompt
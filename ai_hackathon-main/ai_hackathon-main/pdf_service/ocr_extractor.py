@@ -1,37 +1,153 @@
-import easyocr
 import fitz # PyMuPDF
 import numpy as np
-from PIL import Image
 import os
 import gc
+import math
+try:
+    import resource  # not available on Windows
+except ImportError:
+    resource = None
+from pdf_service.detector import PAGE_TEXT_MIN_CHARS
 
-# Low Memory Mode for Render (disables OCR to stay < 512MB)
+# Low Memory Mode for Render (< 512MB): tight render budget, model freed after every file
 LOW_MEMORY_MODE = os.getenv("LOW_MEMORY_MODE", "false").lower() == "true"
+OCR_ENABLED = os.getenv("OCR_ENABLED", "true").lower() == "true"
+
+# Page rendering adapts to a per-render memory budget: drop DPI (not below OCR_MIN_DPI),
+# then split the page into tiles, so A0 scans and maps don't blow up the worker.
+OCR_DPI = int(os.getenv("OCR_DPI", "150"))
+OCR_MIN_DPI = int(os.getenv("OCR_MIN_DPI", "100"))
+OCR_MEMORY_BUDGET_MB = float(os.getenv("OCR_MEMORY_BUDGET_MB", "24" if LOW_MEMORY_MODE else "128"))
+OCR_GRAYSCALE = os.getenv("OCR_GRAYSCALE", "true").lower() == "true"
+OCR_TILE_OVERLAP_PT = 12  # so a text line on a tile border is fully inside one of the tiles
+# EasyOCR converts its input to a 3-channel BGR copy (plus a grey view), on top of the pixmap
+_RECOGNIZER_BYTES_PER_PIXEL = 3
 
 # Global variable for lazy loading
 _reader = None
+# Set when a Celery worker parent loaded the model before forking (services/worker_boot.py):
+# the children share it copy-on-write, so it is kept instead of freed after each file
+_preloaded = False
+
+def preload_reader() -> bool:
+    global _preloaded
+    if LOW_MEMORY_MODE or not OCR_ENABLED:
+        return False
+    get_reader()
+    _preloaded = True
+    return True
 
 def get_reader():
     global _reader
     if _reader is None:
+        import easyocr  # torch; only loaded once OCR actually runs
         print("Lazy loading EasyOCR Model...")
         # gpu=False significantly reduces memory overhead on CPU-only envs like Render Free Tier
         _reader = easyocr.Reader(['en'], gpu=False)
     return _reader
 
-def ocr_pdf(pdf_path: str):
+def render_settings() -> str:
+    """Settings that change OCR output; part of the page cache key."""
+    return f"{OCR_DPI}|{OCR_MIN_DPI}|{OCR_MEMORY_BUDGET_MB}|{OCR_GRAYSCALE}"
+
+def plan_render(width_pt: float, height_pt: float, budget_bytes: float = None,
+                dpi: int = None, min_dpi: int = None, grayscale: bool = None) -> dict:
+    """Chooses DPI, colorspace and tile grid so that each render stays within budget_bytes."""
+    budget_bytes = budget_bytes if budget_bytes is not None else OCR_MEMORY_BUDGET_MB * 1024 * 1024
+    dpi = dpi or OCR_DPI
+    min_dpi = min(min_dpi or OCR_MIN_DPI, dpi)
+    grayscale = OCR_GRAYSCALE if grayscale is None else grayscale
+    bytes_per_pixel = (1 if grayscale else 3) + _RECOGNIZER_BYTES_PER_PIXEL
+
+    def cost(d):
+        return (width_pt * d / 72) * (height_pt * d / 72) * bytes_per_pixel
+
+    if cost(dpi) > budget_bytes:
+        dpi = max(min_dpi, int(dpi * math.sqrt(budget_bytes / cost(dpi))))
+    tiles = max(1, math.ceil(cost(dpi) / budget_bytes))
+    # Roughly square tiles: wide maps get split into columns, tall scans into rows
+    cols = max(1, min(tiles, round(math.sqrt(tiles * width_pt / max(height_pt, 1)))))
+    rows = math.ceil(tiles / cols)
+    return {
+        "dpi": dpi,
+        "grayscale": grayscale,
+        "rows": rows,
+        "cols": cols,
+        "est_bytes": int(cost(dpi) / (rows * cols)),
+    }
+
+def _tile_rects(rect, rows: int, cols: int):
+    if rows == 1 and cols == 1:
+        yield None  # whole page, no clip
+        return
+    tile_w, tile_h = rect.width / cols, rect.height / rows
+    for r in range(rows):
+        for c in range(cols):
+            clip = fitz.Rect(rect.x0 + c * tile_w - OCR_TILE_OVERLAP_PT, rect.y0 + r * tile_h - OCR_TILE_OVERLAP_PT,
+                             rect.x0 + (c + 1) * tile_w + OCR_TILE_OVERLAP_PT, rect.y0 + (r + 1) * tile_h + OCR_TILE_OVERLAP_PT)
+            yield clip & rect
+
+def pixmap_to_array(pix) -> np.ndarray:
+    """
+    Wraps the pixmap's sample buffer as an ndarray without copying: (h, w) for
+    grayscale, which EasyOCR takes as its grey image directly, or (h, w, 3) for RGB.
+    The array borrows the pixmap's memory, so keep `pix` alive while it is in use.
+    """
+    if pix.alpha:
+        raise ValueError("render with alpha=False")
+    shape = (pix.height, pix.width) if pix.n == 1 else (pix.height, pix.width, pix.n)
+    strides = (pix.stride, 1) if pix.n == 1 else (pix.stride, pix.n, 1)
+    return np.ndarray(shape, dtype=np.uint8, buffer=pix.samples_mv, strides=strides)
+
+def _ocr_page(reader, page, stats: dict) -> str:
+    plan = plan_render(page.rect.width, page.rect.height)
+    colorspace = fitz.csGRAY if plan["grayscale"] else fitz.csRGB
+    texts = []
+    for clip in _tile_rects(page.rect, plan["rows"], plan["cols"]):
+        pix = page.get_pixmap(dpi=plan["dpi"], colorspace=colorspace, clip=clip, alpha=False)
+        stats["peak_pixmap_bytes"] = max(stats["peak_pixmap_bytes"], len(pix.samples_mv))
+        img_np = pixmap_to_array(pix)  # zero-copy view of the render
+        # detail=0 returns just the text
+        texts.extend(reader.readtext(img_np, detail=0, paragraph=True))
+        del img_np, pix  # view first, then the buffer it borrows
+    stats["peak_estimated_bytes"] = max(stats["peak_estimated_bytes"], plan["est_bytes"])
+    stats["min_dpi"] = min(stats["min_dpi"] or plan["dpi"], plan["dpi"])
+    if plan["rows"] * plan["cols"] > 1:
+        stats["tiled_pages"] += 1
+    return " ".join(texts)
+
+def _max_rss_bytes() -> int:
+    if resource is None:
+        return 0
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024  # KiB on Linux
+
+def ocr_pdf(pdf_path: str, stats: dict = None, pages_to_ocr=None):
+    """
+    OCR pages without a text layer. Pass `stats` (a dict) to get render/peak-memory figures back.
+    `pages_to_ocr` (1-based page numbers, e.g. from classify_pages) limits which pages are looked at.
+    """
     pages = []
+    stats = stats if stats is not None else {}
+    stats.update({
+        "budget_mb": OCR_MEMORY_BUDGET_MB, "ocr_pages": 0, "tiled_pages": 0, "min_dpi": None,
+        "peak_estimated_bytes": 0, "peak_pixmap_bytes": 0,
+    })
+    rss_before = _max_rss_bytes()
     
     try:
         reader = None # Delay loading reader until absolutely necessary
         doc = fitz.open(pdf_path)
         
+        wanted = set(pages_to_ocr) if pages_to_ocr is not None else None
         for i, page in enumerate(doc):
+            if wanted is not None and i + 1 not in wanted:
+                continue
             # HYBRID STRATEGY: Try instant text extraction first
             text_content = page.get_text().strip()
             
-            # If significant text found (e.g. > 10 chars), skip OCR
-            if len(text_content) > 10:
+            # If significant text found (same threshold as classify_pages), skip OCR;
+            # pages labelled scanned by sampling may well have a text layer
+            if len(text_content) > PAGE_TEXT_MIN_CHARS:
                 print(f"[Page {i+1}] Digital text found. Skipping OCR.")
                 pages.append({
                     "page": i + 1,
@@ -43,23 +159,18 @@ def ocr_pdf(pdf_path: str):
             print(f"[Page {i+1}] No text found. Running OCR...")
             
             if reader is None:
-                if LOW_MEMORY_MODE:
-                    print(f"[Page {i+1}] LOW_MEMORY_MODE active. Skipping OCR.")
+                if not OCR_ENABLED:
+                    print(f"[Page {i+1}] OCR disabled (OCR_ENABLED=false). Skipping OCR.")
                     pages.append({
                         "page": i + 1,
-                        "text": "[OCR Skipped due to Low Memory Mode]"
+                        "text": "[OCR Skipped: disabled]"
                     })
                     continue
                 reader = get_reader() # Load model only if needed
 
-            # Optimization: 150 DPI is sufficient for most LLM tasks and saves RAM
-            pix = page.get_pixmap(dpi=150) 
-            img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-            img_np = np.array(img)
-            
-            # detail=0 returns just the text
-            result = reader.readtext(img_np, detail=0, paragraph=True)
-            text_content = " ".join(result)
+            # DPI, grayscale and tiling chosen per page to fit OCR_MEMORY_BUDGET_MB
+            text_content = _ocr_page(reader, page, stats)
+            stats["ocr_pages"] += 1
             
             pages.append({
                 "page": i + 1,
@@ -73,11 +184,12 @@ def ocr_pdf(pdf_path: str):
         print(f"Error in OCR extraction: {e}")
         return []
     finally:
+        stats["rss_growth_bytes"] = max(0, _max_rss_bytes() - rss_before)
         # Cleanup reader if not needed anymore to free RAM
         # In LOW_MEMORY_MODE, we aggressively clear it after EVERY file.
         # Even without LOW_MEMORY_MODE, clearing it is safer for shared workers.
         global _reader
-        if _reader is not None:
+        if _reader is not None and not _preloaded:
              del _reader
              _reader = None
              gc.collect()
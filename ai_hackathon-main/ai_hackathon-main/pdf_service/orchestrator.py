@@ -1,12 +1,13 @@
-from pdf_service.detector import detect_pdf_type
+from pdf_service.detector import classify_pages
 from pdf_service.text_extractor import extract_text
-from pdf_service.ocr_extractor import ocr_pdf
-from pdf_service.table_extractor import extract_tables
 from pdf_service.junk_cleaner import clean_pages
 from pdf_service.semantic_mapper import semantic_map
 from pdf_service.confidence_scorer import score_confidence
 from pdf_service.metadata_generator import generate_metadata
 from pdf_service.lineage_tracker import track_lineage
+from pdf_service.page_cache import PageCache, hash_pages, summarize
+from pdf_service.text_extractor import TEXT_ENGINE
+from pdf_service.ocr_extractor import render_settings, OCR_ENABLED  # light: EasyOCR loads on first OCR
 
 def _default_metadata_error(msg: str):
     """Return IDMO-shaped error metadata so frontend and status checks work."""
@@ -19,61 +20,168 @@ def _default_metadata_error(msg: str):
         "summary": msg,
     }
 
-def process_pdf(pdf_path: str):
-    """Run PDF pipeline with per-stage error handling so one failure doesn't crash the job."""
+def _page_hashes(pdf_path: str) -> dict:
+    try:
+        return hash_pages(pdf_path)
+    except Exception as e:
+        print(f"[Orchestrator] Page hashing failed, page cache off for this file: {e}")
+        return {}
+
+def _split_cached(cache: PageCache, page_hashes: dict, page_numbers) -> tuple:
+    """(cached page dicts, page numbers still to extract). Without hashes everything is a miss."""
+    if not page_hashes:
+        return [], page_numbers
+    cached, todo = [], []
+    for n in (page_numbers if page_numbers is not None else sorted(page_hashes)):
+        hit = cache.get(page_hashes[n]) if n in page_hashes else None
+        if hit is None:
+            todo.append(n)
+        else:
+            cached.append({"page": n, "text": hit["text"]})
+    return cached, todo
+
+def _store_pages(cache: PageCache, page_hashes: dict, pages: list):
+    for p in pages:
+        if p.get("page") in page_hashes:
+            cache.put(page_hashes[p["page"]], {"text": p.get("text", "")})
+
+def _ocr_with_cache(pdf_path: str, ocr_stats: dict, cache: PageCache, page_hashes: dict, page_numbers) -> list:
+    cached, todo = _split_cached(cache, page_hashes, page_numbers)
+    ocr_pages = []
+    if todo is None or todo:
+        from pdf_service.ocr_extractor import ocr_pdf  # EasyOCR/torch loaded only when OCR runs
+        ocr_pages = ocr_pdf(pdf_path, ocr_stats, todo)
+        if OCR_ENABLED:  # don't cache "OCR skipped" placeholders
+            _store_pages(cache, page_hashes, ocr_pages)
+    return sorted(cached + ocr_pages, key=lambda p: p["page"])
+
+def run_text_stage(pdf_path: str) -> dict:
+    """Stage A: classify pages, then text extraction and/or OCR per page. Independent of the table stage."""
     errors = []
 
-    # 1. Detect type
+    # 1. Classify pages: only scanned pages get rasterized for OCR
+    page_map = None
+    classification = {}
     try:
-        pdf_type = detect_pdf_type(pdf_path)
+        classification = classify_pages(pdf_path)
+        pdf_type = classification["pdf_type"]
+        page_map = classification["pages"]
     except Exception as e:
         errors.append(f"Detection: {e}")
         pdf_type = "digital"  # fallback
+    digital_pages = None if page_map is None else [n for n, kind in page_map.items() if kind == "digital"]
+    scanned_pages = [] if page_map is None else [n for n, kind in page_map.items() if kind == "scanned"]
 
-    # 2. Extract text and tables
-    pages = []
-    tables = []
-    # 2. Extract Text/Tables (Based on type)
+    # 2. Extract Text (Based on type)
     pages = []
-    tables = []
+    ocr_stats = {}  # filled by ocr_pdf: render DPI/tiling and peak memory
     method = "Digital Extraction (PyMuPDF)"
-    if pdf_type == "digital":
+    # Per-page cache, keyed by page content: unchanged pages of a re-issued file are not re-extracted
+    page_hashes = _page_hashes(pdf_path)
+    text_cache = PageCache("text", TEXT_ENGINE)
+    ocr_cache = PageCache("ocr", render_settings())
+
+    if pdf_type in ("digital", "mixed"):
         try:
-            pages = extract_text(pdf_path)  # uses pdfplumber + PyMuPDF fallback
-            print(f"[Orchestrator] Digital text extraction completed. Pages found: {len(pages)}")
+            cached, todo = _split_cached(text_cache, page_hashes, digital_pages)
+            extracted = extract_text(pdf_path, todo) if todo is None or todo else []  # PyMuPDF, pdfplumber for complex pages
+            # Image pages without a text layer (a sampled label was wrong) are OCR'd below, not cached as text
+            recheck = [p["page"] for p in extracted if p.pop("needs_ocr", False)]
+            extracted = [p for p in extracted if p["page"] not in recheck]
+            _store_pages(text_cache, page_hashes, extracted)
+            pages = sorted(cached + extracted, key=lambda p: p["page"])
+            print(f"[Orchestrator] Digital text extraction completed. Pages found: {len(pages)} ({len(cached)} cached)")
+            # (with no text at all, the OCR fallback below covers the whole document)
+            if recheck and (pages or pdf_type == "mixed"):
+                print(f"[Orchestrator] {len(recheck)} page(s) have no text layer, adding them to OCR")
+                scanned_pages = sorted(set(scanned_pages) | set(recheck))
+                pdf_type = "mixed"
         except Exception as e:
             errors.append(f"Text extraction: {e}")
             print(f"[Orchestrator] Digital text extraction failed: {e}")
-        
+
+    if pdf_type == "digital":
         # If still no text (e.g. image-only PDF misdetected as digital), try OCR as last resort
         if not pages or not any(p.get("text", "").strip() for p in pages):
             print("[Orchestrator] Digital extraction empty or no text, attempting OCR fallback.")
             try:
-                pages = ocr_pdf(pdf_path)
+                pages = _ocr_with_cache(pdf_path, ocr_stats, ocr_cache, page_hashes, None)
                 if pages:
                     method = "OCR (fallback)"
                     print(f"[Orchestrator] OCR fallback completed. Pages found: {len(pages)}")
             except Exception as e:
                 errors.append(f"OCR fallback: {e}")
                 print(f"[Orchestrator] OCR fallback failed: {e}")
-    else: # pdf_type is not digital (e.g., scanned)
-        print("[Orchestrator] Scanned PDF detected, starting OCR...")
-        method = "OCR (EasyOCR + Hybrid)"
+    else: # scanned, or mixed: OCR only the pages classified as scanned
+        print(f"[Orchestrator] {len(scanned_pages)} scanned page(s) detected, starting OCR...")
+        method = "OCR (EasyOCR + Hybrid)" if pdf_type == "scanned" else "Mixed (Digital + OCR)"
         try:
-            pages = ocr_pdf(pdf_path)
-            print(f"[Orchestrator] OCR completed. Pages found: {len(pages)}")
+            ocr_pages = _ocr_with_cache(pdf_path, ocr_stats, ocr_cache, page_hashes, scanned_pages)
+            print(f"[Orchestrator] OCR completed. Pages found: {len(ocr_pages)}")
+            pages = sorted(pages + ocr_pages, key=lambda p: p["page"])
         except Exception as e:
             errors.append(f"OCR: {e}")
 
-    print(f"[Orchestrator] Step 3: Extracting Tables (Camelot)")
+    return {
+        "pdf_type": pdf_type,
+        "pages": pages,
+        "method": method,
+        "errors": errors,
+        "ocr_stats": ocr_stats,
+        "page_cache": {c.kind: c.stats() for c in (text_cache, ocr_cache)},
+        "page_classification": {
+            "inspected": classification.get("inspected"),
+            "sampled": classification.get("sampled", False),
+            "provisional": len(classification.get("provisional", [])),
+            "scanned_pages": scanned_pages,
+        },
+    }
+
+def run_table_stage(pdf_path: str) -> dict:
+    """Stage B: Camelot table extraction. Independent of the text stage."""
+    errors = []
+    print(f"[Orchestrator] Extracting Tables (Camelot)")
     tables = []
+    cache = PageCache("tables", "camelot-csv")  # compact table form (table_codec)
+    page_hashes = _page_hashes(pdf_path)
     try:
-        tables = extract_tables(pdf_path)
+        from pdf_service.table_extractor import extract_tables  # Camelot/OpenCV
+        cached, todo = [], None
+        if page_hashes:
+            todo = []
+            for n, page_hash in page_hashes.items():
+                hit = cache.get(page_hash)
+                if hit is None:
+                    todo.append(n)
+                else:
+                    cached.extend(hit)
+        extracted = []
+        if todo is None or todo:
+            try:
+                extracted = extract_tables(pdf_path, todo, strict=True)
+            except Exception as e:
+                # As before, a Camelot failure means "no tables" rather than a failed job; just not cached
+                print(f"[Orchestrator] Camelot failed: {e}")
+            else:
+                by_page = {}
+                for table in extracted:
+                    by_page.setdefault(int(table["page"]), []).append(table)
+                for n in todo or []:
+                    cache.put(page_hashes[n], by_page.get(n, []))  # [] = page has no tables
+        tables = sorted(cached + extracted, key=lambda t: (int(t["page"]), t.get("order", 0)))
+        for i, table in enumerate(tables):
+            table["table_id"] = i
         print(f"[Orchestrator] Table extraction completed. Tables found: {len(tables)}")
     except Exception as e:
          print(f"[Orchestrator] Table extraction failed: {e}")
          errors.append(f"Table extraction: {e}")
+    return {"tables": tables, "errors": errors, "page_cache": {cache.kind: cache.stats()}}
 
+def finalize_pdf(source: str, text_stage: dict, table_stage: dict) -> dict:
+    """Stage C: clean, map, score and generate metadata once text and tables are both available."""
+    errors = list(text_stage.get("errors", [])) + list(table_stage.get("errors", []))
+    pages = text_stage.get("pages") or []
+    tables = table_stage.get("tables") or []
 
     if not pages:
         errors.append("No text could be extracted from the PDF (empty or unsupported).")
@@ -112,10 +220,18 @@ def process_pdf(pdf_path: str):
             metadata = _default_metadata_error(str(e))
             errors.append(str(e))
 
-    lineage = track_lineage(pdf_path, confidence, method)
+    details = {}
+    if text_stage.get("page_classification"):
+        details["page_classification"] = text_stage["page_classification"]
+    if text_stage.get("ocr_stats"):
+        details["ocr"] = text_stage["ocr_stats"]
+    cache_stats = summarize(text_stage.get("page_cache"), table_stage.get("page_cache"))
+    if len(cache_stats) > 1:  # more than just hit_rate: at least one lookup happened
+        details["page_cache"] = cache_stats
+    lineage = track_lineage(source, confidence, text_stage.get("method", "Standard"), details)
 
     return {
-        "pdf_type": pdf_type,
+        "pdf_type": text_stage.get("pdf_type", "digital"),
         "pages": clean_pages_data,
         "tables": tables,
         "semantic": semantic,
@@ -124,3 +240,9 @@ def process_pdf(pdf_path: str):
         "lineage": lineage,
         "_errors": errors,
     }
+
+def process_pdf(pdf_path: str):
+    """Run PDF pipeline with per-stage error handling so one failure doesn't crash the job."""
+    text_stage = run_text_stage(pdf_path)
+    table_stage = run_table_stage(pdf_path)
+    return finalize_pdf(pdf_path, text_stage, table_stage)
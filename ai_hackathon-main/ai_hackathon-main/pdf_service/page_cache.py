@@ -0,0 +1,98 @@
+import os
+import json
+import hashlib
+import tempfile
+import fitz
+from services.compression import get_codec, compress, decompress
+
+# Per-page results (text, OCR, tables) keyed by a hash of the page's content, so a
+# re-issued report with one corrected page or documents sharing annexures only pay
+# for the pages that are actually new. Files are pruned by the storage GC's age quota.
+PAGE_CACHE_DIR = os.getenv("PAGE_CACHE_DIR", "outputs/page_cache")
+PAGE_CACHE_ENABLED = os.getenv("PAGE_CACHE_ENABLED", "true").lower() == "true"
+PAGE_CACHE_VERSION = "1"  # bump when extraction output changes shape
+
+
+def hash_pages(pdf_path: str) -> dict:
+    """
+    {page_no: hex digest} over what determines a page's output: its content stream,
+    geometry, embedded images (raw bytes) and fonts. 1-based page numbers.
+    """
+    hashes = {}
+    with fitz.open(pdf_path) as doc:
+        for i, page in enumerate(doc):
+            h = hashlib.sha256()
+            h.update(f"{tuple(page.rect)}|{page.rotation}".encode())
+            h.update(page.read_contents() or b"")
+            for img in page.get_images(full=True):
+                try:
+                    h.update(hashlib.sha256(doc.xref_stream_raw(img[0]) or b"").digest())
+                except Exception:
+                    h.update(str(img).encode())
+            for font in page.get_fonts(full=True):
+                h.update(f"{font[3]}|{font[5]}".encode())  # basefont, encoding
+            hashes[i + 1] = h.hexdigest()
+    return hashes
+
+
+class PageCache:
+    """One JSON file per (kind, settings, page hash); kinds are written by independent stages."""
+
+    def __init__(self, kind: str, settings: str = "", cache_dir: str = None):
+        self.kind = kind
+        self.tag = hashlib.sha256(f"{PAGE_CACHE_VERSION}|{settings}".encode()).hexdigest()[:12]
+        self.dir = os.path.join(cache_dir or PAGE_CACHE_DIR, kind)
+        self.codec = get_codec("RESULT_COMPRESSION")
+        self.hits = 0
+        self.lookups = 0
+
+    def _path(self, page_hash: str) -> str:
+        return os.path.join(self.dir, page_hash[:2], f"{page_hash}-{self.tag}.json")
+
+    def get(self, page_hash: str):
+        """Cached value or None. Counts towards the hit rate."""
+        if not PAGE_CACHE_ENABLED:
+            return None
+        self.lookups += 1
+        path = self._path(page_hash)
+        try:
+            with open(path, 'rb') as f:
+                value = json.loads(decompress(f.read()))
+            os.utime(path)  # recently used entries survive the GC's age quota
+        except (OSError, ValueError):
+            return None
+        self.hits += 1
+        return value
+
+    def put(self, page_hash: str, value):
+        if not PAGE_CACHE_ENABLED:
+            return
+        path = self._path(page_hash)
+        tmp_path = None
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp_", suffix=".json")
+            payload = json.dumps(value, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+            with os.fdopen(fd, 'wb') as f:
+                f.write(compress(payload, self.codec))
+            os.replace(tmp_path, path)
+            tmp_path = None
+        except Exception as e:
+            print(f"[PageCache] Failed to save {self.kind} page: {e}")
+        finally:
+            if tmp_path and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "lookups": self.lookups}
+
+
+def summarize(*stage_stats) -> dict:
+    """Combines the {kind: {hits, lookups}} dicts reported by each stage and adds the overall page hit rate."""
+    summary = {}
+    for stats in stage_stats:
+        summary.update({kind: s for kind, s in (stats or {}).items() if s.get("lookups")})
+    lookups = sum(s["lookups"] for s in summary.values())
+    hits = sum(s["hits"] for s in summary.values())
+    summary["hit_rate"] = round(hits / lookups, 3) if lookups else 0.0
+    return summary
@@ -1,3 +1,5 @@
+from pdf_service.table_codec import table_header
+
 def semantic_map(tables):
     mappings = {}
     
@@ -20,11 +22,10 @@ def semantic_map(tables):
     total_cols = 0
 
     for table in tables:
-        # Tables now have 'data' as List of Lists. 
-        # Assume First Row is header
-        if not table.get("data"): continue
-        
-        headers = table["data"][0]
+        # Assume First Row is header; only the header is read, never the full grid
+        headers = table_header(table)
+        if not headers: continue
+
         total_cols += len(headers)
         
         for col in headers:
@@ -0,0 +1,39 @@
+import io
+import csv
+
+# Extracted tables travel through the pipeline (page cache, stage handover, result
+# storage) as one CSV string plus shape and header, instead of a list of lists with
+# a Python string per cell. Grids are only rebuilt for the tables a client reads.
+
+
+def clean_frame(df):
+    """Vectorized cell cleaning: NaN/None -> "", everything as stripped strings."""
+    df = df.fillna("").astype(str)
+    return df.apply(lambda col: col.str.strip())
+
+
+def encode_frame(df) -> dict:
+    """{"n_rows", "n_cols", "header", "csv"} for a cleaned DataFrame (first row = header, as extracted)."""
+    n_rows, n_cols = df.shape
+    return {
+        "n_rows": int(n_rows),
+        "n_cols": int(n_cols),
+        "header": df.iloc[0].tolist() if n_rows else [],
+        "csv": df.to_csv(index=False, header=False, lineterminator="\n"),
+    }
+
+
+def table_header(table: dict) -> list:
+    """Header row without decoding the grid; legacy tables carry the grid in "data"."""
+    if "header" in table:
+        return table["header"] or []
+    data = table.get("data") or []
+    return data[0] if data else []
+
+
+def table_rows(table: dict) -> list:
+    """The full grid as a list of rows of strings, for either representation."""
+    if "csv" not in table:
+        return table.get("data") or []
+    return list(csv.reader(io.StringIO(table["csv"])))
+
@@ -1,35 +1,34 @@
 import camelot
-import math
+from pdf_service.table_codec import clean_frame, encode_frame
 
-def _clean_cell(cell):
-    """Normalize a table cell: strip whitespace, NaN/None -> empty string."""
-    if cell is None or (isinstance(cell, float) and math.isnan(cell)):
-        return ""
-    s = str(cell).strip()
-    return s
-
-def extract_tables(pdf_path: str) -> list:
-    """Extract tables from PDF. Returns [] on any failure (Camelot can fail on many PDFs)."""
+def extract_tables(pdf_path: str, pages=None, strict: bool = False) -> list:
+    """
+    Extract tables from PDF. Returns [] on any failure (Camelot can fail on many PDFs),
+    or raises with strict=True so callers can tell "no tables" from "failed".
+    `pages` (1-based page numbers) restricts extraction.
+    """
+    page_spec = ",".join(str(n) for n in sorted(pages)) if pages is not None else "all"
     try:
-        print(f"[TableExtractor] Starting Camelot read_pdf for {pdf_path}...")
-        tables = camelot.read_pdf(pdf_path, pages="all")
+        print(f"[TableExtractor] Starting Camelot read_pdf for {pdf_path} (pages={page_spec})...")
+        tables = camelot.read_pdf(pdf_path, pages=page_spec)
         print(f"[TableExtractor] Camelot finished. Found {len(tables)} tables.")
     except Exception as e:
         print(f"[TableExtractor] Camelot failed: {e}")
+        if strict:
+            raise
         return []
 
     extracted = []
     for i, table in enumerate(tables):
         try:
-            data_grid = table.df.values.tolist()
-            cleaned_grid = [[_clean_cell(c) for c in row] for row in data_grid]
             extracted.append({
                 "table_id": i,
                 "page": getattr(table, "page", i + 1),
                 "accuracy": getattr(table, "accuracy", 0),
                 "whitespace": getattr(table, "whitespace", 0),
                 "order": getattr(table, "order", 0),
-                "data": cleaned_grid,
+                # Compact form: CSV text plus shape and header row (see table_codec)
+                **encode_frame(clean_frame(table.df)),
             })
         except Exception:
             continue
@@ -1,20 +1,159 @@
-import pdfplumber
-import fitz  # PyMuPDF fallback when pdfplumber fails
+import os
+import sys
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import fitz  # PyMuPDF: fast default engine
+from pdf_service.detector import PAGE_TEXT_MIN_CHARS
 
-def extract_text(pdf_path: str) -> list:
-    """Extract text from digital PDF. Tries pdfplumber first, then PyMuPDF (fitz) as fallback."""
-    pages = _extract_with_pdfplumber(pdf_path)
-    if pages and any(p.get("text", "").strip() for p in pages):
-        return pages
-    # Fallback: many PDFs work better with PyMuPDF (e.g. embedded fonts, odd encodings)
-    return _extract_with_fitz(pdf_path)
+# auto = PyMuPDF per page, pdfplumber only for complex-layout pages;
+# pdfplumber = old behaviour (pdfplumber for all pages, PyMuPDF if that finds nothing); fitz = PyMuPDF only
+TEXT_ENGINE = os.getenv("TEXT_ENGINE", "auto").lower()
+# Page ranges are extracted in parallel processes for documents at least this long,
+# on the CPUs an outer job pool (local workers, bulk ingest, Celery) leaves free.
+TEXT_PARALLEL_MIN_PAGES = int(os.getenv("TEXT_PARALLEL_MIN_PAGES", "24"))
+TEXT_WORKERS = int(os.getenv("TEXT_WORKERS", "4"))  # upper bound; the CPUs actually free decide
+
+_active_lock = threading.Lock()
+_active_extractions = 0  # parallel extractions running in this process (e.g. BackgroundTasks threads)
+_outer_pool_size = 0  # job processes in the pool this process belongs to, see set_outer_pool_size
+
+# Complex-layout heuristic: ruled tables (many line/rect drawing ops) or a text
+# layer PyMuPDF decodes badly. pdfplumber keeps table rows on one line there.
+COMPLEX_MIN_RULINGS = 12
+COMPLEX_MAX_BAD_CHARS = 0.05
+
+def extract_text(pdf_path: str, pages=None) -> list:
+    """
+    Extract text from digital PDF. By default PyMuPDF (fitz) per page, with pdfplumber for
+    complex-layout pages; see TEXT_ENGINE for the previous pdfplumber-first behaviour.
+    `pages` (1-based page numbers) restricts extraction, e.g. to the digital pages of a mixed PDF.
+    Pages with images but no usable text layer (e.g. labelled digital by sampling) come back
+    with "needs_ocr": True.
+    """
+    wanted = set(pages) if pages is not None else None
+    if TEXT_ENGINE == "pdfplumber":
+        result = _extract_with_pdfplumber(pdf_path, wanted)
+        if result and any(p.get("text", "").strip() for p in result):
+            return result
+        # Fallback: many PDFs work better with PyMuPDF (e.g. embedded fonts, odd encodings)
+        return _extract_with_fitz(pdf_path, wanted)
+
+    try:
+        with fitz.open(pdf_path) as doc:
+            page_count = doc.page_count
+    except Exception:
+        return []
+    page_numbers = [n for n in sorted(wanted) if 1 <= n <= page_count] if wanted is not None else list(range(1, page_count + 1))
+    return _extract_pages(pdf_path, page_numbers, use_plumber=(TEXT_ENGINE == "auto"))
+
+
+def _is_complex(page, text: str) -> bool:
+    if text:
+        bad = text.count("\ufffd")  # replacement char: undecodable glyphs
+        if bad / len(text) > COMPLEX_MAX_BAD_CHARS:
+            return True
+    try:
+        rulings = sum(len(d["items"]) for d in page.get_cdrawings())
+    except Exception:
+        return False
+    return rulings >= COMPLEX_MIN_RULINGS
+
+
+def _extract_range(pdf_path: str, page_numbers: list, use_plumber: bool = True) -> list:
+    """Extracts the given pages in this process. Picklable by reference for the process pool."""
+    pages = []
+    plumber = None
+    try:
+        with fitz.open(pdf_path) as doc:
+            for n in page_numbers:
+                page = doc[n - 1]
+                text = page.get_text().strip()
+                if use_plumber and _is_complex(page, text):
+                    try:
+                        if plumber is None:
+                            import pdfplumber
+                            plumber = pdfplumber.open(pdf_path)
+                        plumber_text = (plumber.pages[n - 1].extract_text() or "").strip()
+                        text = plumber_text or text
+                    except Exception:
+                        pass  # keep the PyMuPDF text
+                entry = {"page": n, "text": text}
+                if len(text) <= PAGE_TEXT_MIN_CHARS and page.get_images():
+                    entry["needs_ocr"] = True
+                pages.append(entry)
+    finally:
+        if plumber is not None:
+            plumber.close()
+    return pages
+
+
+def _cpu_count() -> int:
+    try:
+        return len(os.sched_getaffinity(0))  # respects container CPU pinning
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def set_outer_pool_size(workers: int):
+    """Called by a job pool's worker initializer: this process shares the CPUs with `workers` jobs."""
+    global _outer_pool_size
+    _outer_pool_size = max(1, workers)
+
+
+def _jobs_sharing_cpus() -> int:
+    """Jobs that may run at once on this machine's CPUs alongside this one (itself included)."""
+    celery = sys.modules.get("celery")  # never imported here just to check
+    try:
+        task = celery.current_task if celery is not None else None
+        if task:
+            # The worker's prefork pool size (per queue, see celery_app.configure_queue_pool)
+            return max(1, int(task.app.conf.worker_concurrency or _cpu_count()))
+    except Exception:
+        pass
+    if _outer_pool_size:
+        return _outer_pool_size
+    if multiprocessing.parent_process() is not None:
+        return _cpu_count()  # a pool that did not say how big it is: assume it fills the CPUs
+    return 1
+
+
+def _extract_pages(pdf_path: str, page_numbers: list, use_plumber: bool) -> list:
+    global _active_extractions
+    if len(page_numbers) < TEXT_PARALLEL_MIN_PAGES:
+        return _extract_range(pdf_path, page_numbers, use_plumber)
+    with _active_lock:
+        _active_extractions += 1
+        # CPUs left per job by the outer pool, shared with the other extractions in this process
+        spare = _cpu_count() // (_jobs_sharing_cpus() * _active_extractions)
+    try:
+        workers = min(TEXT_WORKERS, spare, len(page_numbers) // max(1, TEXT_PARALLEL_MIN_PAGES // 2))
+        if workers < 2:
+            return _extract_range(pdf_path, page_numbers, use_plumber)
+        # Contiguous ranges, so each worker reads a compact part of the file
+        size = -(-len(page_numbers) // workers)
+        ranges = [page_numbers[i:i + size] for i in range(0, len(page_numbers), size)]
+        try:
+            # spawn: a forked child would inherit the caller's threads and locks (API, lease heartbeats)
+            with ProcessPoolExecutor(max_workers=len(ranges), mp_context=multiprocessing.get_context("spawn")) as pool:
+                results = list(pool.map(_extract_range, [pdf_path] * len(ranges), ranges, [use_plumber] * len(ranges)))
+        except (AssertionError, OSError, RuntimeError) as e:
+            print(f"[TextExtractor] Parallel extraction unavailable ({e}); extracting sequentially.")
+            return _extract_range(pdf_path, page_numbers, use_plumber)
+        return [page for chunk in results for page in chunk]
+    finally:
+        with _active_lock:
+            _active_extractions -= 1
 
 
-def _extract_with_pdfplumber(pdf_path: str) -> list:
+def _extract_with_pdfplumber(pdf_path: str, wanted=None) -> list:
     try:
+        import pdfplumber
         pages = []
         with pdfplumber.open(pdf_path) as pdf:
             for i, page in enumerate(pdf.pages):
+                if wanted is not None and i + 1 not in wanted:
+                    continue
                 try:
                     text = page.extract_text()
                 except Exception:
@@ -25,13 +164,15 @@ def _extract_with_pdfplumber(pdf_path: str) -> list:
         return []
 
 
-def _extract_with_fitz(pdf_path: str) -> list:
+def _extract_with_fitz(pdf_path: str, wanted=None) -> list:
     """Fallback text extraction using PyMuPDF (fitz). More reliable for some PDFs."""
     doc = None
     try:
         doc = fitz.open(pdf_path)
         pages = []
         for i, page in enumerate(doc):
+            if wanted is not None and i + 1 not in wanted:
+                continue
             text = page.get_text().strip()
             pages.append({"page": i + 1, "text": text})
         return pages
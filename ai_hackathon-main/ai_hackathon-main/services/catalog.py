@@ -0,0 +1,82 @@
+import re
+import calendar
+from typing import Dict, Any
+
+# Flattening of IDMO metadata records into the fields the catalog search indexes.
+# Shared with the synthesizer, which merges the same sections across records.
+
+_DATE_RE = re.compile(r"\b(\d{4})(?:-(0[1-9]|1[0-2])(?:-(\d{2}))?)?\b")
+# Indian fiscal years ("2011-12", "FY 2019-20"): April to March. Checked before _DATE_RE,
+# which would read the second part as a month.
+_FISCAL_RE = re.compile(r"\b(\d{4})[-\u2013/](\d{2})\b(?!-\d)")
+
+
+def section(record, key):
+    value = record.get(key) if isinstance(record, dict) else None
+    return value if isinstance(value, dict) else {}
+
+
+def idmo_blob(record: Dict[str, Any]) -> Dict[str, Any]:
+    """IDMO metadata: top-level for spreadsheets, under "metadata" for PDFs."""
+    return (record.get("metadata") or record) if isinstance(record, dict) else {}
+
+
+def parse_temporal_range(value):
+    """Return (start, end) ISO dates found in a free-form temporal_range string, or (None, None)."""
+    if not value or not isinstance(value, str):
+        return None, None
+    starts, ends = [], []
+
+    def fiscal_year(match):
+        year, short = int(match.group(1)), int(match.group(2))
+        if short != (year + 1) % 100 or not 1800 <= year <= 2200:
+            return match.group(0)
+        starts.append(f"{year}-04-01")
+        ends.append(f"{year + 1}-03-31")
+        return " "
+
+    value = _FISCAL_RE.sub(fiscal_year, value)
+    for year, month, day in _DATE_RE.findall(value):
+        if not 1800 <= int(year) <= 2200:
+            continue
+        starts.append(f"{year}-{month or '01'}-{day or '01'}")
+        if day:
+            ends.append(f"{year}-{month}-{day}")
+        elif month:
+            ends.append(f"{year}-{month}-{calendar.monthrange(int(year), int(month))[1]:02d}")
+        else:
+            ends.append(f"{year}-12-31")
+    if not starts:
+        return None, None
+    return min(starts), max(ends)
+
+
+def _text(value) -> str:
+    return str(value).strip() if value is not None else ""
+
+
+def catalog_fields(record: Dict[str, Any]) -> Dict[str, Any]:
+    """Searchable fields of a finished job: catalog_info, provenance and spatial_temporal, flattened."""
+    idmo = idmo_blob(record)
+    catalog = section(idmo, "catalog_info")
+    provenance = section(idmo, "provenance")
+    spatial = section(idmo, "spatial_temporal")
+    keywords = catalog.get("keywords") or []
+    if not isinstance(keywords, list):
+        keywords = [keywords]
+    start, end = parse_temporal_range(spatial.get("temporal_range"))
+    return {
+        "title": _text(catalog.get("title")),
+        "description": _text(catalog.get("description")),
+        "sector": _text(catalog.get("sector")),
+        "keywords": [_text(k) for k in keywords if _text(k)],
+        "source": _text(provenance.get("source")),
+        "jurisdiction": _text(provenance.get("jurisdiction")),
+        "data_owner": _text(provenance.get("data_owner")),
+        "temporal_range": _text(spatial.get("temporal_range")),
+        "temporal_start": start,
+        "temporal_end": end,
+        "spatial_coverage": _text(spatial.get("spatial_coverage")),
+        "granularity": _text(spatial.get("granularity")),
+        "original_filename": _text(record.get("original_filename")),
+    }
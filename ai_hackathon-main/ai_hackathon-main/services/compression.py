@@ -0,0 +1,93 @@
+import os
+import gzip
+import shutil
+
+# zstd is optional: faster and smaller than gzip, but gzip is always available
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+GZIP_MAGIC = b"\x1f\x8b"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+CODEC_SUFFIXES = {"zstd": ".zst", "gzip": ".gz"}
+
+# Formats that are already compressed internally; recompressing them wastes CPU
+INCOMPRESSIBLE_EXTENSIONS = {".xlsx", ".zip", ".gz", ".zst", ".png", ".jpg", ".jpeg", ".parquet"}
+
+
+def get_codec(env_var: str) -> str:
+    """Reads a codec setting ("none", "gzip" or "zstd") from the environment."""
+    codec = os.getenv(env_var, "none").strip().lower()
+    if codec in ("", "none", "false", "off"):
+        return "none"
+    if codec in ("zstd", "zst"):
+        if ZSTD_AVAILABLE:
+            return "zstd"
+        print(f"{env_var}=zstd but 'zstandard' is not installed. Using gzip.")
+        return "gzip"
+    if codec in ("gzip", "gz"):
+        return "gzip"
+    print(f"Unknown {env_var} value '{codec}'. Compression disabled.")
+    return "none"
+
+
+def compress(data: bytes, codec: str) -> bytes:
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=3).compress(data)
+    if codec == "gzip":
+        return gzip.compress(data, compresslevel=6)
+    return data
+
+
+def decompress(data: bytes) -> bytes:
+    """Decompresses gzip/zstd data detected by magic bytes; anything else is returned as is."""
+    if data[:4] == ZSTD_MAGIC:
+        if not ZSTD_AVAILABLE:
+            raise RuntimeError("Data is zstd-compressed but 'zstandard' is not installed")
+        return zstandard.ZstdDecompressor().decompressobj().decompress(data)
+    if data[:2] == GZIP_MAGIC:
+        return gzip.decompress(data)
+    return data
+
+
+class _ClosingGzipFile(gzip.GzipFile):
+    """GzipFile that also closes the wrapped file object."""
+
+    def close(self):
+        fileobj = self.fileobj
+        try:
+            super().close()
+        finally:
+            if fileobj is not None and hasattr(fileobj, "close"):
+                fileobj.close()
+
+
+def decompressing_stream(fileobj, codec: str):
+    """Wraps a raw (compressed) file-like object in a streaming decompressor."""
+    if codec == "zstd":
+        if not ZSTD_AVAILABLE:
+            raise RuntimeError("Object is zstd-compressed but 'zstandard' is not installed")
+        return zstandard.ZstdDecompressor().stream_reader(fileobj, closefd=True)
+    if codec == "gzip":
+        return _ClosingGzipFile(fileobj=fileobj, mode="rb")
+    return fileobj
+
+
+def copy_compressed(src, dst, codec: str, chunk_size: int = 1024 * 1024):
+    """Streams src into dst through the codec's compressor, one chunk at a time."""
+    if codec == "zstd":
+        writer = zstandard.ZstdCompressor(level=3).stream_writer(dst, closefd=False)
+    elif codec == "gzip":
+        writer = gzip.GzipFile(fileobj=dst, mode="wb", compresslevel=6)
+    else:
+        shutil.copyfileobj(src, dst, chunk_size)
+        return
+    with writer:
+        shutil.copyfileobj(src, writer, chunk_size)
+
+
+def should_compress(filename: str) -> bool:
+    return os.path.splitext(filename)[1].lower() not in INCOMPRESSIBLE_EXTENSIONS
@@ -1,27 +1,163 @@
 import os
 import json
+import base64
+import sqlite3
+import tempfile
+import time
+import threading
+import importlib.util
+from collections import OrderedDict
 from abc import ABC, abstractmethod
 from datetime import datetime
 from typing import Dict, Any, Optional
+from services.compression import get_codec, compress, decompress
+from services.leases import lease_is_live, worker_id
 
-# SQLAlchemy imports for Postgres
-try:
-    from sqlalchemy import create_engine, Column, String, JSON, DateTime, Integer
-    from sqlalchemy.orm import sessionmaker, declarative_base
-    from sqlalchemy.exc import SQLAlchemyError
-    SQLALCHEMY_AVAILABLE = True
-except ImportError:
-    SQLALCHEMY_AVAILABLE = False
-
-Base = declarative_base() if SQLALCHEMY_AVAILABLE else object
-
-# Define Model for Postgres
-if SQLALCHEMY_AVAILABLE:
-    class MetadataModel(Base):
-        __tablename__ = 'metadata'
-        file_hash = Column(String, primary_key=True)
-        data = Column(JSON)
-        created_at = Column(DateTime, default=datetime.utcnow)
+# SQLAlchemy is only imported when DATABASE_URL selects Postgres (services.postgres_db),
+# so the API and JSON-DB deployments do not pay for it at startup
+SQLALCHEMY_AVAILABLE = importlib.util.find_spec("sqlalchemy") is not None
+
+JOB_FIELDS = ("status", "task_type", "original_filename", "size")
+JOB_LIST_MAX = 200
+# Claim lock files: a claim takes milliseconds, so a lock older than JOB_LOCK_STALE_SECONDS
+# (or whose owner process on this host is gone) was left by a crash. Kept below the wait.
+JOB_LOCK_WAIT_SECONDS = 5
+JOB_LOCK_STALE_SECONDS = 2
+
+
+def job_fields(metadata: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Listing columns of a record. Final results do not repeat task_type/size from the
+    queued record, so None means "keep the stored value".
+    """
+    task_type = metadata.get("task_type")
+    if task_type is None and ("pdf_type" in metadata or "tables_index" in metadata):
+        task_type = "pdf"
+    size = metadata.get("size")
+    return {
+        "status": metadata.get("status"),
+        "task_type": task_type,
+        "original_filename": metadata.get("original_filename"),
+        "size": int(size) if isinstance(size, (int, float)) else None,
+    }
+
+
+def _utcnow_iso() -> str:
+    return datetime.utcnow().isoformat(timespec="microseconds")
+
+
+def encode_cursor(updated_at: str, file_hash: str) -> str:
+    return base64.urlsafe_b64encode(json.dumps([updated_at, file_hash]).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple:
+    """(updated_at ISO string, file_hash) from a list_jobs cursor. Raises ValueError if malformed."""
+    try:
+        updated_at, file_hash = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        datetime.fromisoformat(updated_at)
+        return updated_at, str(file_hash)
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from e
+
+
+class JobIndex:
+    """
+    Listing columns of the local JSON database in a small SQLite file next to the
+    shards, so job listings do not read every record. Rebuilt from the shards when
+    the file is missing.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.fresh = not os.path.exists(path)
+        self._local = threading.local()
+
+    def _conn(self) -> sqlite3.Connection:
+        # Per thread and per process: connections must not cross a fork (Celery prefork)
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    file_hash TEXT PRIMARY KEY,
+                    status TEXT,
+                    task_type TEXT,
+                    original_filename TEXT COLLATE NOCASE,
+                    size INTEGER,
+                    updated_at TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS ix_jobs_updated ON jobs (updated_at, file_hash);
+                CREATE INDEX IF NOT EXISTS ix_jobs_status ON jobs (status, updated_at, file_hash);
+                CREATE INDEX IF NOT EXISTS ix_jobs_task_type ON jobs (task_type, updated_at, file_hash);
+                CREATE INDEX IF NOT EXISTS ix_jobs_filename ON jobs (original_filename);
+                CREATE INDEX IF NOT EXISTS ix_jobs_size ON jobs (size);
+            """)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def upsert(self, file_hash: str, metadata: Dict[str, Any], updated_at: Optional[str] = None):
+        fields = job_fields(metadata)
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "INSERT INTO jobs (file_hash, status, task_type, original_filename, size, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT(file_hash) DO UPDATE SET status = excluded.status, "
+                "task_type = COALESCE(excluded.task_type, jobs.task_type), "
+                "original_filename = COALESCE(excluded.original_filename, jobs.original_filename), "
+                "size = COALESCE(excluded.size, jobs.size), updated_at = excluded.updated_at",
+                (file_hash, fields["status"], fields["task_type"], fields["original_filename"], fields["size"],
+                 updated_at or _utcnow_iso()),
+            )
+
+    def rebuild(self, entries):
+        """Bulk-loads (file_hash, record, updated_at) tuples in one transaction."""
+        conn = self._conn()
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO jobs (file_hash, status, task_type, original_filename, size, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                ((file_hash, *job_fields(record).values(), updated_at) for file_hash, record, updated_at in entries),
+            )
+
+    def delete(self, file_hash: str):
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM jobs WHERE file_hash = ?", (file_hash,))
+
+    def list(self, status=None, task_type=None, filename=None, limit=50, cursor=None) -> Dict[str, Any]:
+        clauses, params = [], []
+        for column, value in (("status", status), ("task_type", task_type)):
+            if value:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        if filename:
+            clauses.append("original_filename LIKE ? ESCAPE '\\'")
+            params.append(_like_prefix(filename))
+        if cursor:
+            clauses.append("(updated_at, file_hash) < (?, ?)")
+            params.extend(decode_cursor(cursor))
+        where = (" WHERE " + " AND ".join(clauses)) if clauses else ""
+        rows = self._conn().execute(
+            "SELECT file_hash, status, task_type, original_filename, size, updated_at FROM jobs"
+            f"{where} ORDER BY updated_at DESC, file_hash DESC LIMIT ?", params + [limit + 1],
+        ).fetchall()
+        keys = ("file_hash",) + JOB_FIELDS + ("updated_at",)
+        return _job_page([dict(zip(keys, row)) for row in rows], limit)
+
+
+def _like_prefix(prefix: str) -> str:
+    return prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+
+
+def _job_page(items: list, limit: int) -> Dict[str, Any]:
+    """Trims the extra row fetched to detect a next page and builds its cursor."""
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        next_cursor = encode_cursor(items[-1]["updated_at"], items[-1]["file_hash"])
+    return {"items": items, "next_cursor": next_cursor}
 
 class DatabaseService(ABC):
     @abstractmethod
@@ -34,71 +170,237 @@ class DatabaseService(ABC):
         """Retrieves metadata by file hash."""
         pass
 
+    @abstractmethod
+    def delete_metadata(self, file_hash: str):
+        """Deletes the record for a file hash (no-op if missing)."""
+        pass
+
+    @abstractmethod
+    def iter_metadata(self):
+        """Yields (file_hash, record) for every stored record (maintenance jobs such as reindexing)."""
+        pass
+
+    @abstractmethod
+    def list_jobs(self, status: Optional[str] = None, task_type: Optional[str] = None,
+                  filename: Optional[str] = None, limit: int = 50, cursor: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Most recently updated jobs first, optionally filtered by status, task type and
+        filename prefix. Keyset pagination: pass the returned next_cursor to get the
+        following page. Returns {"items": [{file_hash, status, task_type,
+        original_filename, size, updated_at}], "next_cursor"}.
+        """
+        pass
+
+    def renew_lease(self, file_hash: str, record: Dict[str, Any]):
+        """
+        Saves a record whose only change is its lease (worker heartbeat). Backends keep
+        updated_at as it was, so heartbeats do not move running jobs in list_jobs pages.
+        """
+        self.save_metadata(file_hash, record)
+
+    def claim_job(self, file_hash: str, record: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Starts a job unless one is already in flight. Returns the existing record if
+        it holds a live lease (caller should attach to it), otherwise saves `record`
+        and returns None. Backends override this to make check-and-set atomic.
+        """
+        existing = self.get_metadata(file_hash)
+        if lease_is_live(existing):
+            return existing
+        self.save_metadata(file_hash, record)
+        return None
+
 class JsonFileDB(DatabaseService):
-    def __init__(self, cache_dir: str = "outputs/cache"):
+    """
+    Local JSON database.
+
+    Records live in hash-prefix shards (``cache/ab/<hash>.json``), are written
+    compactly via temp file + rename so readers never see a partial file, and
+    are fronted by a bounded in-process LRU. Cache entries are validated against
+    the file's mtime/size, so writes from other processes (e.g. a Celery worker)
+    are picked up on the next poll. With RESULT_COMPRESSION set, files are
+    gzip/zstd-compressed; old uncompressed files remain readable.
+    """
+
+    def __init__(self, cache_dir: str = "outputs/cache", lru_size: Optional[int] = None):
         self.cache_dir = cache_dir
         os.makedirs(self.cache_dir, exist_ok=True)
+        self.lru_size = lru_size if lru_size is not None else int(os.getenv("JSON_DB_LRU_SIZE", "1024"))
+        self._lru: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Optional at-rest compression; reads detect the codec from magic bytes
+        self.codec = get_codec("RESULT_COMPRESSION")
+        self.jobs = JobIndex(os.path.join(self.cache_dir, "jobs_index.db"))
+        if self.jobs.fresh:
+            self._rebuild_job_index()
+
+    def _rebuild_job_index(self):
+        """Indexes records written before the index existed, dated by file mtime."""
+        def entries():
+            for file_hash, record in self.iter_metadata():
+                try:
+                    mtime = os.path.getmtime(self._path(file_hash))
+                except OSError:
+                    mtime = os.path.getmtime(self._legacy_path(file_hash))
+                yield file_hash, record, datetime.utcfromtimestamp(mtime).isoformat(timespec="microseconds")
+        try:
+            self.jobs.rebuild(entries())
+        except Exception as e:
+            print(f"Failed to build job index: {e}")
+
+    def _path(self, file_hash: str) -> str:
+        return os.path.join(self.cache_dir, file_hash[:2], f"{file_hash}.json")
+
+    def _legacy_path(self, file_hash: str) -> str:
+        # Pre-sharding layout: everything flat in cache_dir
+        return os.path.join(self.cache_dir, f"{file_hash}.json")
 
     def save_metadata(self, file_hash: str, metadata: Dict[str, Any]):
-        path = os.path.join(self.cache_dir, f"{file_hash}.json")
+        self._write(file_hash, metadata, index=True)
+
+    def renew_lease(self, file_hash: str, record: Dict[str, Any]):
+        # Listing columns are unchanged; skipping the index keeps updated_at
+        self._write(file_hash, record, index=False)
+
+    def _write(self, file_hash: str, metadata: Dict[str, Any], index: bool):
+        path = self._path(file_hash)
+        tmp_path = None
         try:
-            with open(path, 'w', encoding='utf-8') as f:
-                json.dump(metadata, f, indent=4)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp_", suffix=".json")
+            payload = json.dumps(metadata, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+            with os.fdopen(fd, 'wb') as f:
+                f.write(compress(payload, self.codec))
+            os.replace(tmp_path, path)
+            tmp_path = None
+            legacy = self._legacy_path(file_hash)
+            if os.path.exists(legacy):
+                os.remove(legacy)
+            if index:
+                self.jobs.upsert(file_hash, metadata)
         except Exception as e:
             print(f"Failed to save JSON cache: {e}")
+        finally:
+            if tmp_path and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            with self._lock:
+                self._lru.pop(file_hash, None)
 
     def get_metadata(self, file_hash: str) -> Optional[Dict[str, Any]]:
-        path = os.path.join(self.cache_dir, f"{file_hash}.json")
-        if os.path.exists(path):
+        path = self._path(file_hash)
+        try:
+            st = os.stat(path)
+        except OSError:
+            path = self._legacy_path(file_hash)
             try:
-                with open(path, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    if isinstance(data, dict):
-                         data["_db_source"] = "local_json"
-                    return data
-            except Exception:
+                st = os.stat(path)
+            except OSError:
                 return None
-        return None
+        stamp = (path, st.st_mtime_ns, st.st_size)
 
-class PostgresDB(DatabaseService):
-    def __init__(self, connection_string: str):
-        if not SQLALCHEMY_AVAILABLE:
-            raise ImportError("SQLAlchemy is not installed. Please install it to use PostgresDB.")
-        self.engine = create_engine(connection_string)
-        Base.metadata.create_all(self.engine) # Ensure table exists
-        self.Session = sessionmaker(bind=self.engine)
+        # The LRU keeps the decompressed JSON, not the dict: every reader decodes its own
+        # copy, so callers editing nested sections never change what the next one sees
+        payload = None
+        with self._lock:
+            entry = self._lru.get(file_hash)
+            if entry is not None and entry[0] == stamp:
+                self._lru.move_to_end(file_hash)
+                payload = entry[1]
 
-    def save_metadata(self, file_hash: str, metadata: Dict[str, Any]):
-        session = self.Session()
         try:
-            # Check if exists, update or insert
-            existing = session.query(MetadataModel).filter_by(file_hash=file_hash).first()
-            if existing:
-                existing.data = metadata
-                existing.created_at = datetime.utcnow()
+            if payload is None:
+                with open(path, 'rb') as f:
+                    raw = decompress(f.read())
+                data = json.loads(raw)
+                if self.lru_size > 0 and isinstance(data, dict):
+                    with self._lock:
+                        self._lru[file_hash] = (stamp, raw)
+                        self._lru.move_to_end(file_hash)
+                        while len(self._lru) > self.lru_size:
+                            self._lru.popitem(last=False)
             else:
-                new_record = MetadataModel(file_hash=file_hash, data=metadata)
-                session.add(new_record)
-            session.commit()
-        except SQLAlchemyError as e:
-            session.rollback()
-            print(f"Postgres Error: {e}")
-            raise e
-        finally:
-            session.close()
+                data = json.loads(payload)
+        except Exception:
+            return None
+        if not isinstance(data, dict):
+            return data
+        data["_db_source"] = "local_json"
+        return data
 
-    def get_metadata(self, file_hash: str) -> Optional[Dict[str, Any]]:
-        session = self.Session()
+    def delete_metadata(self, file_hash: str):
+        for path in (self._path(file_hash), self._legacy_path(file_hash)):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        with self._lock:
+            self._lru.pop(file_hash, None)
+        self.jobs.delete(file_hash)
+
+    def list_jobs(self, status=None, task_type=None, filename=None, limit=50, cursor=None) -> Dict[str, Any]:
+        return self.jobs.list(status, task_type, filename, min(max(limit, 1), JOB_LIST_MAX), cursor)
+
+    def iter_metadata(self):
+        for root, _, files in os.walk(self.cache_dir):
+            for name in sorted(files):
+                if not name.endswith(".json") or name.startswith(".tmp_"):
+                    continue
+                file_hash = name[:-len(".json")]
+                record = self.get_metadata(file_hash)
+                if isinstance(record, dict):
+                    yield file_hash, record
+
+    def claim_job(self, file_hash: str, record: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        # Exclusive lock file serializes claims across API workers on this host
+        lock_path = self._path(file_hash) + ".lock"
+        os.makedirs(os.path.dirname(lock_path), exist_ok=True)
+        deadline = time.monotonic() + JOB_LOCK_WAIT_SECONDS
+        while True:
+            try:
+                fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                break
+            except FileExistsError:
+                try:
+                    if _lock_is_stale(lock_path):
+                        os.remove(lock_path)
+                        continue
+                except OSError:
+                    continue
+                if time.monotonic() > deadline:
+                    raise TimeoutError(f"Timed out waiting for job lock on {file_hash}")
+                time.sleep(0.01)
         try:
-            record = session.query(MetadataModel).filter_by(file_hash=file_hash).first()
-            if record:
-                data = record.data
-                if isinstance(data, dict):
-                    data["_db_source"] = "postgres"
-                return data
-            return None
+            os.write(fd, worker_id().encode())
+            os.close(fd)
+            return super().claim_job(file_hash, record)
         finally:
-            session.close()
+            try:
+                os.remove(lock_path)
+            except OSError:
+                pass
+
+def _lock_is_stale(lock_path: str) -> bool:
+    """True if the claim lock's owner (host:pid) died on this host, or the lock is too old to be live."""
+    if time.time() - os.path.getmtime(lock_path) > JOB_LOCK_STALE_SECONDS:
+        return True
+    with open(lock_path) as f:
+        host, _, pid = f.read().rpartition(":")
+    if host != worker_id().rpartition(":")[0] or not pid.isdigit():
+        return False  # another host, or the owner has not written its id yet
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return True
+    except OSError:
+        pass  # exists, owned by another user
+    return False
+
+def __getattr__(name: str):
+    # PostgresDB/MetadataModel used to live here
+    if name in ("PostgresDB", "MetadataModel"):
+        from services import postgres_db
+        return getattr(postgres_db, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 def get_db_service() -> DatabaseService:
     """Factory to get DB service."""
@@ -108,6 +410,7 @@ def get_db_service() -> DatabaseService:
         if not SQLALCHEMY_AVAILABLE:
             print("DATABASE_URL found but SQLAlchemy missing. Using JSON DB.")
             return JsonFileDB()
+        from services.postgres_db import PostgresDB
         print("Using PostgreSQL Database")
         return PostgresDB(db_url)
     
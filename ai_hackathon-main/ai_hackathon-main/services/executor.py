@@ -0,0 +1,141 @@
+import os
+import math
+import time
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Optional, Dict, Any
+
+# Local job executor for USE_CELERY=false: CPU-heavy OCR/Camelot work runs in
+# separate processes instead of the API's threadpool, with a bounded queue.
+LOCAL_WORKERS = int(os.getenv("LOCAL_WORKERS", "1"))  # 0 = legacy in-process BackgroundTasks
+LOCAL_MAX_QUEUE = int(os.getenv("LOCAL_MAX_QUEUE", "16"))
+LOCAL_MAX_TASKS_PER_CHILD = int(os.getenv("LOCAL_MAX_TASKS_PER_CHILD", "20"))
+
+
+def _init_worker(max_workers: int):
+    """Lets PDF text extraction in this worker use only the CPUs the other workers leave free."""
+    from pdf_service.text_extractor import set_outer_pool_size
+    set_outer_pool_size(max_workers)
+
+
+class QueueFullError(Exception):
+    """Raised when the local executor cannot accept another job."""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Local job queue is full. Retry after {retry_after}s.")
+        self.retry_after = retry_after
+
+
+class LocalJobExecutor:
+    """
+    Process pool with a bounded number of pending jobs (running + waiting).
+
+    Uses the "spawn" start method so workers never inherit the API's threads or
+    open connections, and recycles each worker after max_tasks_per_child jobs.
+    """
+
+    def __init__(self, max_workers: int = LOCAL_WORKERS, max_queue: int = LOCAL_MAX_QUEUE,
+                 max_tasks_per_child: int = LOCAL_MAX_TASKS_PER_CHILD,
+                 on_failure: Optional[Callable[[tuple, BaseException], None]] = None):
+        self.max_workers = max(1, max_workers)
+        self.max_queue = max(0, max_queue)
+        self.max_tasks_per_child = max_tasks_per_child
+        self.on_failure = on_failure
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._completed = 0
+        self._failed = 0
+        self._avg_seconds = 30.0  # moving average of job duration, seeds Retry-After
+
+    @property
+    def capacity(self) -> int:
+        return self.max_workers + self.max_queue
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            kwargs = {}
+            if self.max_tasks_per_child > 0:
+                kwargs["max_tasks_per_child"] = self.max_tasks_per_child
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(self.max_workers,),
+                **kwargs,
+            )
+        return self._pool
+
+    def retry_after(self) -> int:
+        """Seconds until a slot is likely to free up."""
+        waves = max(1, math.ceil((self._pending - self.max_workers + 1) / self.max_workers))
+        return max(1, int(waves * self._avg_seconds))
+
+    def is_full(self) -> bool:
+        with self._lock:
+            return self._pending >= self.capacity
+
+    def submit(self, fn: Callable, *args):
+        """Queues fn(*args) in a worker process, or raises QueueFullError."""
+        with self._lock:
+            if self._pending >= self.capacity:
+                raise QueueFullError(self.retry_after())
+            self._pending += 1
+            try:
+                pool = self._get_pool()
+                try:
+                    future = pool.submit(fn, *args)
+                except BrokenProcessPool:
+                    # A worker died (e.g. OOM-killed); start a fresh pool
+                    self._discard_pool(pool)
+                    pool = self._get_pool()
+                    future = pool.submit(fn, *args)
+            except Exception:
+                self._pending -= 1
+                raise
+        started = time.monotonic()
+        future.add_done_callback(lambda f: self._on_done(f, pool, args, started))
+        return future
+
+    def _discard_pool(self, pool: ProcessPoolExecutor):
+        """Drops a broken pool (caller holds the lock). Late failures from an
+        older pool must not throw away the replacement."""
+        if self._pool is pool:
+            self._pool = None
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def _on_done(self, future, pool: ProcessPoolExecutor, args: tuple, started: float):
+        exc = future.exception() if not future.cancelled() else None
+        with self._lock:
+            self._pending -= 1
+            if exc is None:
+                self._completed += 1
+                self._avg_seconds = 0.8 * self._avg_seconds + 0.2 * (time.monotonic() - started)
+            else:
+                self._failed += 1
+                if isinstance(exc, BrokenProcessPool):
+                    self._discard_pool(pool)
+        if exc is not None and self.on_failure is not None:
+            try:
+                self.on_failure(args, exc)
+            except Exception as e:
+                print(f"[Executor] on_failure hook failed: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "workers": self.max_workers,
+                "running": min(self._pending, self.max_workers),
+                "queued": max(0, self._pending - self.max_workers),
+                "max_queue": self.max_queue,
+                "completed": self._completed,
+                "failed": self._failed,
+                "avg_job_seconds": round(self._avg_seconds, 1),
+            }
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
@@ -0,0 +1,189 @@
+import os
+import json
+import hashlib
+import tempfile
+from typing import Dict, Any, List, Optional
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    import pyarrow.ipc as pa_ipc
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+# Typed columnar downloads of harmonized spreadsheets. Column types come from the
+# harmonizer's schema_details; the file is converted in chunks of rows and the
+# result is kept in storage under exports/<hash>/ (evicted with the hash by the GC).
+EXPORT_CHUNK_ROWS = int(os.getenv("EXPORT_CHUNK_ROWS", "100000"))
+EXPORT_PARQUET_COMPRESSION = os.getenv("EXPORT_PARQUET_COMPRESSION", "zstd")
+# Ambiguous dates like 04/03/2021 are read day first (dd/mm/yyyy, the usual order in Indian data)
+EXPORT_DAYFIRST = os.getenv("EXPORT_DAYFIRST", "true").lower() == "true"
+EXPORT_VERSION = "2"  # bump when casting rules change, so cached exports are rebuilt
+
+EXPORT_FORMATS = {"parquet": ".parquet", "arrow": ".arrow"}
+TABULAR_EXTENSIONS = ('.csv', '.xlsx', '.xls')
+
+_INT_TYPES = {"int", "integer", "int64", "int32", "long", "bigint"}
+_FLOAT_TYPES = {"float", "double", "decimal", "number", "numeric", "real"}
+_BOOL_TYPES = {"bool", "boolean"}
+_DATE_TYPES = {"date", "datetime", "timestamp"}
+_TRUE = {"true", "yes", "y", "1", "t"}
+_FALSE = {"false", "no", "n", "0", "f"}
+
+
+def declared_kind(type_name: Optional[str]) -> str:
+    """Normalizes a schema_details type ("Int", "Float", "String", ...) to int/float/bool/date/string."""
+    name = str(type_name or "").strip().lower()
+    if name in _INT_TYPES:
+        return "int"
+    if name in _FLOAT_TYPES:
+        return "float"
+    if name in _BOOL_TYPES:
+        return "bool"
+    if name in _DATE_TYPES:
+        return "date"
+    return "string"
+
+
+def _arrow_type(kind: str):
+    return {"int": pa.int64(), "float": pa.float64(), "bool": pa.bool_(),
+            "date": pa.timestamp("us"), "string": pa.string()}[kind]
+
+
+def plan_columns(source_columns: List[str], schema_details: List[Dict[str, Any]]) -> List[Dict[str, str]]:
+    """[{source, name, kind}] in file order: standardized (deduplicated) names and declared kinds."""
+    by_column = {str(item["column"]): item for item in schema_details or [] if isinstance(item, dict) and "column" in item}
+    plan, seen = [], {}
+    for column in source_columns:
+        item = by_column.get(str(column), {})
+        name = str(item.get("standardized_header") or column)
+        seen[name] = seen.get(name, 0) + 1
+        if seen[name] > 1:
+            name = f"{name}_{seen[name]}"
+        plan.append({"source": column, "name": name, "kind": declared_kind(item.get("type"))})
+    return plan
+
+
+def _parse_dates(s):
+    """ISO dates as such; anything else with EXPORT_DAYFIRST. Unparseable values become null."""
+    import pandas as pd
+
+    parsed = pd.to_datetime(s, format="ISO8601", errors="coerce")
+    rest = parsed.isna() & s.notna()
+    if rest.any():
+        parsed[rest] = pd.to_datetime(s[rest], dayfirst=EXPORT_DAYFIRST, errors="coerce")
+    return parsed
+
+
+def cast_chunk(df, plan: List[Dict[str, str]]):
+    """Vectorized casts of a chunk read as strings; values that do not parse become null."""
+    import pandas as pd
+
+    columns = {}
+    for col in plan:
+        s = df[col["source"]]
+        kind = col["kind"]
+        if kind in ("int", "float"):
+            # "1,234" style thousands separators are common in government datasets
+            numbers = pd.to_numeric(s.str.replace(",", "", regex=False).str.strip(), errors="coerce")
+            if kind == "int":
+                numbers = numbers.where(numbers.isna() | (numbers % 1 == 0)).astype("Int64")
+            columns[col["name"]] = numbers
+        elif kind == "bool":
+            lowered = s.str.strip().str.lower()
+            flags = pd.Series(pd.NA, index=s.index, dtype="boolean")
+            flags[lowered.isin(_TRUE)] = True
+            flags[lowered.isin(_FALSE)] = False
+            columns[col["name"]] = flags
+        elif kind == "date":
+            columns[col["name"]] = _parse_dates(s)
+        else:
+            columns[col["name"]] = s
+    return pd.DataFrame(columns)
+
+
+def _iter_chunks(src_path: str, ext: str):
+    import pandas as pd
+
+    if ext == '.csv':
+        yield from pd.read_csv(src_path, dtype=str, chunksize=EXPORT_CHUNK_ROWS)
+        return
+    # openpyxl has no streaming reader in pandas; write it out in chunks all the same
+    df = pd.read_excel(src_path, dtype=str)
+    for start in range(0, max(len(df), 1), EXPORT_CHUNK_ROWS):
+        yield df.iloc[start:start + EXPORT_CHUNK_ROWS]
+
+
+def write_columnar(src_path: str, ext: str, schema_details: List[Dict[str, Any]], fmt: str, out_path: str) -> Dict[str, Any]:
+    """Converts a CSV/Excel file to typed Parquet or Arrow IPC (file format). Returns row/null stats."""
+    if not PYARROW_AVAILABLE:
+        raise RuntimeError("pyarrow is not installed")
+    writer = None
+    schema = None
+    plan = None
+    stats = {"rows": 0, "coerced_to_null": {}}
+    try:
+        for chunk in _iter_chunks(src_path, ext):
+            if plan is None:
+                plan = plan_columns(list(chunk.columns), schema_details)
+                schema = pa.schema([(col["name"], _arrow_type(col["kind"])) for col in plan])
+                if fmt == "parquet":
+                    writer = pq.ParquetWriter(out_path, schema, compression=EXPORT_PARQUET_COMPRESSION)
+                else:
+                    writer = pa_ipc.new_file(out_path, schema)
+            typed = cast_chunk(chunk, plan)
+            for col in plan:
+                if col["kind"] != "string":
+                    lost = int((typed[col["name"]].isna() & chunk[col["source"]].notna()).sum())
+                    if lost:
+                        stats["coerced_to_null"][col["name"]] = stats["coerced_to_null"].get(col["name"], 0) + lost
+            table = pa.Table.from_pandas(typed, schema=schema, preserve_index=False)
+            if fmt == "parquet":
+                writer.write_table(table)
+            else:
+                writer.write(table)
+            stats["rows"] += len(typed)
+    finally:
+        if writer is not None:
+            writer.close()
+    return stats
+
+
+def export_key(file_hash: str, fmt: str, schema_details: List[Dict[str, Any]]) -> str:
+    """Storage key of the cached export; changes with the schema and date order it was typed with."""
+    tag = hashlib.sha256(
+        f"{EXPORT_VERSION}|{EXPORT_DAYFIRST}|{json.dumps(schema_details or [], sort_keys=True)}".encode()
+    ).hexdigest()[:12]
+    return f"exports/{file_hash}/harmonized_{tag}{EXPORT_FORMATS[fmt]}"
+
+
+def build_export(storage, file_hash: str, source_filename: str, schema_details: List[Dict[str, Any]],
+                 fmt: str, out_path: str) -> bool:
+    """
+    Writes the typed export to out_path, from the storage cache when present.
+    Returns True on a cache hit. Otherwise converts the source and stores the result.
+    """
+    key = export_key(file_hash, fmt, schema_details)
+    try:
+        storage.download_to(key, out_path)
+        return True
+    except Exception:
+        pass  # not exported yet
+
+    ext = os.path.splitext(source_filename)[1].lower()
+    fd, src_path = tempfile.mkstemp(suffix=ext, prefix="aikosh_export_src_")
+    os.close(fd)
+    try:
+        storage.download_to(source_filename, src_path)
+        stats = write_columnar(src_path, ext, schema_details, fmt, out_path)
+    finally:
+        if os.path.exists(src_path):
+            os.remove(src_path)
+    print(f"[Export] {file_hash} -> {fmt}: {stats['rows']} rows, coerced to null: {stats['coerced_to_null'] or 'none'}")
+    try:
+        with open(out_path, "rb") as f:
+            storage.save_stream(f, key)
+    except Exception as e:
+        print(f"[Export] Failed to cache {key}: {e}")
+    return False
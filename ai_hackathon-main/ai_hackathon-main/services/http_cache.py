@@ -0,0 +1,62 @@
+import os
+import json
+import hashlib
+from typing import Dict, Any, Optional
+
+# HTTP caching of finished, content-addressed results. Status, result pages and
+# downloads of a successful record get an ETag (file hash + record version +
+# request variant), so clients revalidate with If-None-Match and get a 304 without
+# a body. The plain URLs answer "no-cache": reprocessing a hash changes the record
+# under the same URL. Only URLs that name the record version (?v=<completed_at>,
+# as returned by /status) are cached as "immutable". ETags are weak because
+# GZipMiddleware serves the same representation with and without gzip encoding.
+HTTP_CACHE_MAX_AGE = int(os.getenv("HTTP_CACHE_MAX_AGE", str(365 * 24 * 3600)))
+# Bump when rendering of finished artifacts changes (CSV renaming, export casting),
+# so revalidating clients get the new representation instead of a 304. Immutable
+# copies of versioned URLs are not revalidated and keep the old rendering until
+# HTTP_CACHE_MAX_AGE expires.
+HTTP_CACHE_VERSION = "2"
+
+IMMUTABLE_CACHE_CONTROL = f"public, max-age={HTTP_CACHE_MAX_AGE}, immutable"
+# Unversioned URLs and jobs still processing (or failed, evicted): always revalidate
+REVALIDATE_CACHE_CONTROL = "no-cache"
+
+# Keys added on read by the DB layer, not part of the stored record
+_TRANSIENT_KEYS = {"_db_source", "_is_cached"}
+
+
+def record_version(record: Dict[str, Any]) -> str:
+    """Version of a stored record: its completion stamp, or a digest for records saved before stamping."""
+    if record.get("completed_at"):
+        return str(record["completed_at"])
+    stable = {k: v for k, v in record.items() if k not in _TRANSIENT_KEYS}
+    return hashlib.sha256(json.dumps(stable, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+
+def is_versioned(record: Dict[str, Any], version: Optional[str]) -> bool:
+    """True if a request's ?v= names the current version of a finished record."""
+    return bool(version) and record.get("status") == "success" and version == record_version(record)
+
+
+def result_etag(file_hash: str, record: Dict[str, Any], *variant) -> Optional[str]:
+    """Weak ETag for a representation of a finished result; None while the job can still change."""
+    if record.get("status") != "success":
+        return None
+    key = "|".join([HTTP_CACHE_VERSION, file_hash, record_version(record), *map(str, variant)])
+    return f'W/"{hashlib.sha256(key.encode()).hexdigest()[:32]}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: Optional[str]) -> bool:
+    """If-None-Match evaluation (weak comparison, as RFC 9110 specifies for this header)."""
+    if not if_none_match or not etag:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == opaque for tag in if_none_match.split(","))
+
+
+def cache_headers(etag: Optional[str], immutable: bool = False) -> Dict[str, str]:
+    if etag is None:
+        return {"Cache-Control": REVALIDATE_CACHE_CONTROL}
+    return {"ETag": etag, "Cache-Control": IMMUTABLE_CACHE_CONTROL if immutable else REVALIDATE_CACHE_CONTROL}
@@ -0,0 +1,139 @@
+import os
+import tempfile
+import gc
+from datetime import datetime
+from contextlib import contextmanager
+from typing import Dict, Any
+from services.storage import get_storage_service
+from services.database import get_db_service
+from services.results import offload_pdf_payload
+from services.leases import LeaseKeeper
+from services.search import get_search_index
+
+# Import core logic (existing files)
+# We assume these are in the python path (root dir)
+import sys
+sys.path.append(os.getcwd()) # Ensure root is in path
+
+# Pipeline modules (pandas, Gemini SDK, PyMuPDF, Camelot, EasyOCR/torch) are imported
+# inside the jobs that run them, and Celery lives in services.tasks: the API imports
+# this module to run local jobs without loading either.
+
+def _idmo_blob(data: dict) -> dict:
+    """Get the IDMO metadata blob (for harmonize it's top-level; for PDF it's under 'metadata')."""
+    return data.get("metadata") or data
+
+@contextmanager
+def _local_copy(storage, filename: str):
+    """Downloads a stored file to a private temp path and removes it afterwards."""
+    # Safe temp file: filename may contain path separators on some systems
+    ext = os.path.splitext(filename)[1] or ".bin"
+    fd, temp_path = tempfile.mkstemp(suffix=ext, prefix="aikosh_worker_")
+    os.close(fd)
+    try:
+        # Streaming; parallel ranged GETs on S3
+        storage.download_to(filename, temp_path)
+        yield temp_path
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+def _save_result(db, file_hash: str, filename: str, result_metadata: Dict[str, Any]) -> Dict[str, Any]:
+    """Adds tracking info, decides success/error and saves the final record."""
+    # Add tracking info
+    result_metadata["file_hash"] = file_hash
+    result_metadata["original_filename"] = filename
+    result_metadata["_worker_processed"] = True
+
+    # CRITICAL: explicit status update for frontend polling
+    # For PDF, error can be in result_metadata["metadata"], top-level, or _errors from orchestrator
+    print(f"[Worker] Checking for errors in result")
+    idmo = _idmo_blob(result_metadata)
+    pdf_errors = result_metadata.pop("_errors", None)  # list of per-stage errors
+    has_error = (
+        pdf_errors
+        or "error" in result_metadata
+        or result_metadata.get("title") == "Processing Error"
+        or "error" in idmo
+        or idmo.get("title") == "Processing Error"
+    )
+    if has_error:
+        result_metadata["status"] = "error"
+        result_metadata["error_message"] = (
+            "; ".join(pdf_errors)
+            if pdf_errors
+            else result_metadata.get("error")
+            or result_metadata.get("summary")
+            or idmo.get("error")
+            or idmo.get("summary")
+            or "Processing failed"
+        )
+        print(f"[Worker] Failure Detected: {result_metadata['error_message']}")
+    else:
+        result_metadata["status"] = "success"
+    # Record version for HTTP caching (ETags change if the hash is ever reprocessed)
+    result_metadata["completed_at"] = datetime.utcnow().isoformat(timespec="microseconds")
+
+    print(f"[Worker] Saving to DB")
+    db.save_metadata(file_hash, result_metadata)
+    # Catalog search: successful results become searchable as soon as they are saved
+    get_search_index().update(file_hash, result_metadata)
+    print(f"[Worker] Finished {filename}")
+    return result_metadata
+
+def _save_error(db, file_hash: str, error: Exception):
+    # Save error state to DB so frontend knows it failed
+    db.save_metadata(file_hash, {"file_hash": file_hash, "status": "error", "error_message": str(error)})
+    get_search_index().update(file_hash, {"status": "error"})
+
+def process_file(file_hash: str, filename: str, task_type: str = "harmonize"):
+    """
+    Processes a stored file (Celery task, local worker or BackgroundTasks).
+    1. Downloads file from Storage (S3/Local).
+    2. Runs processing (Harmonize or PDF).
+    3. Saves result to Database (Postgres/JSON).
+    """
+    storage = get_storage_service()
+    db = get_db_service()
+
+    try:
+        print(f"[Worker] Processing {filename} ({task_type})")
+        result_metadata = {}
+
+        # Heartbeat the lease while working so re-uploads attach instead of re-queueing
+        with LeaseKeeper(db, file_hash), _local_copy(storage, filename) as temp_path:
+            if task_type == "harmonize":
+                # Excel/CSV
+                from ingester import extract_file_info
+                from harmonizer import get_aikosh_metadata
+                print(f"[Worker] Step 1: Extracting info from {temp_path}")
+                raw_info = extract_file_info(temp_path)
+                # Need to patch the filename in raw_info because temp_path is ugly
+                raw_info.filename = filename
+
+                print(f"[Worker] Step 2: Calling Harmonizer (AI)")
+                result_metadata = get_aikosh_metadata(raw_info)
+                print(f"[Worker] Step 3: Harmonization Complete")
+
+            elif task_type == "pdf":
+                print(f"[Worker] Step 1: Orchestrating PDF")
+                from pdf_service.orchestrator import process_pdf
+                # PDF Orchestrator
+                result = process_pdf(temp_path)
+                # Page text and table grids go to storage; the DB row keeps slim metadata + refs
+                result_metadata = offload_pdf_payload(storage, file_hash, result)
+                print(f"[Worker] Step 2: PDF Complete")
+
+        return _save_result(db, file_hash, filename, result_metadata)
+
+    except Exception as e:
+        print(f"[Worker] Error processing {filename}: {e}")
+        _save_error(db, file_hash, e)
+        raise e
+    finally:
+        # Explicit GC
+        gc.collect()
+
+def run_local_job(file_hash: str, filename: str, task_type: str = "harmonize"):
+    """Entry point for the local process pool (USE_CELERY=false). Picklable by reference."""
+    process_file(file_hash, filename, task_type)
@@ -0,0 +1,91 @@
+import os
+import time
+import socket
+import threading
+from typing import Dict, Any, Optional
+
+# A "processing" record carries a lease. Workers renew it with heartbeats while
+# they run; a re-upload of the same hash attaches to the job while the lease is
+# live and only re-queues it once the lease has expired (worker died, job lost).
+LEASE_TTL_SECONDS = int(os.getenv("LEASE_TTL_SECONDS", "60"))
+LEASE_HEARTBEAT_SECONDS = int(os.getenv("LEASE_HEARTBEAT_SECONDS", "15"))
+# Queued jobs have no worker yet, so the dispatch lease must cover time spent waiting in the queue
+LEASE_QUEUE_TTL_SECONDS = int(os.getenv("LEASE_QUEUE_TTL_SECONDS", "900"))
+
+
+def worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def new_lease(owner: str, ttl: int, now: Optional[float] = None) -> Dict[str, Any]:
+    now = now if now is not None else time.time()
+    return {"owner": owner, "heartbeat_at": now, "expires_at": now + ttl}
+
+
+def lease_is_live(record: Optional[Dict[str, Any]], now: Optional[float] = None) -> bool:
+    """True if record is a processing job whose lease has not expired. Legacy records without a lease are stale."""
+    if not record or record.get("status") != "processing":
+        return False
+    lease = record.get("lease")
+    if not isinstance(lease, dict):
+        return False
+    now = now if now is not None else time.time()
+    return lease.get("expires_at", 0) > now
+
+
+class LeaseKeeper:
+    """
+    Context manager for a worker running a job: takes over the lease on entry and
+    renews it on a background thread until exit. The thread is joined on exit, so
+    the caller's final save can never be overwritten by a late heartbeat.
+    """
+
+    def __init__(self, db, file_hash: str, ttl: int = LEASE_TTL_SECONDS,
+                 interval: float = LEASE_HEARTBEAT_SECONDS, handoff_ttl: int = 0):
+        self.db = db
+        self.file_hash = file_hash
+        self.ttl = ttl
+        # > 0: on a clean exit the lease is left with this TTL, covering the wait until
+        # the job's next task (e.g. the PDF finalize step) is picked up from its queue
+        self.handoff_ttl = handoff_ttl
+        self.interval = interval
+        self.owner = worker_id()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _renew(self, ttl: Optional[int] = None) -> bool:
+        record = self.db.get_metadata(self.file_hash)
+        if not record or record.get("status") != "processing":
+            return False  # finished or replaced elsewhere; stop heartbeating
+        record.pop("_db_source", None)
+        record["lease"] = new_lease(self.owner, ttl or self.ttl)
+        self.db.renew_lease(self.file_hash, record)
+        return True
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                if not self._renew():
+                    return
+            except Exception as e:
+                print(f"[Lease] Heartbeat failed for {self.file_hash}: {e}")
+
+    def __enter__(self):
+        try:
+            self._renew()
+        except Exception as e:
+            print(f"[Lease] Could not take lease for {self.file_hash}: {e}")
+        self._thread = threading.Thread(target=self._run, name=f"lease-{self.file_hash[:8]}", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        if self.handoff_ttl and exc_type is None:
+            try:
+                self._renew(self.handoff_ttl)
+            except Exception as e:
+                print(f"[Lease] Could not hand off lease for {self.file_hash}: {e}")
+        return False
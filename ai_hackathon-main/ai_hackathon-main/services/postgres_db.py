@@ -0,0 +1,244 @@
+"""PostgreSQL backend of services.database, imported only when DATABASE_URL is set."""
+import json
+from datetime import datetime
+from typing import Dict, Any, Optional
+
+from sqlalchemy import create_engine, inspect, tuple_, func, Column, String, JSON, DateTime, BigInteger, LargeBinary
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.exc import SQLAlchemyError, IntegrityError
+
+from services.compression import get_codec, compress, decompress
+from services.leases import lease_is_live
+from services.database import DatabaseService, JOB_LIST_MAX, job_fields, decode_cursor, _like_prefix, _job_page
+
+Base = declarative_base()
+
+
+class MetadataModel(Base):
+    __tablename__ = 'metadata'
+    file_hash = Column(String, primary_key=True)
+    data = Column(JSON().with_variant(JSONB(), "postgresql"))
+    # Set instead of `data` when RESULT_COMPRESSION is enabled
+    data_compressed = Column(LargeBinary, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    # Promoted from `data` for job listings (indexes in PostgresDB._ensure_indexes)
+    status = Column(String, nullable=True)
+    task_type = Column(String, nullable=True)
+    original_filename = Column(String, nullable=True)
+    size = Column(BigInteger, nullable=True)
+    updated_at = Column(DateTime, nullable=True)
+
+
+class PostgresDB(DatabaseService):
+    def __init__(self, connection_string: str):
+        self.engine = create_engine(connection_string)
+        Base.metadata.create_all(self.engine) # Ensure table exists
+        self._add_missing_columns()
+        self.Session = sessionmaker(bind=self.engine)
+        self.codec = get_codec("RESULT_COMPRESSION")
+        self._ensure_jsonb()
+        self._backfill_job_columns()
+        self._ensure_indexes()
+
+    def _add_missing_columns(self):
+        """create_all() doesn't alter existing tables; add columns introduced since."""
+        existing = {c["name"] for c in inspect(self.engine).get_columns(MetadataModel.__tablename__)}
+        with self.engine.begin() as conn:
+            for column in MetadataModel.__table__.columns:
+                if column.name not in existing:
+                    col_type = column.type.compile(dialect=self.engine.dialect)
+                    conn.exec_driver_sql(f"ALTER TABLE {MetadataModel.__tablename__} ADD COLUMN {column.name} {col_type}")
+
+    def _ensure_jsonb(self):
+        """Tables created before JSONB was the column type are converted in place (Postgres only)."""
+        if self.engine.dialect.name != "postgresql":
+            return
+        columns = {c["name"]: c["type"] for c in inspect(self.engine).get_columns(MetadataModel.__tablename__)}
+        if not isinstance(columns.get("data"), JSONB):
+            with self.engine.begin() as conn:
+                conn.exec_driver_sql(
+                    f"ALTER TABLE {MetadataModel.__tablename__} ALTER COLUMN data TYPE JSONB USING data::jsonb"
+                )
+
+    def _backfill_job_columns(self):
+        """Fills the listing columns of rows saved before they existed (updated_at is NULL)."""
+        table = MetadataModel.__tablename__
+        with self.engine.begin() as conn:
+            if self.engine.dialect.name == "postgresql":
+                # Uncompressed rows in one statement; compressed ones need decoding below
+                conn.exec_driver_sql(
+                    f"UPDATE {table} SET status = data->>'status', task_type = data->>'task_type', "
+                    "original_filename = data->>'original_filename', updated_at = created_at "
+                    "WHERE updated_at IS NULL AND data IS NOT NULL"
+                )
+        session = self.Session()
+        try:
+            for record in session.query(MetadataModel).filter(MetadataModel.updated_at.is_(None)).yield_per(500):
+                data = self._decode(record)
+                if isinstance(data, dict):
+                    self._set_job_columns(record, data)
+                record.updated_at = record.created_at or datetime.utcnow()
+            session.commit()
+        finally:
+            session.close()
+
+    def _ensure_indexes(self):
+        table = MetadataModel.__tablename__
+        filename_index = ("lower(original_filename) text_pattern_ops"
+                          if self.engine.dialect.name == "postgresql" else "lower(original_filename)")
+        with self.engine.begin() as conn:
+            for name, columns in (
+                ("ix_metadata_updated", "updated_at DESC, file_hash DESC"),
+                ("ix_metadata_status_updated", "status, updated_at DESC, file_hash DESC"),
+                ("ix_metadata_task_type_updated", "task_type, updated_at DESC, file_hash DESC"),
+                ("ix_metadata_filename", filename_index),
+                ("ix_metadata_size", "size"),
+            ):
+                conn.exec_driver_sql(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})")
+
+    @staticmethod
+    def _set_job_columns(row, metadata: Dict[str, Any], touch: bool = True):
+        fields = job_fields(metadata)
+        row.status = fields["status"]
+        for name in ("task_type", "original_filename", "size"):
+            if fields[name] is not None:
+                setattr(row, name, fields[name])
+        if touch or row.updated_at is None:
+            row.updated_at = datetime.utcnow()
+
+    def _encode(self, metadata: Dict[str, Any]):
+        """Returns (data, data_compressed) column values for a record."""
+        if self.codec == "none":
+            return metadata, None
+        payload = json.dumps(metadata, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+        return None, compress(payload, self.codec)
+
+    def _decode(self, record) -> Optional[Dict[str, Any]]:
+        if record.data_compressed is not None:
+            data = json.loads(decompress(bytes(record.data_compressed)))
+        else:
+            data = record.data
+        if isinstance(data, dict):
+            data["_db_source"] = "postgres"
+        return data
+
+    def save_metadata(self, file_hash: str, metadata: Dict[str, Any]):
+        self._save(file_hash, metadata, touch=True)
+
+    def renew_lease(self, file_hash: str, record: Dict[str, Any]):
+        self._save(file_hash, record, touch=False)
+
+    def _save(self, file_hash: str, metadata: Dict[str, Any], touch: bool):
+        session = self.Session()
+        try:
+            # Check if exists, update or insert
+            data, data_compressed = self._encode(metadata)
+            existing = session.query(MetadataModel).filter_by(file_hash=file_hash).first()
+            if existing:
+                existing.data = data
+                existing.data_compressed = data_compressed
+                existing.created_at = datetime.utcnow()
+            else:
+                existing = MetadataModel(file_hash=file_hash, data=data, data_compressed=data_compressed)
+                session.add(existing)
+            self._set_job_columns(existing, metadata, touch)
+            session.commit()
+        except SQLAlchemyError as e:
+            session.rollback()
+            print(f"Postgres Error: {e}")
+            raise e
+        finally:
+            session.close()
+
+    def get_metadata(self, file_hash: str) -> Optional[Dict[str, Any]]:
+        session = self.Session()
+        try:
+            record = session.query(MetadataModel).filter_by(file_hash=file_hash).first()
+            return self._decode(record) if record else None
+        finally:
+            session.close()
+
+    def claim_job(self, file_hash: str, record: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        session = self.Session()
+        try:
+            # Row lock: concurrent claims for the same hash queue up behind this one
+            existing = session.query(MetadataModel).filter_by(file_hash=file_hash).with_for_update().first()
+            if existing is not None:
+                current = self._decode(existing)
+                if lease_is_live(current):
+                    session.rollback()
+                    return current
+            data, data_compressed = self._encode(record)
+            if existing is not None:
+                existing.data = data
+                existing.data_compressed = data_compressed
+                existing.created_at = datetime.utcnow()
+            else:
+                existing = MetadataModel(file_hash=file_hash, data=data, data_compressed=data_compressed)
+                session.add(existing)
+            self._set_job_columns(existing, record)
+            session.commit()
+            return None
+        except IntegrityError:
+            # Lost the race to insert the first row: the winner's job is in flight
+            session.rollback()
+            return self.get_metadata(file_hash)
+        except SQLAlchemyError as e:
+            session.rollback()
+            print(f"Postgres Error: {e}")
+            raise e
+        finally:
+            session.close()
+
+    def iter_metadata(self):
+        session = self.Session()
+        try:
+            for record in session.query(MetadataModel).yield_per(500):
+                data = self._decode(record)
+                if isinstance(data, dict):
+                    yield record.file_hash, data
+        finally:
+            session.close()
+
+    def list_jobs(self, status=None, task_type=None, filename=None, limit=50, cursor=None) -> Dict[str, Any]:
+        limit = min(max(limit, 1), JOB_LIST_MAX)
+        session = self.Session()
+        try:
+            # Only promoted columns: listing never reads or decodes `data`
+            q = session.query(MetadataModel.file_hash, MetadataModel.status, MetadataModel.task_type,
+                              MetadataModel.original_filename, MetadataModel.size, MetadataModel.updated_at)
+            if status:
+                q = q.filter(MetadataModel.status == status)
+            if task_type:
+                q = q.filter(MetadataModel.task_type == task_type)
+            if filename:
+                q = q.filter(func.lower(MetadataModel.original_filename).like(_like_prefix(filename.lower()), escape="\\"))
+            if cursor:
+                updated_at, file_hash = decode_cursor(cursor)
+                q = q.filter(tuple_(MetadataModel.updated_at, MetadataModel.file_hash)
+                             < tuple_(datetime.fromisoformat(updated_at), file_hash))
+            rows = q.order_by(MetadataModel.updated_at.desc(), MetadataModel.file_hash.desc()).limit(limit + 1).all()
+        finally:
+            session.close()
+        items = [{
+            "file_hash": row.file_hash,
+            "status": row.status,
+            "task_type": row.task_type,
+            "original_filename": row.original_filename,
+            "size": row.size,
+            "updated_at": row.updated_at.isoformat(timespec="microseconds") if row.updated_at else None,
+        } for row in rows]
+        return _job_page(items, limit)
+
+    def delete_metadata(self, file_hash: str):
+        session = self.Session()
+        try:
+            session.query(MetadataModel).filter_by(file_hash=file_hash).delete()
+            session.commit()
+        except SQLAlchemyError as e:
+            session.rollback()
+            print(f"Postgres Error: {e}")
+            raise e
+        finally:
+            session.close()
@@ -0,0 +1,109 @@
+import json
+from typing import Dict, Any, List
+
+from services.storage import StorageService
+from pdf_service.table_codec import table_rows
+
+# Pages are stored in fixed-size chunks so a paginated read touches only the chunks it needs.
+PAGE_CHUNK_SIZE = 50
+
+
+def _results_prefix(file_hash: str) -> str:
+    return f"results/{file_hash}/"
+
+
+def _dump(obj) -> bytes:
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def offload_pdf_payload(storage: StorageService, file_hash: str, result: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Moves the heavy parts of a process_pdf result (page text, table grids) into
+    separate storage objects and returns a slim record holding only references.
+    """
+    pages = result.pop("pages", None) or []
+    tables = result.pop("tables", None) or []
+    prefix = _results_prefix(file_hash)
+
+    page_keys = []
+    for start in range(0, len(pages), PAGE_CHUNK_SIZE):
+        key = f"{prefix}pages_{start // PAGE_CHUNK_SIZE:05d}.json"
+        storage.save(_dump(pages[start:start + PAGE_CHUNK_SIZE]), key)
+        page_keys.append(key)
+
+    table_index = []
+    for i, table in enumerate(tables):
+        entry = {
+            "table_id": table.get("table_id", i),
+            "page": table.get("page"),
+            "accuracy": table.get("accuracy", 0),
+            "whitespace": table.get("whitespace", 0),
+        }
+        if "csv" in table:
+            # Compact tables: the grid is stored as a plain CSV blob, shape and header in the index
+            key = f"{prefix}table_{i:05d}.csv"
+            storage.save(table["csv"].encode("utf-8"), key)
+            entry.update(n_rows=table.get("n_rows", 0), n_cols=table.get("n_cols", 0), header=table.get("header", []))
+        else:
+            key = f"{prefix}table_{i:05d}.json"
+            storage.save(_dump(table), key)
+            data = table.get("data") or []
+            entry.update(n_rows=len(data), n_cols=len(data[0]) if data else 0)
+        entry["ref"] = key
+        table_index.append(entry)
+
+    result["page_count"] = len(pages)
+    result["table_count"] = len(tables)
+    result["tables_index"] = table_index
+    result["payload_refs"] = {"pages": page_keys, "page_chunk_size": PAGE_CHUNK_SIZE}
+    return result
+
+
+def get_pages(storage: StorageService, record: Dict[str, Any], offset: int, limit: int) -> Dict[str, Any]:
+    """Returns one window of page text for a PDF record (offloaded or legacy inline)."""
+    if "pages" in record:
+        pages = record.get("pages") or []
+        return {"total": len(pages), "offset": offset, "limit": limit, "items": pages[offset:offset + limit]}
+
+    refs = record.get("payload_refs") or {}
+    chunk_size = refs.get("page_chunk_size", PAGE_CHUNK_SIZE)
+    keys = refs.get("pages") or []
+    total = record.get("page_count", 0)
+
+    items: List[Dict[str, Any]] = []
+    end = min(offset + limit, total)
+    first_chunk, last_chunk = offset // chunk_size, (end - 1) // chunk_size
+    for chunk_no in range(first_chunk, min(last_chunk + 1, len(keys))):
+        chunk = json.loads(storage.get(keys[chunk_no]))
+        chunk_start = chunk_no * chunk_size
+        items.extend(chunk[max(offset - chunk_start, 0):end - chunk_start])
+    return {"total": total, "offset": offset, "limit": limit, "items": items}
+
+
+def get_tables(storage: StorageService, record: Dict[str, Any], offset: int, limit: int) -> Dict[str, Any]:
+    """Returns one window of extracted tables (with grids) for a PDF record."""
+    if "tables" in record:
+        tables = record.get("tables") or []
+        items = [_with_rows(t) for t in tables[offset:offset + limit]]
+        return {"total": len(tables), "offset": offset, "limit": limit, "items": items}
+
+    index = record.get("tables_index") or []
+    items = [_load_table(storage, entry) for entry in index[offset:offset + limit]]
+    return {"total": len(index), "offset": offset, "limit": limit, "items": items}
+
+
+def _with_rows(table: Dict[str, Any]) -> Dict[str, Any]:
+    """A table in the response shape: metadata plus its "data" grid."""
+    if "csv" not in table:
+        return table
+    out = {k: v for k, v in table.items() if k != "csv"}
+    out["data"] = table_rows(table)
+    return out
+
+
+def _load_table(storage: StorageService, entry: Dict[str, Any]) -> Dict[str, Any]:
+    if entry["ref"].endswith(".csv"):
+        table = {k: v for k, v in entry.items() if k != "ref"}
+        table["csv"] = storage.get(entry["ref"]).decode("utf-8")
+        return _with_rows(table)
+    return json.loads(storage.get(entry["ref"]))  # stored before tables were kept as CSV
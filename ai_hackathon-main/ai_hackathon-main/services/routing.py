@@ -0,0 +1,91 @@
+import os
+from typing import Dict, Any, IO, Optional
+
+# Celery queues, so a 2-second CSV never waits behind a 4-minute OCR job:
+#   fast    - small CSV/Excel harmonization
+#   digital - text-based PDFs, large spreadsheets, PDF finalize (LLM) step
+#   ocr     - scanned PDFs and very long PDFs
+# Run one worker pool per queue, e.g. `celery -A celery_app worker -Q ocr`; a
+# worker started without -Q consumes all three (single-worker deployments).
+QUEUE_FAST = "fast"
+QUEUE_DIGITAL = "digital"
+QUEUE_OCR = "ocr"
+
+FAST_MAX_MB = float(os.getenv("QUEUE_FAST_MAX_MB", "5"))  # larger spreadsheets go to "digital"
+OCR_MIN_PAGES = int(os.getenv("QUEUE_OCR_MIN_PAGES", "200"))  # very long PDFs go to "ocr" even if digital
+SAMPLE_PAGES = 5  # pages inspected at dispatch to spot scanned PDFs
+# PDFs are only opened at dispatch up to this size; a truncated PDF cannot be
+# parsed reliably, so anything larger goes straight to "ocr" (longest time limit)
+INSPECT_MAX_MB = float(os.getenv("QUEUE_INSPECT_MAX_MB", "32"))
+
+
+def _queue_settings(name: str, time_limit: int, concurrency: int, max_tasks_per_child: int) -> Dict[str, int]:
+    prefix = f"QUEUE_{name.upper()}_"
+    time_limit = int(os.getenv(prefix + "TIME_LIMIT", str(time_limit)))
+    return {
+        "time_limit": time_limit,
+        "soft_time_limit": int(os.getenv(prefix + "SOFT_TIME_LIMIT", str(int(time_limit * 0.8)))),
+        "concurrency": int(os.getenv(prefix + "CONCURRENCY", str(concurrency))),
+        # 0 = recycle on memory growth only (WORKER_MAX_MEMORY_GROWTH_MB)
+        "max_tasks_per_child": int(os.getenv(prefix + "MAX_TASKS_PER_CHILD", str(max_tasks_per_child))),
+    }
+
+
+QUEUE_SETTINGS: Dict[str, Dict[str, int]] = {
+    QUEUE_FAST: _queue_settings(QUEUE_FAST, time_limit=120, concurrency=4, max_tasks_per_child=0),
+    QUEUE_DIGITAL: _queue_settings(QUEUE_DIGITAL, time_limit=300, concurrency=2, max_tasks_per_child=0),
+    QUEUE_OCR: _queue_settings(QUEUE_OCR, time_limit=900, concurrency=1, max_tasks_per_child=0),
+}
+
+
+def _looks_scanned(fileobj: IO[bytes]) -> tuple:
+    """(scanned, page_count) from the first few pages; a quick document-level check, unlike classify_pages."""
+    import fitz
+
+    pos = fileobj.tell()
+    try:
+        doc = fitz.open(stream=fileobj.read(), filetype="pdf")
+    finally:
+        fileobj.seek(pos)
+    try:
+        text_chars = 0
+        images = 0
+        for i in range(min(SAMPLE_PAGES, doc.page_count)):
+            page = doc[i]
+            text_chars += len(page.get_text().strip())
+            images += len(page.get_images())
+        return text_chars < 200 and images > 0, doc.page_count
+    finally:
+        doc.close()
+
+
+def classify_job(task_type: str, size: int, fileobj: Optional[IO[bytes]] = None) -> str:
+    """
+    Picks the queue for an upload from its type, size and (for PDFs) page count/content.
+
+    Parses the PDF, so async callers should run it in a threadpool.
+    """
+    if task_type != "pdf":
+        return QUEUE_FAST if size <= FAST_MAX_MB * 1024 * 1024 else QUEUE_DIGITAL
+    if fileobj is None:
+        return QUEUE_DIGITAL
+    if size > INSPECT_MAX_MB * 1024 * 1024:
+        return QUEUE_OCR
+    try:
+        scanned, page_count = _looks_scanned(fileobj)
+    except Exception as e:
+        # Unreadable here will be unreadable in the worker too; let it fail on the cheap queue
+        print(f"[Routing] Could not inspect PDF, using '{QUEUE_DIGITAL}': {e}")
+        return QUEUE_DIGITAL
+    if scanned or page_count >= OCR_MIN_PAGES:
+        return QUEUE_OCR
+    return QUEUE_DIGITAL
+
+
+def route_options(queue: str, limits_of: Optional[str] = None) -> Dict[str, Any]:
+    """
+    apply_async/signature options: target queue plus that queue's time limits, or those
+    of `limits_of` (a task that runs on `queue` but for a job classified there).
+    """
+    settings = QUEUE_SETTINGS[limits_of or queue]
+    return {"queue": queue, "time_limit": settings["time_limit"], "soft_time_limit": settings["soft_time_limit"]}
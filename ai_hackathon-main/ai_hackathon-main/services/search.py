@@ -0,0 +1,399 @@
+"""
+Catalog search over harmonized metadata.
+
+Finished jobs are indexed as they are saved (services.tasks) and removed when the
+GC evicts them. Locally the index is a SQLite database with an FTS5 table; with
+DATABASE_URL on Postgres it is a ``catalog_search`` table with a JSONB document
+(GIN), a generated tsvector (GIN) and indexed facet columns.
+
+Backfill records that existed before the index with
+``python -m services.search --reindex``.
+"""
+import os
+import re
+import json
+import time
+import sqlite3
+import threading
+import importlib.util
+from datetime import date
+from abc import ABC, abstractmethod
+from typing import Dict, Any, List, Optional
+
+from services.catalog import catalog_fields
+
+# Imported by PostgresSearchIndex only, so the local SQLite index never loads SQLAlchemy
+SQLALCHEMY_AVAILABLE = importlib.util.find_spec("sqlalchemy") is not None
+
+SEARCH_DB_PATH = os.getenv("SEARCH_DB_PATH", "outputs/search.db")
+SEARCH_FACET_LIMIT = int(os.getenv("SEARCH_FACET_LIMIT", "20"))  # values returned per facet
+# Queries matching more records than this are ordered by recency instead of relevance:
+# ranking the whole match set is the expensive part and such terms barely discriminate
+SEARCH_RANK_MAX_HITS = int(os.getenv("SEARCH_RANK_MAX_HITS", "5000"))
+FACETS = ("sector", "granularity", "jurisdiction")
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def _query_words(q: Optional[str]) -> List[str]:
+    # Free text is reduced to words (prefix-matched, all required), so user input is never query syntax
+    return _WORD_RE.findall(q or "")[:16]
+
+
+def _year_bounds(year_from: Optional[int], year_to: Optional[int]) -> tuple:
+    return (f"{year_from:04d}-01-01" if year_from else None, f"{year_to:04d}-12-31" if year_to else None)
+
+
+def _facet_counts(cube: List[tuple], filters: Dict[str, str]) -> tuple:
+    """
+    (total, facets) from one grouped pass: cube rows are (sector, granularity,
+    jurisdiction, count) for everything matching the query and year range. Each
+    facet's counts apply every facet filter except its own.
+    """
+    wanted = {f: filters[f].strip().lower() for f in FACETS if filters.get(f)}
+    total = 0
+    counts = {f: {} for f in FACETS}
+    for row in cube:
+        values = dict(zip(FACETS, row[:3]))
+        misses = [f for f, v in wanted.items() if (values[f] or "").lower() != v]
+        if not misses:
+            total += row[3]
+        for facet in FACETS:
+            if (not misses or misses == [facet]) and values[facet]:
+                key = values[facet].lower()
+                label, n = counts[facet].get(key, (values[facet], 0))
+                counts[facet][key] = (label, n + row[3])
+    facets = {
+        f: [{"value": label, "count": n} for label, n in sorted(c.values(), key=lambda x: -x[1])[:SEARCH_FACET_LIMIT]]
+        for f, c in counts.items()
+    }
+    return total, facets
+
+
+def _valid_date(value: Optional[str]) -> Optional[str]:
+    try:
+        return date.fromisoformat(value).isoformat() if value else None
+    except ValueError:
+        return None  # e.g. "2020-02-31" written by the model
+
+
+def _document(file_hash: str, record: Dict[str, Any]) -> Dict[str, Any]:
+    doc = catalog_fields(record)
+    doc["temporal_start"] = _valid_date(doc["temporal_start"])
+    doc["temporal_end"] = _valid_date(doc["temporal_end"])
+    doc["file_hash"] = file_hash
+    doc["task_type"] = "pdf" if "pdf_type" in record or "metadata" in record else "harmonize"
+    return doc
+
+
+class SearchIndex(ABC):
+    @abstractmethod
+    def index(self, file_hash: str, record: Dict[str, Any]):
+        """Adds or replaces a finished job in the index."""
+        pass
+
+    @abstractmethod
+    def remove(self, file_hash: str):
+        """Drops a job from the index (no-op if missing)."""
+        pass
+
+    @abstractmethod
+    def search(self, q: Optional[str] = None, filters: Optional[Dict[str, str]] = None,
+               year_from: Optional[int] = None, year_to: Optional[int] = None,
+               offset: int = 0, limit: int = 20) -> Dict[str, Any]:
+        """
+        Full-text query plus exact (case-insensitive) facet filters and a temporal
+        overlap filter. Returns {"total", "offset", "limit", "items", "facets"}; each
+        facet's counts apply every filter except its own.
+        """
+        pass
+
+    def update(self, file_hash: str, record: Dict[str, Any]):
+        """Indexes successful records and removes anything else. Never raises: search is secondary."""
+        try:
+            if record.get("status") == "success":
+                self.index(file_hash, record)
+            else:
+                self.remove(file_hash)
+        except Exception as e:
+            print(f"[Search] Failed to update index for {file_hash}: {e}")
+
+
+class SQLiteSearchIndex(SearchIndex):
+    """FTS5 over title/description/keywords/provenance/coverage; facet columns with NOCASE indexes."""
+
+    def __init__(self, path: str = SEARCH_DB_PATH):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS catalog (
+                    id INTEGER PRIMARY KEY,
+                    file_hash TEXT NOT NULL UNIQUE,
+                    sector TEXT COLLATE NOCASE,
+                    granularity TEXT COLLATE NOCASE,
+                    jurisdiction TEXT COLLATE NOCASE,
+                    temporal_start TEXT,
+                    temporal_end TEXT,
+                    updated_at REAL NOT NULL,
+                    doc TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS ix_catalog_sector ON catalog (sector);
+                CREATE INDEX IF NOT EXISTS ix_catalog_granularity ON catalog (granularity);
+                CREATE INDEX IF NOT EXISTS ix_catalog_jurisdiction ON catalog (jurisdiction);
+                CREATE INDEX IF NOT EXISTS ix_catalog_temporal ON catalog (temporal_start, temporal_end);
+                CREATE INDEX IF NOT EXISTS ix_catalog_facets ON catalog (sector, granularity, jurisdiction, temporal_start, temporal_end);
+                CREATE INDEX IF NOT EXISTS ix_catalog_updated ON catalog (updated_at);
+                CREATE VIRTUAL TABLE IF NOT EXISTS catalog_fts USING fts5(
+                    title, description, keywords, provenance, coverage,
+                    tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'
+                );
+            """)
+            self._local.conn = conn
+        return conn
+
+    def index(self, file_hash: str, record: Dict[str, Any]):
+        doc = _document(file_hash, record)
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "INSERT INTO catalog (file_hash, sector, granularity, jurisdiction, temporal_start, temporal_end, updated_at, doc) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT(file_hash) DO UPDATE SET "
+                "sector = excluded.sector, granularity = excluded.granularity, jurisdiction = excluded.jurisdiction, "
+                "temporal_start = excluded.temporal_start, temporal_end = excluded.temporal_end, "
+                "updated_at = excluded.updated_at, doc = excluded.doc",
+                (file_hash, doc["sector"], doc["granularity"], doc["jurisdiction"], doc["temporal_start"],
+                 doc["temporal_end"], time.time(), json.dumps(doc, ensure_ascii=False)),
+            )
+            (row_id,) = conn.execute("SELECT id FROM catalog WHERE file_hash = ?", (file_hash,)).fetchone()
+            conn.execute("DELETE FROM catalog_fts WHERE rowid = ?", (row_id,))
+            conn.execute(
+                "INSERT INTO catalog_fts (rowid, title, description, keywords, provenance, coverage) VALUES (?, ?, ?, ?, ?, ?)",
+                (row_id, doc["title"], doc["description"], " ".join(doc["keywords"]),
+                 " ".join([doc["source"], doc["data_owner"], doc["jurisdiction"]]),
+                 " ".join([doc["spatial_coverage"], doc["temporal_range"], doc["original_filename"]])),
+            )
+
+    def remove(self, file_hash: str):
+        conn = self._conn()
+        with conn:
+            row = conn.execute("SELECT id FROM catalog WHERE file_hash = ?", (file_hash,)).fetchone()
+            if row:
+                conn.execute("DELETE FROM catalog_fts WHERE rowid = ?", row)
+                conn.execute("DELETE FROM catalog WHERE id = ?", row)
+
+    def _where(self, words, filters, bounds, broad=False) -> tuple:
+        clauses, params = [], []
+        if words:
+            # Few hits: look them up by primary key. Many: "+" keeps the planner on the
+            # facet/recency indexes and checks each row against the hit set instead
+            clauses.append(f"{'+' if broad else ''}catalog.id IN (SELECT id FROM temp.search_hits)")
+        for facet in FACETS:
+            if filters.get(facet):
+                clauses.append(f"catalog.{facet} = ?")
+                params.append(filters[facet])
+        if bounds[0]:
+            clauses.append("catalog.temporal_end >= ?")
+            params.append(bounds[0])
+        if bounds[1]:
+            clauses.append("catalog.temporal_start <= ?")
+            params.append(bounds[1])
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def search(self, q=None, filters=None, year_from=None, year_to=None, offset=0, limit=20):
+        conn = self._conn()
+        words = _query_words(q)
+        filters = filters or {}
+        bounds = _year_bounds(year_from, year_to)
+
+        match = " ".join(f'"{w}"*' for w in words)
+        broad = not words
+        if words:
+            # Full-text matches once per search; the facet and page queries join against them
+            conn.execute("CREATE TEMP TABLE IF NOT EXISTS search_hits (id INTEGER PRIMARY KEY)")
+            conn.execute("DELETE FROM temp.search_hits")
+            hits = conn.execute("INSERT INTO temp.search_hits SELECT rowid FROM catalog_fts WHERE catalog_fts MATCH ?",
+                                (match,)).rowcount
+            broad = hits > SEARCH_RANK_MAX_HITS
+
+        # Facet counts and the total in one grouped pass, in index order when most rows take part
+        base_where, base_params = self._where(words, {}, bounds, broad)
+        cube = conn.execute(
+            f"SELECT MIN(sector), MIN(granularity), MIN(jurisdiction), COUNT(*) FROM catalog"
+            f"{' INDEXED BY ix_catalog_facets' if broad else ''}{base_where} "
+            "GROUP BY sector, granularity, jurisdiction", base_params,
+        ).fetchall()
+        total, facets = _facet_counts(cube, filters)
+
+        where, params = self._where(words, filters, bounds, broad)
+        if words and total <= SEARCH_RANK_MAX_HITS:
+            # Rank by BM25 over the matching rows only
+            rows = conn.execute(
+                "SELECT catalog.doc, catalog.updated_at FROM catalog_fts JOIN catalog ON catalog.id = catalog_fts.rowid "
+                f"{where.replace(' WHERE ', ' WHERE catalog_fts MATCH ? AND ', 1)} "
+                "ORDER BY bm25(catalog_fts) LIMIT ? OFFSET ?",
+                [match] + params + [limit, offset],
+            ).fetchall()
+        else:
+            rows = conn.execute(
+                f"SELECT doc, updated_at FROM catalog{where} ORDER BY updated_at DESC, id DESC LIMIT ? OFFSET ?",
+                params + [limit, offset],
+            ).fetchall()
+        items = [dict(json.loads(doc), updated_at=updated_at) for doc, updated_at in rows]
+        return {"total": total, "offset": offset, "limit": limit, "items": items, "facets": facets}
+
+
+def _sql(statement: str):
+    from sqlalchemy import text
+    return text(statement)
+
+
+class PostgresSearchIndex(SearchIndex):
+    """
+    catalog_search: JSONB document with a GIN index (facet filters are one containment
+    lookup on the lower-cased "facets" object) and a GIN-indexed generated tsvector.
+    """
+
+    def __init__(self, connection_string: str):
+        if not SQLALCHEMY_AVAILABLE:
+            raise ImportError("SQLAlchemy is not installed. Please install it to use PostgresSearchIndex.")
+        from sqlalchemy import create_engine
+        self.engine = create_engine(connection_string)
+        with self.engine.begin() as conn:
+            conn.execute(_sql("""
+                CREATE TABLE IF NOT EXISTS catalog_search (
+                    file_hash TEXT PRIMARY KEY,
+                    sector TEXT,
+                    granularity TEXT,
+                    jurisdiction TEXT,
+                    temporal_start DATE,
+                    temporal_end DATE,
+                    updated_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+                    doc JSONB NOT NULL,
+                    tsv TSVECTOR GENERATED ALWAYS AS (to_tsvector('simple',
+                        coalesce(doc->>'title', '') || ' ' || coalesce(doc->>'description', '') || ' ' ||
+                        coalesce(doc->>'keywords', '') || ' ' || coalesce(doc->>'source', '') || ' ' ||
+                        coalesce(doc->>'data_owner', '') || ' ' || coalesce(doc->>'jurisdiction', '') || ' ' ||
+                        coalesce(doc->>'spatial_coverage', '') || ' ' || coalesce(doc->>'temporal_range', '') || ' ' ||
+                        coalesce(doc->>'original_filename', ''))) STORED
+                )
+            """))
+            for statement in (
+                "CREATE INDEX IF NOT EXISTS ix_catalog_search_doc ON catalog_search USING GIN (doc jsonb_path_ops)",
+                "CREATE INDEX IF NOT EXISTS ix_catalog_search_tsv ON catalog_search USING GIN (tsv)",
+                "CREATE INDEX IF NOT EXISTS ix_catalog_search_temporal ON catalog_search (temporal_start, temporal_end)",
+                "CREATE INDEX IF NOT EXISTS ix_catalog_search_updated ON catalog_search (updated_at DESC)",
+            ):
+                conn.execute(_sql(statement))
+
+    def index(self, file_hash: str, record: Dict[str, Any]):
+        doc = _document(file_hash, record)
+        doc["facets"] = {facet: doc[facet].lower() for facet in FACETS if doc[facet]}
+        with self.engine.begin() as conn:
+            conn.execute(_sql("""
+                INSERT INTO catalog_search (file_hash, sector, granularity, jurisdiction, temporal_start, temporal_end, updated_at, doc)
+                VALUES (:file_hash, :sector, :granularity, :jurisdiction, :temporal_start, :temporal_end, now(), CAST(:doc AS JSONB))
+                ON CONFLICT (file_hash) DO UPDATE SET
+                    sector = EXCLUDED.sector, granularity = EXCLUDED.granularity, jurisdiction = EXCLUDED.jurisdiction,
+                    temporal_start = EXCLUDED.temporal_start, temporal_end = EXCLUDED.temporal_end,
+                    updated_at = now(), doc = EXCLUDED.doc
+            """), {
+                "file_hash": file_hash, "sector": doc["sector"], "granularity": doc["granularity"],
+                "jurisdiction": doc["jurisdiction"], "temporal_start": doc["temporal_start"],
+                "temporal_end": doc["temporal_end"], "doc": json.dumps(doc, ensure_ascii=False),
+            })
+
+    def remove(self, file_hash: str):
+        with self.engine.begin() as conn:
+            conn.execute(_sql("DELETE FROM catalog_search WHERE file_hash = :file_hash"), {"file_hash": file_hash})
+
+    def _where(self, words, filters, bounds) -> tuple:
+        clauses, params = [], {}
+        if words:
+            clauses.append("tsv @@ to_tsquery('simple', :tsquery)")
+            params["tsquery"] = " & ".join(f"{w.lower()}:*" for w in words)
+        wanted = {f: filters[f].lower() for f in FACETS if filters.get(f)}
+        if wanted:
+            clauses.append("doc @> CAST(:facets AS JSONB)")
+            params["facets"] = json.dumps({"facets": wanted}, ensure_ascii=False)
+        if bounds[0]:
+            clauses.append("temporal_end >= CAST(:year_start AS DATE)")
+            params["year_start"] = bounds[0]
+        if bounds[1]:
+            clauses.append("temporal_start <= CAST(:year_end AS DATE)")
+            params["year_end"] = bounds[1]
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def search(self, q=None, filters=None, year_from=None, year_to=None, offset=0, limit=20):
+        words = _query_words(q)
+        filters = filters or {}
+        bounds = _year_bounds(year_from, year_to)
+        with self.engine.connect() as conn:
+            base_where, base_params = self._where(words, {}, bounds)
+            cube = conn.execute(_sql(
+                f"SELECT MIN(sector), MIN(granularity), MIN(jurisdiction), COUNT(*) FROM catalog_search{base_where} "
+                "GROUP BY lower(sector), lower(granularity), lower(jurisdiction)"
+            ), base_params).fetchall()
+            total, facets = _facet_counts(cube, filters)
+
+            where, params = self._where(words, filters, bounds)
+            if words and total <= SEARCH_RANK_MAX_HITS:
+                order = "ts_rank(tsv, to_tsquery('simple', :tsquery)) DESC"
+            else:
+                order = "updated_at DESC, file_hash"
+            rows = conn.execute(_sql(
+                f"SELECT doc, EXTRACT(EPOCH FROM updated_at) FROM catalog_search{where} "
+                f"ORDER BY {order} LIMIT :limit OFFSET :offset"
+            ), dict(params, limit=limit, offset=offset)).fetchall()
+        items = []
+        for doc, updated_at in rows:
+            doc = dict(doc)
+            doc.pop("facets", None)
+            doc["updated_at"] = float(updated_at)
+            items.append(doc)
+        return {"total": total, "offset": offset, "limit": limit, "items": items, "facets": facets}
+
+
+_search_index: Optional[SearchIndex] = None
+
+
+def get_search_index() -> SearchIndex:
+    """Same backend choice as get_db_service: Postgres with DATABASE_URL, else local SQLite. One per process."""
+    global _search_index
+    if _search_index is None:
+        db_url = os.getenv("DATABASE_URL")
+        if db_url and db_url.startswith("postgres") and SQLALCHEMY_AVAILABLE:
+            _search_index = PostgresSearchIndex(db_url)
+        else:
+            _search_index = SQLiteSearchIndex()
+    return _search_index
+
+
+def reindex(db, index: SearchIndex) -> int:
+    """Rebuilds the index entries for every record in the database. Returns the number indexed."""
+    count = 0
+    for file_hash, record in db.iter_metadata():
+        index.update(file_hash, record)
+        count += record.get("status") == "success"
+    return count
+
+
+if __name__ == "__main__":
+    import argparse
+    from services.database import get_db_service
+
+    parser = argparse.ArgumentParser(description="Catalog search index maintenance.")
+    parser.add_argument("--reindex", action="store_true", help="index every record already in the database")
+    args = parser.parse_args()
+    if args.reindex:
+        started = time.monotonic()
+        n = reindex(get_db_service(), get_search_index())
+        print(f"[Search] Indexed {n} records in {time.monotonic() - started:.1f}s")
+    else:
+        parser.print_help()
@@ -1,8 +1,35 @@
 import os
 import shutil
+import tempfile
+import threading
 from abc import ABC, abstractmethod
 import boto3
-from botocore.exceptions import NoCredentialsError
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config as BotoConfig
+from botocore.exceptions import ClientError, NoCredentialsError
+from services.compression import (
+    CODEC_SUFFIXES, get_codec, compress, decompress, decompressing_stream, copy_compressed, should_compress,
+)
+
+STREAM_CHUNK_BYTES = 1024 * 1024
+
+
+def _skip(stream, n: int):
+    """Advances a (possibly non-seekable) stream by n bytes."""
+    if n <= 0:
+        return
+    if hasattr(stream, "seekable") and stream.seekable():
+        stream.seek(n, os.SEEK_CUR)
+        return
+    while n > 0:
+        chunk = stream.read(min(n, STREAM_CHUNK_BYTES))
+        if not chunk:
+            break
+        n -= len(chunk)
+
+def _is_missing_key(error: Exception) -> bool:
+    """True for S3's 'no such object' errors (GetObject says NoSuchKey, HEAD-based calls a bare 404)."""
+    return isinstance(error, ClientError) and error.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound")
 
 class StorageService(ABC):
     @abstractmethod
@@ -20,6 +47,30 @@ class StorageService(ABC):
         """Retrieves content as a file-like stream (read-only)."""
         pass
 
+    def save_stream(self, fileobj, filename: str) -> str:
+        """Saves content read from a file-like object. Backends override this to avoid buffering."""
+        return self.save(fileobj.read(), filename)
+
+    def get_range(self, filename: str, start: int, end: int) -> bytes:
+        """Retrieves bytes [start, end] (inclusive) of the stored content."""
+        stream = self.get_stream(filename)
+        try:
+            _skip(stream, start)
+            return stream.read(end - start + 1)
+        finally:
+            if hasattr(stream, 'close'):
+                stream.close()
+
+    def download_to(self, filename: str, path: str):
+        """Writes the stored content to a local path without holding it all in memory."""
+        stream = self.get_stream(filename)
+        try:
+            with open(path, "wb") as f:
+                shutil.copyfileobj(stream, f, STREAM_CHUNK_BYTES)
+        finally:
+            if hasattr(stream, 'close'):
+                stream.close()
+
     @abstractmethod
     def delete(self, filename: str):
         """Deletes the file."""
@@ -30,54 +81,172 @@ class StorageService(ABC):
         """Lists files with prefix."""
         pass
 
+    @abstractmethod
+    def iter_objects(self, prefix: str = ""):
+        """Yields (key, size_bytes, last_modified_epoch) for every stored object with prefix."""
+        pass
+
 class LocalStorage(StorageService):
     def __init__(self, base_dir: str = "uploads"):
         self.base_dir = base_dir
         os.makedirs(self.base_dir, exist_ok=True)
+        # Compressed objects are stored with a codec suffix (e.g. "<name>.zst")
+        self.codec = get_codec("STORAGE_COMPRESSION")
+
+    def _resolve(self, filename: str):
+        """Returns (path, codec) of the stored variant of filename, or (None, None)."""
+        path = os.path.join(self.base_dir, filename)
+        for codec, suffix in CODEC_SUFFIXES.items():
+            if os.path.exists(path + suffix):
+                return path + suffix, codec
+        if os.path.exists(path):
+            return path, "none"
+        return None, None
 
     def save(self, file_content: bytes, filename: str) -> str:
         path = os.path.join(self.base_dir, filename)
-        with open(path, "wb") as f:
-            f.write(file_content)
-        return path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        codec = self.codec if should_compress(filename) else "none"
+        target = path + CODEC_SUFFIXES.get(codec, "")
+        with open(target, "wb") as f:
+            f.write(compress(file_content, codec))
+        # Drop variants written under a previous compression setting
+        for stale in [path] + [path + sfx for sfx in CODEC_SUFFIXES.values()]:
+            if stale != target and os.path.exists(stale):
+                os.remove(stale)
+        return target
 
-    def get(self, filename: str) -> bytes:
+    def save_stream(self, fileobj, filename: str) -> str:
         path = os.path.join(self.base_dir, filename)
-        if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        codec = self.codec if should_compress(filename) else "none"
+        target = path + CODEC_SUFFIXES.get(codec, "")
+        with open(target, "wb") as f:
+            copy_compressed(fileobj, f, codec, STREAM_CHUNK_BYTES)
+        for stale in [path] + [path + sfx for sfx in CODEC_SUFFIXES.values()]:
+            if stale != target and os.path.exists(stale):
+                os.remove(stale)
+        return target
+
+    def get(self, filename: str) -> bytes:
+        path, codec = self._resolve(filename)
+        if path is None:
             raise FileNotFoundError(f"File {filename} not found")
         with open(path, "rb") as f:
-            return f.read()
+            data = f.read()
+        return decompress(data) if codec != "none" else data
 
     def get_stream(self, filename: str):
-        path = os.path.join(self.base_dir, filename)
-        if not os.path.exists(path):
+        path, codec = self._resolve(filename)
+        if path is None:
             raise FileNotFoundError(f"File {filename} not found")
-        return open(path, "rb")
+        return decompressing_stream(open(path, "rb"), codec)
 
     def delete(self, filename: str):
         path = os.path.join(self.base_dir, filename)
-        if os.path.exists(path):
-            os.remove(path)
+        for variant in [path] + [path + sfx for sfx in CODEC_SUFFIXES.values()]:
+            if os.path.exists(variant):
+                os.remove(variant)
 
     def list(self, prefix: str) -> list[str]:
-        # Simple implementation for local
+        # Keys may contain "/" (e.g. results/<hash>/...), mirror S3 prefix semantics
         if not os.path.exists(self.base_dir):
             return []
-        return [f for f in os.listdir(self.base_dir) if f.startswith(prefix)]
+        keys = []
+        for root, _, files in os.walk(self.base_dir):
+            rel_root = os.path.relpath(root, self.base_dir)
+            for f in files:
+                key = f if rel_root == "." else f"{rel_root}/{f}".replace(os.sep, "/")
+                for suffix in CODEC_SUFFIXES.values():
+                    if key.endswith(suffix):
+                        key = key[:-len(suffix)]
+                        break
+                if key.startswith(prefix):
+                    keys.append(key)
+        return sorted(set(keys))
+
+    def iter_objects(self, prefix: str = ""):
+        if not os.path.exists(self.base_dir):
+            return
+        for root, _, files in os.walk(self.base_dir):
+            rel_root = os.path.relpath(root, self.base_dir)
+            for f in files:
+                key = f if rel_root == "." else f"{rel_root}/{f}".replace(os.sep, "/")
+                for suffix in CODEC_SUFFIXES.values():
+                    if key.endswith(suffix):
+                        key = key[:-len(suffix)]
+                        break
+                if not key.startswith(prefix):
+                    continue
+                try:
+                    st = os.stat(os.path.join(root, f))
+                except OSError:
+                    continue  # deleted concurrently
+                yield key, st.st_size, st.st_mtime
+
+# One boto3 client (and connection pool) per process, shared by every S3Storage.
+# Re-created after fork: boto3 clients must not be shared across processes.
+_s3_client = None
+_s3_client_pid = None
+_s3_client_lock = threading.Lock()
+
+
+def get_s3_client():
+    global _s3_client, _s3_client_pid
+    with _s3_client_lock:
+        if _s3_client is None or _s3_client_pid != os.getpid():
+            _s3_client = boto3.client(
+                's3',
+                aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
+                aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
+                region_name=os.getenv("AWS_REGION", "us-east-1"),
+                # Point at MinIO/LocalStack (or any S3-compatible server) for local testing
+                endpoint_url=os.getenv("S3_ENDPOINT_URL") or None,
+                config=BotoConfig(
+                    max_pool_connections=int(os.getenv("S3_MAX_POOL_CONNECTIONS", "32")),
+                    retries={"max_attempts": 5, "mode": "adaptive"},
+                    tcp_keepalive=True,
+                ),
+            )
+            _s3_client_pid = os.getpid()
+        return _s3_client
+
 
 class S3Storage(StorageService):
     def __init__(self):
         self.bucket = os.getenv("S3_BUCKET_NAME")
-        self.s3 = boto3.client(
-            's3',
-            aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
-            aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
-            region_name=os.getenv("AWS_REGION", "us-east-1")
+        self.s3 = get_s3_client()
+        self.codec = get_codec("STORAGE_COMPRESSION")
+        # Multipart uploads / parallel ranged downloads for large objects
+        mb = 1024 * 1024
+        self.transfer_config = TransferConfig(
+            multipart_threshold=int(os.getenv("S3_MULTIPART_THRESHOLD_MB", "8")) * mb,
+            multipart_chunksize=int(os.getenv("S3_MULTIPART_CHUNK_MB", "8")) * mb,
+            max_concurrency=int(os.getenv("S3_MAX_CONCURRENCY", "4")),
+            use_threads=True,
         )
 
     def save(self, file_content: bytes, filename: str) -> str:
+        codec = self.codec if should_compress(filename) else "none"
+        extra = {"Metadata": {"codec": codec}} if codec != "none" else {}
         try:
-            self.s3.put_object(Bucket=self.bucket, Key=filename, Body=file_content)
+            self.s3.put_object(Bucket=self.bucket, Key=filename, Body=compress(file_content, codec), **extra)
+            return f"s3://{self.bucket}/{filename}"
+        except NoCredentialsError:
+            raise Exception("AWS Credentials not available")
+
+    def save_stream(self, fileobj, filename: str) -> str:
+        codec = self.codec if should_compress(filename) else "none"
+        extra = {"Metadata": {"codec": codec}} if codec != "none" else None
+        try:
+            if codec == "none":
+                self.s3.upload_fileobj(fileobj, self.bucket, filename, Config=self.transfer_config)
+            else:
+                # Compress into a spooled buffer (spills to disk past 8MB) so memory stays bounded
+                with tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024) as spool:
+                    copy_compressed(fileobj, spool, codec, STREAM_CHUNK_BYTES)
+                    spool.seek(0)
+                    self.s3.upload_fileobj(spool, self.bucket, filename, ExtraArgs=extra, Config=self.transfer_config)
             return f"s3://{self.bucket}/{filename}"
         except NoCredentialsError:
             raise Exception("AWS Credentials not available")
@@ -85,30 +254,74 @@ class S3Storage(StorageService):
     def get(self, filename: str) -> bytes:
         try:
             response = self.s3.get_object(Bucket=self.bucket, Key=filename)
-            return response['Body'].read()
+            data = response['Body'].read()
         except Exception as e:
             raise FileNotFoundError(f"S3 File {filename} not found: {e}")
+        if response.get('Metadata', {}).get('codec', 'none') != 'none':
+            return decompress(data)
+        return data
 
     def get_stream(self, filename: str):
         try:
             response = self.s3.get_object(Bucket=self.bucket, Key=filename)
-            return response['Body']
         except Exception as e:
             raise FileNotFoundError(f"S3 File {filename} not found: {e}")
+        return decompressing_stream(response['Body'], response.get('Metadata', {}).get('codec', 'none'))
+
+    def get_range(self, filename: str, start: int, end: int) -> bytes:
+        try:
+            response = self.s3.get_object(Bucket=self.bucket, Key=filename, Range=f"bytes={start}-{end}")
+        except Exception as e:
+            raise FileNotFoundError(f"S3 File {filename} not found: {e}")
+        if response.get('Metadata', {}).get('codec', 'none') == 'none':
+            return response['Body'].read()
+        # Byte ranges of a compressed object are meaningless; decompress and skip instead
+        response['Body'].close()
+        return super().get_range(filename, start, end)
+
+    def download_to(self, filename: str, path: str):
+        try:
+            head = self.s3.head_object(Bucket=self.bucket, Key=filename)
+        except Exception as e:
+            raise FileNotFoundError(f"S3 File {filename} not found: {e}")
+        if head.get('Metadata', {}).get('codec', 'none') == 'none':
+            # Parallel ranged GETs, bounded by the transfer config
+            try:
+                self.s3.download_file(self.bucket, filename, path, Config=self.transfer_config)
+            except ClientError as e:
+                if _is_missing_key(e):  # deleted since the HEAD: a 404 to callers, like LocalStorage
+                    raise FileNotFoundError(f"S3 File {filename} not found: {e}")
+                raise
+        else:
+            super().download_to(filename, path)
 
     def delete(self, filename: str):
         self.s3.delete_object(Bucket=self.bucket, Key=filename)
 
     def list(self, prefix: str) -> list[str]:
-        response = self.s3.list_objects_v2(Bucket=self.bucket, Prefix=prefix)
-        if 'Contents' in response:
-            return [obj['Key'] for obj in response['Contents']]
-        return []
+        keys = []
+        paginator = self.s3.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=prefix):
+            keys.extend(obj['Key'] for obj in page.get('Contents', []))
+        return keys
+
+    def iter_objects(self, prefix: str = ""):
+        paginator = self.s3.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=prefix):
+            for obj in page.get('Contents', []):
+                yield obj['Key'], obj['Size'], obj['LastModified'].timestamp()
+
+_storage_service = None
+
 
 def get_storage_service() -> StorageService:
-    """Factory to get the correct storage service based on Env."""
-    if os.getenv("USE_S3", "false").lower() == "true":
-        print("Using S3 Storage")
-        return S3Storage()
-    print("Using Local Storage")
-    return LocalStorage()
+    """Factory to get the correct storage service based on Env. One instance per process."""
+    global _storage_service
+    if _storage_service is None:
+        if os.getenv("USE_S3", "false").lower() == "true":
+            print("Using S3 Storage")
+            _storage_service = S3Storage()
+        else:
+            print("Using Local Storage")
+            _storage_service = LocalStorage()
+    return _storage_service
@@ -0,0 +1,320 @@
+"""
+Storage garbage collection.
+
+Every stored object is attributed to the file hash in its key (uploads are
+``<hash>.<ext>``, derived artifacts live under ``results/<hash>/`` etc.).
+Last access per hash is tracked in a small SQLite file; a background sweeper
+evicts whole hashes (blobs, derived artifacts and the DB record together)
+when they exceed the age quota or, least recently used first, when storage
+exceeds the size quota.
+
+Run once from the command line with ``python -m services.storage_gc [--dry-run]``.
+"""
+import os
+import re
+import time
+import fnmatch
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from typing import Dict, Any, Optional, List
+
+from services.search import get_search_index
+
+GC_ENABLED = os.getenv("GC_ENABLED", "false").lower() == "true"
+GC_INTERVAL_SECONDS = int(os.getenv("GC_INTERVAL_SECONDS", "600"))
+GC_MAX_STORAGE_MB = int(os.getenv("GC_MAX_STORAGE_MB", "0"))  # 0 = no size quota
+GC_MAX_AGE_DAYS = float(os.getenv("GC_MAX_AGE_DAYS", "0"))  # 0 = no age quota
+GC_LOW_WATERMARK = float(os.getenv("GC_LOW_WATERMARK", "0.9"))  # evict down to this fraction of the quota
+GC_GRACE_SECONDS = int(os.getenv("GC_GRACE_SECONDS", "3600"))  # never touch very recent objects
+ACCESS_DB_PATH = os.getenv("GC_ACCESS_DB", "outputs/access.db")
+
+# Local disk outside storage is part of the quota: files under GC_OUTPUT_DIR named by
+# a file hash (JSON DB shards, legacy cache files) are evicted with that hash, the
+# caches below are pruned file by file (oldest first; rebuilt on demand), and the
+# rest (search/job/access indexes) is counted but never deleted.
+GC_OUTPUT_DIR = os.getenv("GC_OUTPUT_DIR", "outputs")
+CACHE_DIRS = [
+    os.getenv("PAGE_CACHE_DIR", "outputs/page_cache"),
+    os.getenv("SYNTHESIS_CACHE_DIR", "outputs/synthesis_cache"),
+]
+# Top-level downloads written by older versions
+STALE_OUTPUT_PATTERNS = ["harmonized_*"]
+JOB_PAGE_SIZE = 200
+
+_HASH_RE = re.compile(r"(?:^|/)([0-9a-f]{64})(?=[./_]|$)")
+
+
+def hash_from_key(key: str) -> Optional[str]:
+    match = _HASH_RE.search(key)
+    return match.group(1) if match else None
+
+
+class AccessTracker:
+    """Last-access timestamps per file hash, shared between processes via SQLite."""
+
+    def __init__(self, path: str = ACCESS_DB_PATH, write_interval: float = 60.0):
+        self.path = path
+        self.write_interval = write_interval  # coalesce touches from status polling
+        self._recent: Dict[str, float] = {}
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS access (file_hash TEXT PRIMARY KEY, last_access REAL NOT NULL)")
+            self._local.conn = conn
+        return conn
+
+    def touch(self, file_hash: str, now: Optional[float] = None):
+        now = now if now is not None else time.time()
+        if now - self._recent.get(file_hash, 0) < self.write_interval:
+            return
+        self._recent[file_hash] = now
+        try:
+            conn = self._conn()
+            conn.execute(
+                "INSERT INTO access (file_hash, last_access) VALUES (?, ?) "
+                "ON CONFLICT(file_hash) DO UPDATE SET last_access = MAX(last_access, excluded.last_access)",
+                (file_hash, now),
+            )
+            conn.commit()
+        except sqlite3.Error as e:
+            print(f"[GC] Failed to record access: {e}")
+
+    def last_access(self) -> Dict[str, float]:
+        return dict(self._conn().execute("SELECT file_hash, last_access FROM access").fetchall())
+
+    def forget(self, file_hash: str):
+        self._recent.pop(file_hash, None)
+        conn = self._conn()
+        conn.execute("DELETE FROM access WHERE file_hash = ?", (file_hash,))
+        conn.commit()
+
+
+_tracker: Optional[AccessTracker] = None
+
+
+def get_access_tracker() -> AccessTracker:
+    global _tracker
+    if _tracker is None:
+        _tracker = AccessTracker()
+    return _tracker
+
+
+def _walk(root: str):
+    """(path, size, mtime) of every file under root; files vanishing mid-walk are skipped."""
+    for dirpath, _, files in os.walk(root):
+        for name in files:
+            path = os.path.join(dirpath, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            yield path, st.st_size, st.st_mtime
+
+
+def _inside(path: str, roots: List[str]) -> bool:
+    path = os.path.abspath(path)
+    return any(path == r or path.startswith(r + os.sep) for r in roots)
+
+
+def _iter_jobs(db):
+    """Every DB record (listing columns only), so records without blobs are swept too."""
+    cursor = None
+    while True:
+        page = db.list_jobs(limit=JOB_PAGE_SIZE, cursor=cursor)
+        yield from page["items"]
+        cursor = page["next_cursor"]
+        if not cursor:
+            return
+
+
+def _timestamp(iso: Optional[str]) -> float:
+    if not iso:
+        return 0.0
+    return datetime.fromisoformat(iso).replace(tzinfo=timezone.utc).timestamp()
+
+
+def run_gc(storage, db, tracker: AccessTracker, now: Optional[float] = None, dry_run: bool = False,
+           max_bytes: Optional[int] = None, max_age_days: Optional[float] = None,
+           output_dir: Optional[str] = None, cache_dirs: Optional[List[str]] = None) -> Dict[str, Any]:
+    """One sweep. Returns stats about what was (or, with dry_run, would be) evicted."""
+    now = now if now is not None else time.time()
+    max_bytes = max_bytes if max_bytes is not None else GC_MAX_STORAGE_MB * 1024 * 1024
+    max_age_days = max_age_days if max_age_days is not None else GC_MAX_AGE_DAYS
+    output_dir = output_dir if output_dir is not None else GC_OUTPUT_DIR
+    cache_dirs = cache_dirs if cache_dirs is not None else CACHE_DIRS
+
+    # Group everything attributable to a hash: storage keys, local files, total size, newest mtime
+    groups: Dict[str, Dict[str, Any]] = {}
+    total_bytes = 0
+
+    def group_for(file_hash: str) -> Dict[str, Any]:
+        return groups.setdefault(file_hash, {"keys": [], "paths": [], "bytes": 0, "mtime": 0.0})
+
+    for key, size, mtime in storage.iter_objects(""):
+        total_bytes += size
+        file_hash = hash_from_key(key)
+        if not file_hash:
+            continue
+        group = group_for(file_hash)
+        group["keys"].append(key)
+        group["bytes"] += size
+        group["mtime"] = max(group["mtime"], mtime)
+
+    loose = []  # (mtime, path, size) of prunable cache files
+    cache_roots = [os.path.abspath(d) for d in cache_dirs]
+    for root in cache_dirs:
+        for path, size, mtime in _walk(root):
+            total_bytes += size
+            loose.append((mtime, path, size))
+
+    local_roots: List[str] = []
+    for root in [output_dir, getattr(db, "cache_dir", None)]:  # the local JSON DB may live elsewhere
+        if root and not _inside(root, [os.path.abspath(r) for r in local_roots]):
+            local_roots.append(root)
+    overhead_bytes = 0
+    for root in local_roots:
+        for path, size, mtime in _walk(root):
+            if _inside(path, cache_roots):
+                continue
+            total_bytes += size
+            rel = os.path.relpath(path, root).replace(os.sep, "/")
+            file_hash = hash_from_key(rel)
+            if file_hash:
+                group = group_for(file_hash)
+                group["paths"].append(path)
+                group["bytes"] += size
+                group["mtime"] = max(group["mtime"], mtime)
+            elif "/" not in rel and any(fnmatch.fnmatch(rel, p) for p in STALE_OUTPUT_PATTERNS):
+                loose.append((mtime, path, size))
+            else:
+                overhead_bytes += size
+
+    for job in _iter_jobs(db):
+        group = group_for(job["file_hash"])
+        group["mtime"] = max(group["mtime"], _timestamp(job.get("updated_at")))
+
+    accessed = tracker.last_access()
+    for file_hash, group in groups.items():
+        group["last_access"] = max(accessed.get(file_hash, 0.0), group["mtime"])
+
+    stats = {"scanned_bytes": total_bytes, "overhead_bytes": overhead_bytes, "hashes": len(groups),
+             "evicted": 0, "pruned_cache_files": 0, "freed_bytes": 0, "skipped_in_use": 0, "dry_run": dry_run}
+    done = set()
+
+    def evict_hash(file_hash: str) -> bool:
+        group = groups[file_hash]
+        done.add(file_hash)
+        if now - group["last_access"] < GC_GRACE_SECONDS:
+            stats["skipped_in_use"] += 1
+            return False
+        record = db.get_metadata(file_hash)
+        if record and record.get("status") == "processing":
+            stats["skipped_in_use"] += 1
+            return False
+        stats["evicted"] += 1
+        stats["freed_bytes"] += group["bytes"]
+        if dry_run:
+            return True
+        # DB record first: a reader never sees a "success" record whose blobs are gone
+        db.delete_metadata(file_hash)
+        get_search_index().update(file_hash, {"status": "evicted"})
+        for key in group["keys"]:
+            try:
+                storage.delete(key)
+            except Exception as e:
+                print(f"[GC] Failed to delete {key}: {e}")
+        for path in group["paths"]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass  # the JSON DB shard went with delete_metadata
+        tracker.forget(file_hash)
+        return True
+
+    def prune_file(path: str, size: int, mtime: float) -> bool:
+        done.add(path)
+        if now - mtime < GC_GRACE_SECONDS:
+            return False
+        stats["pruned_cache_files"] += 1
+        stats["freed_bytes"] += size
+        if not dry_run:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        return True
+
+    if max_age_days > 0:
+        cutoff = now - max_age_days * 86400
+        for file_hash, group in groups.items():
+            if group["last_access"] < cutoff:
+                evict_hash(file_hash)
+        for mtime, path, size in loose:
+            if mtime < cutoff:
+                prune_file(path, size, mtime)
+
+    remaining = total_bytes - stats["freed_bytes"]
+    if max_bytes > 0 and remaining > max_bytes:
+        target = max_bytes * GC_LOW_WATERMARK
+        # One LRU order over whole hashes and single cache files; only what is actually
+        # removed counts as freed, so skipped (in use) entries never end the walk early
+        candidates = [(g["last_access"], "hash", h) for h, g in groups.items() if h not in done]
+        candidates += [(mtime, "file", (path, size)) for mtime, path, size in loose if path not in done]
+        for last_access, kind, item in sorted(candidates, key=lambda c: c[0]):
+            if remaining <= target:
+                break
+            if kind == "hash":
+                freed = groups[item]["bytes"] if evict_hash(item) else 0
+            else:
+                freed = item[1] if prune_file(item[0], item[1], last_access) else 0
+            remaining -= freed
+
+    stats["finished_at"] = now
+    print(f"[GC] Sweep: {stats}")
+    return stats
+
+
+class Sweeper:
+    """Runs run_gc every GC_INTERVAL_SECONDS on a daemon thread."""
+
+    def __init__(self, storage, db, tracker: AccessTracker, interval: int = GC_INTERVAL_SECONDS):
+        self.storage = storage
+        self.db = db
+        self.tracker = tracker
+        self.interval = interval
+        self.last_stats: Optional[Dict[str, Any]] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="storage-gc", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.last_stats = run_gc(self.storage, self.db, self.tracker)
+            except Exception as e:
+                print(f"[GC] Sweep failed: {e}")
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+    from services.storage import get_storage_service
+    from services.database import get_db_service
+
+    parser = argparse.ArgumentParser(description="Evict stored uploads and results over the GC quotas.")
+    parser.add_argument("--dry-run", action="store_true", help="Report what would be evicted without deleting")
+    args = parser.parse_args()
+    print(json.dumps(run_gc(get_storage_service(), get_db_service(), get_access_tracker(), dry_run=args.dry_run), indent=2))
@@ -1,128 +1,96 @@
-import os
-import tempfile
+import json
 import gc
-import shutil
-from typing import Dict, Any
+from typing import List
+from celery import chord, group
 from celery_app import celery_app
 from services.storage import get_storage_service
 from services.database import get_db_service
+from services.results import offload_pdf_payload
+from services.leases import LeaseKeeper, LEASE_QUEUE_TTL_SECONDS
+from services.routing import QUEUE_DIGITAL, route_options
+from services.jobs import process_file, _local_copy, _save_result, _save_error
 
-# Import core logic (existing files)
-# We assume these are in the python path (root dir)
-import sys
-sys.path.append(os.getcwd()) # Ensure root is in path
-
-from ingester import extract_file_info
-from harmonizer import get_aikosh_metadata
-from pdf_service.orchestrator import process_pdf
-
-def _idmo_blob(data: dict) -> dict:
-    """Get the IDMO metadata blob (for harmonize it's top-level; for PDF it's under 'metadata')."""
-    return data.get("metadata") or data
+# Celery entry points. The work itself is in services.jobs, which the API and
+# local workers use without importing Celery.
 
 @celery_app.task(bind=True)
 def process_file_task(self, file_hash: str, filename: str, task_type: str = "harmonize"):
-    """
-    Background task to process a file.
-    1. Downloads file from Storage (S3/Local).
-    2. Runs processing (Harmonize or PDF).
-    3. Saves result to Database (Postgres/JSON).
-    """
-    storage = get_storage_service()
-    db = get_db_service()
+    return process_file(file_hash, filename, task_type)
 
-    # Safe temp file: filename may contain path separators on some systems
-    ext = os.path.splitext(filename)[1] or ".bin"
-    fd, temp_path = tempfile.mkstemp(suffix=ext, prefix="aikosh_worker_")
-    os.close(fd)
-    
-    try:
-        print(f"[Worker] Processing {filename} ({task_type})")
-        
-        # 1. Download from Storage (Streaming)
-        stream = storage.get_stream(filename)
-        try:
-            with open(temp_path, "wb") as f:
-                shutil.copyfileobj(stream, f)
-        finally:
-            if hasattr(stream, 'close'):
-                stream.close()
-            
-        result_metadata = {}
+# --- PDF pipeline as a task graph (Celery mode) ---
+# Text/OCR and tables run concurrently on separate workers; finalize (cleaning,
+# scoring, LLM metadata) runs once both are done. Stage outputs are handed over
+# through storage ("work/<hash>/...") so only small references go through the broker.
+
+def _work_key(file_hash: str, stage: str) -> str:
+    return f"work/{file_hash}/{stage}.json"
 
-        # 2. Process
-        print(f"[Worker] Step 1: Processing started for {task_type}")
-        if task_type == "harmonize":
-            # Excel/CSV
-            print(f"[Worker] Step 2: Extracting info from {temp_path}")
-            raw_info = extract_file_info(temp_path)
-            # Need to patch the filename in raw_info because temp_path is ugly
-            raw_info.filename = filename 
-            
-            print(f"[Worker] Step 3: Calling Harmonizer (AI)")
-            result_metadata = get_aikosh_metadata(raw_info)
-            print(f"[Worker] Step 4: Harmonization Complete")
-            
-        elif task_type == "pdf":
-            print(f"[Worker] Step 2: Orchestrating PDF")
-            # PDF Orchestrator
-            result = process_pdf(temp_path)
-            # Save FULL result (tables, lineage, etc)
-            result_metadata = result
-            print(f"[Worker] Step 3: PDF Complete")
+def _run_pdf_stage(file_hash: str, filename: str, stage: str, stage_fn) -> str:
+    storage = get_storage_service()
+    try:
+        # Nothing heartbeats between this stage and finalize, which may wait behind a busy
+        # queue: leave the lease with the queue TTL, as at dispatch
+        with LeaseKeeper(get_db_service(), file_hash, handoff_ttl=LEASE_QUEUE_TTL_SECONDS), \
+                _local_copy(storage, filename) as temp_path:
+            output = stage_fn(temp_path)
+        key = _work_key(file_hash, stage)
+        storage.save(json.dumps(output, separators=(",", ":"), ensure_ascii=False).encode("utf-8"), key)
+        return key
+    finally:
+        gc.collect()
 
-        # Add tracking info
-        result_metadata["file_hash"] = file_hash
-        result_metadata["original_filename"] = filename
-        result_metadata["_worker_processed"] = True
+@celery_app.task
+def pdf_text_task(file_hash: str, filename: str) -> str:
+    from pdf_service.orchestrator import run_text_stage
+    print(f"[Worker] PDF text/OCR stage for {filename}")
+    return _run_pdf_stage(file_hash, filename, "text", run_text_stage)
 
-        # CRITICAL: explicit status update for frontend polling
-        # For PDF, error can be in result_metadata["metadata"], top-level, or _errors from orchestrator
-        print(f"[Worker] Step 5: Checking for errors in result")
-        idmo = _idmo_blob(result_metadata)
-        pdf_errors = result_metadata.pop("_errors", None)  # list of per-stage errors
-        has_error = (
-            pdf_errors
-            or "error" in result_metadata
-            or result_metadata.get("title") == "Processing Error"
-            or "error" in idmo
-            or idmo.get("title") == "Processing Error"
-        )
-        if has_error:
-            result_metadata["status"] = "error"
-            result_metadata["error_message"] = (
-                "; ".join(pdf_errors)
-                if pdf_errors
-                else result_metadata.get("error")
-                or result_metadata.get("summary")
-                or idmo.get("error")
-                or idmo.get("summary")
-                or "Processing failed"
-            )
-            print(f"[Worker] Failure Detected: {result_metadata['error_message']}")
-        else:
-            result_metadata["status"] = "success"
-        
-        # 3. Save to DB
-        print(f"[Worker] Step 6: Saving to DB")
-        db.save_metadata(file_hash, result_metadata)
-        print(f"[Worker] Finished {filename}")
-        
-        return result_metadata
+@celery_app.task
+def pdf_tables_task(file_hash: str, filename: str) -> str:
+    from pdf_service.orchestrator import run_table_stage
+    print(f"[Worker] PDF table stage for {filename}")
+    return _run_pdf_stage(file_hash, filename, "tables", run_table_stage)
 
+@celery_app.task
+def pdf_finalize_task(stage_keys: List[str], file_hash: str, filename: str):
+    from pdf_service.orchestrator import finalize_pdf
+    storage = get_storage_service()
+    db = get_db_service()
+    try:
+        text_key, tables_key = stage_keys
+        with LeaseKeeper(db, file_hash):
+            text_stage = json.loads(storage.get(text_key))
+            table_stage = json.loads(storage.get(tables_key))
+            result = finalize_pdf(filename, text_stage, table_stage)
+            result_metadata = offload_pdf_payload(storage, file_hash, result)
+        saved = _save_result(db, file_hash, filename, result_metadata)
+        for key in stage_keys:
+            storage.delete(key)
+        return saved
     except Exception as e:
-        print(f"[Worker] Error processing {filename}: {e}")
-        # Save error state to DB so frontend knows it failed
-        error_meta = {
-            "file_hash": file_hash,
-            "status": "error", 
-            "error_message": str(e)
-        }
-        db.save_metadata(file_hash, error_meta)
+        print(f"[Worker] Error finalizing {filename}: {e}")
+        _save_error(db, file_hash, e)
         raise e
     finally:
-        # Cleanup temp file
-        if os.path.exists(temp_path):
-            os.remove(temp_path)
-        # Explicit GC
         gc.collect()
+
+@celery_app.task
+def pdf_pipeline_failed(request, exc, traceback, file_hash: str):
+    """Errback: a stage task crashed, so the chord callback never runs."""
+    print(f"[Worker] PDF pipeline failed for {file_hash}: {exc}")
+    _save_error(get_db_service(), file_hash, exc)
+
+def dispatch_file_task(file_hash: str, filename: str, task_type: str, queue: str):
+    return process_file_task.apply_async((file_hash, filename, task_type), **route_options(queue))
+
+def dispatch_pdf_pipeline(file_hash: str, filename: str, queue: str = QUEUE_DIGITAL):
+    """Launches text/OCR and tables in parallel, then finalize: critical path = max(text, tables) + LLM."""
+    # Only the text stage needs the OCR pool; tables and finalize stay on the digital queue,
+    # but with the job's own time limits (Camelot on a huge PDF outlasts the digital limit)
+    digital = route_options(QUEUE_DIGITAL, limits_of=queue)
+    header = group(
+        pdf_text_task.s(file_hash, filename).set(**route_options(queue)),
+        pdf_tables_task.s(file_hash, filename).set(**digital),
+    )
+    callback = pdf_finalize_task.s(file_hash, filename).set(**digital).on_error(pdf_pipeline_failed.s(file_hash))
+    return chord(header)(callback)
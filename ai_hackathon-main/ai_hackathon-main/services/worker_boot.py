@@ -0,0 +1,69 @@
+"""
+Celery worker bootstrap.
+
+Runs in the worker's parent process before the prefork pool starts: imports the
+pipeline libraries and loads the EasyOCR model once, then freezes the GC so the
+forked children share those pages copy-on-write instead of each loading its own
+copy. Children are recycled when their memory grows past the measured baseline,
+not after a fixed number of tasks.
+"""
+import os
+import gc
+import time
+import resource
+from typing import Iterable, Optional
+
+from services.routing import QUEUE_DIGITAL, QUEUE_OCR
+
+# auto = preload what the worker's queues need; true = everything; false = nothing (lazy, per child)
+WORKER_PRELOAD = os.getenv("WORKER_PRELOAD", "auto").lower()
+# Recycle a child once its RSS exceeds the preloaded baseline by this much (0 = off)
+WORKER_MAX_MEMORY_GROWTH_MB = int(os.getenv("WORKER_MAX_MEMORY_GROWTH_MB", "400"))
+
+
+def _rss_kb() -> int:
+    # Peak RSS of this process (KiB on Linux), the same measure Celery uses for max_memory_per_child
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def preload_pipeline(queues: Optional[Iterable[str]] = None) -> dict:
+    """Imports pipeline modules (and the OCR model when the worker serves OCR). Returns timing/RSS stats."""
+    queues = list(queues or [])
+    stats = {"preloaded": [], "seconds": 0.0, "rss_mb": 0.0}
+    if WORKER_PRELOAD == "false":
+        return stats
+    start = time.perf_counter()
+
+    # No -Q means the worker consumes every queue
+    preload_all = WORKER_PRELOAD == "true" or not queues
+
+    import ingester  # noqa: F401  pandas
+    import harmonizer  # noqa: F401  Gemini SDK
+    stats["preloaded"].append("harmonize")
+
+    if preload_all or QUEUE_DIGITAL in queues or QUEUE_OCR in queues:
+        import pdf_service.orchestrator  # noqa: F401  PyMuPDF, pdfplumber
+        import pdf_service.table_extractor  # noqa: F401  Camelot, OpenCV
+        stats["preloaded"].append("pdf")
+
+    if preload_all or QUEUE_OCR in queues:
+        from pdf_service.ocr_extractor import preload_reader
+        if preload_reader():  # no-op in LOW_MEMORY_MODE
+            stats["preloaded"].append("easyocr")
+
+    # Move everything loaded so far out of the collector's reach: GC passes in the
+    # children would otherwise write to these objects and un-share their pages
+    gc.collect()
+    gc.freeze()
+
+    stats["seconds"] = round(time.perf_counter() - start, 2)
+    stats["rss_mb"] = round(_rss_kb() / 1024, 1)
+    return stats
+
+
+def memory_limit_kb(baseline_kb: Optional[int] = None) -> Optional[int]:
+    """Per-child RSS limit (KiB) for worker_max_memory_per_child, or None when disabled."""
+    if WORKER_MAX_MEMORY_GROWTH_MB <= 0:
+        return None
+    baseline_kb = baseline_kb if baseline_kb is not None else _rss_kb()
+    return baseline_kb + WORKER_MAX_MEMORY_GROWTH_MB * 1024
@@ -1,47 +1,201 @@
 import os
 import json
 import time
-from google import genai
+import hashlib
+from collections import Counter
 from dotenv import load_dotenv
 
 load_dotenv()
 api_key = os.getenv("GEMINI_API_KEY")
 
+from pdf_service.metadata_generator import get_prioritized_models, generate_metadata_with_retry, make_client
+
 if api_key:
-    client = genai.Client(api_key=api_key)
+    client = make_client(api_key)
 else:
     client = None
+from services.catalog import section as _section, parse_temporal_range as _parse_temporal_range
 
-from pdf_service.metadata_generator import get_prioritized_models, generate_metadata_with_retry
+# Tree reduction settings: each LLM call sees at most SYNTHESIS_FANOUT records,
+# and every intermediate node is cached on disk by the hash of its children.
+SYNTHESIS_FANOUT = max(2, int(os.getenv("SYNTHESIS_FANOUT", "8")))
+SYNTHESIS_CACHE_DIR = os.getenv("SYNTHESIS_CACHE_DIR", "outputs/synthesis_cache")
+SYNTHESIS_CACHE_VERSION = "v1"  # bump when the node prompt changes
 
-def synthesize_metadata(metadata_list):
+# Broadest granularity wins when merging coverage.
+GRANULARITY_RANK = {
+    "village": 0,
+    "sub-district": 1,
+    "district": 2,
+    "state": 3,
+    "national": 4,
+}
+
+
+def _broadest_granularity(values):
+    best = None
+    for value in values:
+        key = str(value or "").strip().lower().replace(" ", "-")
+        if key in GRANULARITY_RANK and (best is None or GRANULARITY_RANK[key] > GRANULARITY_RANK[best]):
+            best = key
+    if best is None:
+        return ""
+    return "Sub-District" if best == "sub-district" else best.title()
+
+
+def merge_fields(metadata_list):
     """
-    Takes a list of metadata JSON objects and synthesizes them into a single
-    consolidated metadata record using Gemini.
+    Deterministically merge the fields that don't need an LLM:
+    keyword union ranked by frequency, min/max temporal range and spatial hierarchy.
     """
-    if not client:
-        return {"error": "GEMINI_API_KEY not found"}
+    keyword_counts = Counter()
+    first_seen = {}
+    starts, ends = [], []
+    coverages, jurisdictions, granularities = [], [], []
 
-    if not metadata_list:
-        return {"error": "No metadata provided for synthesis"}
+    for record in metadata_list:
+        idmo = record.get("metadata") or record if isinstance(record, dict) else {}
+        catalog = _section(idmo, "catalog_info")
+        provenance = _section(idmo, "provenance")
+        spatial = _section(idmo, "spatial_temporal")
+
+        for kw in catalog.get("keywords") or []:
+            kw = str(kw).strip()
+            if not kw:
+                continue
+            key = kw.lower()
+            keyword_counts[key] += 1
+            first_seen.setdefault(key, kw)
+
+        start, end = _parse_temporal_range(spatial.get("temporal_range"))
+        if start:
+            starts.append(start)
+            ends.append(end)
+
+        if spatial.get("spatial_coverage"):
+            coverages.append(str(spatial["spatial_coverage"]).strip())
+        if provenance.get("jurisdiction"):
+            jurisdictions.append(str(provenance["jurisdiction"]).strip())
+        granularities.append(spatial.get("granularity"))
+
+    # Most frequent first; ties keep first-seen order (Counter.most_common is stable)
+    keywords = [first_seen[k] for k, _ in keyword_counts.most_common()]
+
+    granularity = _broadest_granularity(granularities)
+    unique_coverages = list(dict.fromkeys(coverages))
+    unique_jurisdictions = list(dict.fromkeys(jurisdictions))
+    if len(unique_coverages) <= 1:
+        coverage = unique_coverages[0] if unique_coverages else ""
+    elif len(unique_jurisdictions) == 1:
+        # Different regions under one jurisdiction -> roll up to the jurisdiction
+        coverage = unique_jurisdictions[0]
+        if GRANULARITY_RANK.get(granularity.lower(), -1) < GRANULARITY_RANK["state"]:
+            granularity = "State"
+    else:
+        coverage = "India"
+        granularity = "National"
+    jurisdiction = unique_jurisdictions[0] if len(unique_jurisdictions) == 1 else ("India" if unique_jurisdictions else "")
+
+    return {
+        "catalog_info": {"keywords": keywords},
+        "provenance": {"jurisdiction": jurisdiction},
+        "spatial_temporal": {
+            "temporal_range": f"{min(starts)} to {max(ends)}" if starts else "",
+            "spatial_coverage": coverage,
+            "granularity": granularity,
+        },
+    }
+
+
+def _compact_record(record):
+    """Strip a record down to the fields the LLM needs to name and describe the collection."""
+    idmo = record.get("metadata") or record
+    catalog = _section(idmo, "catalog_info")
+    return {
+        "catalog_info": {
+            "title": catalog.get("title", ""),
+            "description": catalog.get("description", ""),
+            "sector": catalog.get("sector", ""),
+            "keywords": (catalog.get("keywords") or [])[:15],
+        },
+        "provenance": _section(idmo, "provenance"),
+        "spatial_temporal": _section(idmo, "spatial_temporal"),
+    }
+
+
+def _record_key(record):
+    canonical = json.dumps(_compact_record(record), sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def _node_key(child_keys):
+    joined = SYNTHESIS_CACHE_VERSION + ":" + ",".join(child_keys)
+    return hashlib.sha256(joined.encode("utf-8")).hexdigest()
+
+
+def _chunk(keys):
+    """
+    Content-defined grouping of sorted keys: a group of at least two closes after a
+    key whose hash is divisible by the fanout (or when the group is full). Inserting
+    one record therefore only changes the group it lands in, not every group after it.
+    """
+    groups, current = [], []
+    for key in keys:
+        current.append(key)
+        boundary = len(current) >= 2 and int(key[:8], 16) % SYNTHESIS_FANOUT == 0
+        if boundary or len(current) >= SYNTHESIS_FANOUT:
+            groups.append(current)
+            current = []
+    if current:
+        groups.append(current)
+    return groups
+
+
+def _load_node(key):
+    path = os.path.join(SYNTHESIS_CACHE_DIR, f"{key}.json")
+    if os.path.exists(path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception:
+            return None
+    return None
+
+
+def _save_node(key, record):
+    try:
+        os.makedirs(SYNTHESIS_CACHE_DIR, exist_ok=True)
+        path = os.path.join(SYNTHESIS_CACHE_DIR, f"{key}.json")
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(record, f, separators=(",", ":"))
+        os.replace(tmp_path, path)
+    except Exception as e:
+        print(f"Failed to save synthesis node: {e}")
+
+
+def _llm_synthesize(records, merged):
+    """Synthesize one bounded group of records into a single IDMO record using Gemini."""
+    input_text = json.dumps([_compact_record(r) for r in records], separators=(",", ":"))
+    merged_text = json.dumps(merged, separators=(",", ":"))
 
-    # Prepare the input for the LLM
-    input_text = json.dumps(metadata_list, indent=2)
-    
     prompt = f"""
     Act as a Senior Data Architect for the **India Data Management Office (IDMO)**.
     You are provided with a list of metadata records extracted from related Indian Government documents.
-    
+
     YOUR TASK:
     Synthesize these into a SINGLE Master Metadata Record that represents the *entire collection*.
-    
+
     RULES FOR SYNTHESIS:
     1. **Title**: If parts are "Annual Report Part 1" & "Part 2", Master Title is "Annual Report 2024".
     2. **Sector**: Must be one of standard OGD sectors (Agriculture, Education, etc.).
     3. **Spatial**: Find the broadest coverage. If one is "Mumbai" and another "Pune", coverage is "Maharashtra".
     4. **Temporal**: Create a range from the Earliest Start Date to the Latest End Date.
     5. **Ministry**: Ensure the Ministry name is standardized and expanded.
-    
+
+    PRE-MERGED FIELDS (computed deterministically, use them as given unless clearly wrong):
+    {merged_text}
+
     INPUT METADATA LIST:
     {input_text}
 
@@ -69,32 +223,104 @@ def synthesize_metadata(metadata_list):
             "machine_readable": true
         }}
     }}
-    
+
     Return ONLY the raw JSON.
     """
 
     candidates = get_prioritized_models(client)
     last_error = None
-    
+
     for model_id in candidates:
         try:
             print(f"Synthesizing with model: {model_id}...")
             response = generate_metadata_with_retry(model_id, prompt)
-            
+
             if not response:
                 continue
-                
+
             raw_text = response.text.strip()
             if "```json" in raw_text:
                 raw_text = raw_text.split("```json")[1].split("```")[0]
             elif "```" in raw_text:
                 raw_text = raw_text.split("```")[1].split("```")[0]
-                
+
             return json.loads(raw_text.strip())
-            
+
         except Exception as e:
             print(f"Synthesis failed with {model_id}: {e}")
             last_error = e
             continue
 
-    return {"error": f"Synthesis failed across all models. Last error: {str(last_error)}"}
+    raise RuntimeError(f"Synthesis failed across all models. Last error: {str(last_error)}")
+
+
+def _apply_merged(record, merged):
+    """Overlay deterministic fields onto an LLM record so they never drift."""
+    result = dict(record)
+    for section, fields in merged.items():
+        target = dict(_section(result, section))
+        for field, value in fields.items():
+            if value:
+                target[field] = value
+        result[section] = target
+    return result
+
+
+def synthesize_metadata(metadata_list):
+    """
+    Takes a list of metadata JSON objects and synthesizes them into a single
+    consolidated metadata record.
+
+    Keywords, temporal range and spatial coverage are merged deterministically.
+    Titles and descriptions are reduced by Gemini in a tree of groups of at most
+    SYNTHESIS_FANOUT records, with every node cached so adding a record only
+    recomputes the nodes on its path to the root.
+    """
+    if not client:
+        return {"error": "GEMINI_API_KEY not found"}
+
+    if not metadata_list:
+        return {"error": "No metadata provided for synthesis"}
+
+    records = [r for r in metadata_list if isinstance(r, dict)]
+    if not records:
+        return {"error": "No metadata provided for synthesis"}
+
+    start = time.time()
+    stats = {"records": len(records), "llm_calls": 0, "cache_hits": 0, "depth": 0}
+
+    # Leaves: dedupe identical records, order by content hash so grouping is stable
+    nodes = {}
+    for record in records:
+        nodes.setdefault(_record_key(record), record)
+    keys = sorted(nodes)
+
+    try:
+        while len(keys) > 1:
+            stats["depth"] += 1
+            next_keys = []
+            for group in _chunk(keys):
+                if len(group) == 1:
+                    next_keys.append(group[0])
+                    continue
+                key = _node_key(group)
+                node = _load_node(key)
+                if node is None:
+                    children = [nodes[k] for k in group]
+                    merged = merge_fields(children)
+                    node = _apply_merged(_llm_synthesize(children, merged), merged)
+                    _save_node(key, node)
+                    stats["llm_calls"] += 1
+                else:
+                    stats["cache_hits"] += 1
+                nodes[key] = node
+                next_keys.append(key)
+            keys = sorted(next_keys)
+    except Exception as e:
+        return {"error": str(e)}
+
+    result = _apply_merged(nodes[keys[0]], merge_fields(records))
+    stats["seconds"] = round(time.time() - start, 2)
+    result["_synthesis"] = stats
+    print(f"Synthesis complete: {stats}")
+    return result
@@ -0,0 +1,69 @@
+"""
+Micro-benchmark: pixmap -> ndarray for OCR.
+
+Compares the old PIL round trip (pix.samples -> Image.frombytes -> np.array)
+with the zero-copy view used by ocr_extractor. tracemalloc sees bytes and numpy
+allocations but not PIL's own image buffer, so the PIL figure understates its
+real peak. Run from the app directory:
+
+    python tests/bench_rasterize.py [--dpi 150] [--pages 20]
+"""
+import os
+import sys
+import time
+import argparse
+import tracemalloc
+
+import fitz
+import numpy as np
+from PIL import Image
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(project_root)
+
+from pdf_service.ocr_extractor import pixmap_to_array
+
+
+def via_pil(pix):
+    mode = "L" if pix.n == 1 else "RGB"
+    return np.array(Image.frombytes(mode, [pix.width, pix.height], pix.samples))
+
+
+def zero_copy(pix):
+    return pixmap_to_array(pix)
+
+
+def measure(convert, pix, repeats: int):
+    tracemalloc.start()
+    start = time.perf_counter()
+    for _ in range(repeats):
+        arr = convert(pix)
+        arr.sum(dtype=np.uint64)  # touch the data, as the recognizer would
+        del arr
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed / repeats * 1000, peak / (1024 * 1024)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--dpi", type=int, default=150)
+    parser.add_argument("--pages", type=int, default=20, help="conversions per case")
+    args = parser.parse_args()
+
+    doc = fitz.open()
+    page = doc.new_page(width=842, height=1191)  # A3
+    page.insert_text((72, 72), "Rasterization benchmark " * 10)
+    for label, colorspace in (("gray", fitz.csGRAY), ("rgb", fitz.csRGB)):
+        pix = page.get_pixmap(dpi=args.dpi, colorspace=colorspace, alpha=False)
+        size_mb = len(pix.samples_mv) / (1024 * 1024)
+        print(f"{label}: {pix.width}x{pix.height}, {size_mb:.1f}MB per page")
+        for name, convert in (("PIL round trip", via_pil), ("zero-copy", zero_copy)):
+            ms, peak = measure(convert, pix, args.pages)
+            print(f"  {name:<15} {ms:8.2f} ms/page   peak alloc {peak:7.2f} MB")
+    doc.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+import sys
+import os
+import pytest
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(project_root)
+os.chdir(project_root)
+
+from services.database import JsonFileDB, PostgresDB
+from services.storage import LocalStorage
+
+HASH = "cd" + "1" * 62
+RECORD = {"status": "success", "pages": [{"page": i, "text": "district wise rainfall " * 50} for i in range(20)]}
+
+
+def test_json_db_compressed_roundtrip_reads_old_files(tmp_path, monkeypatch):
+    JsonFileDB(cache_dir=str(tmp_path)).save_metadata("ef" + "2" * 62, {"status": "success"})
+
+    monkeypatch.setenv("RESULT_COMPRESSION", "gzip")
+    db = JsonFileDB(cache_dir=str(tmp_path))
+    db.save_metadata(HASH, RECORD)
+    raw = (tmp_path / "cd" / f"{HASH}.json").read_bytes()
+    assert raw[:2] == b"\x1f\x8b"
+    assert len(raw) * 5 < len(str(RECORD))
+    assert db.get_metadata(HASH)["pages"] == RECORD["pages"]
+    assert db.get_metadata("ef" + "2" * 62)["status"] == "success"
+
+
+def test_local_storage_compression_is_transparent(tmp_path, monkeypatch):
+    monkeypatch.setenv("STORAGE_COMPRESSION", "gzip")
+    storage = LocalStorage(base_dir=str(tmp_path))
+    content = b"district,year,value\n" + b"Hingoli,2020,42\n" * 1000
+
+    storage.save(content, f"{HASH}.csv")
+    assert (tmp_path / f"{HASH}.csv.gz").exists()
+    assert storage.get(f"{HASH}.csv") == content
+    with storage.get_stream(f"{HASH}.csv") as stream:
+        assert stream.read() == content
+    assert storage.list(HASH) == [f"{HASH}.csv"]
+
+    storage.delete(f"{HASH}.csv")
+    assert storage.list(HASH) == []
+
+
+def test_postgres_db_compressed_column(tmp_path, monkeypatch):
+    monkeypatch.setenv("RESULT_COMPRESSION", "gzip")
+    db = PostgresDB(f"sqlite:///{tmp_path / 'meta.db'}")
+    db.save_metadata(HASH, RECORD)
+    assert db.get_metadata(HASH)["pages"] == RECORD["pages"]
@@ -0,0 +1,54 @@
+import sys
+import os
+import json
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(project_root)
+os.chdir(project_root)
+
+from services.database import JsonFileDB
+
+HASH = "ab" + "0" * 62
+
+
+def test_json_db_shards_and_writes_compactly(tmp_path):
+    db = JsonFileDB(cache_dir=str(tmp_path))
+    db.save_metadata(HASH, {"status": "processing", "file_hash": HASH})
+
+    path = tmp_path / "ab" / f"{HASH}.json"
+    assert path.exists()
+    assert "\n" not in path.read_text(encoding="utf-8")
+    assert [p.name for p in (tmp_path / "ab").iterdir()] == [f"{HASH}.json"]
+    assert db.get_metadata(HASH)["status"] == "processing"
+
+
+def test_json_db_lru_serves_repeat_reads_and_sees_external_writes(tmp_path, monkeypatch):
+    db = JsonFileDB(cache_dir=str(tmp_path))
+    db.save_metadata(HASH, {"status": "processing", "idmo": {"technical_metadata": {"rows": 3}}})
+    first = db.get_metadata(HASH)
+    first["scratch"] = True  # callers mutating the result must not poison the cache
+    first["idmo"]["technical_metadata"]["rows"] = 0  # nested sections included
+
+    def fail_open(*args, **kwargs):
+        raise AssertionError("cached read should not touch the file")
+
+    monkeypatch.setattr("builtins.open", fail_open)
+    cached = db.get_metadata(HASH)
+    assert "scratch" not in cached and cached["idmo"]["technical_metadata"]["rows"] == 3
+    monkeypatch.undo()
+
+    # Another process (e.g. a Celery worker) finishes the job
+    other = JsonFileDB(cache_dir=str(tmp_path))
+    other.save_metadata(HASH, {"status": "success", "padding": "x" * 10})
+    assert db.get_metadata(HASH)["status"] == "success"
+
+
+def test_json_db_reads_legacy_flat_layout(tmp_path):
+    with open(tmp_path / f"{HASH}.json", "w", encoding="utf-8") as f:
+        json.dump({"status": "success"}, f, indent=4)
+    db = JsonFileDB(cache_dir=str(tmp_path))
+    assert db.get_metadata(HASH)["status"] == "success"
+
+    db.save_metadata(HASH, {"status": "error"})
+    assert not (tmp_path / f"{HASH}.json").exists()
+    assert db.get_metadata(HASH)["status"] == "error"
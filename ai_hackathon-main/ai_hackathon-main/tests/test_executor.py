@@ -0,0 +1,74 @@
+import sys
+import os
+import time
+
+import pytest
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(project_root)
+os.chdir(project_root)
+
+from concurrent.futures.process import BrokenProcessPool
+
+from services.executor import LocalJobExecutor, QueueFullError
+
+
+def test_local_executor_bounds_queue_and_reports_depth():
+    executor = LocalJobExecutor(max_workers=1, max_queue=1, max_tasks_per_child=0)
+    try:
+        first = executor.submit(time.sleep, 1)
+        executor.submit(time.sleep, 0)
+        assert executor.is_full()
+        stats = executor.stats()
+        assert stats["running"] == 1 and stats["queued"] == 1
+
+        with pytest.raises(QueueFullError) as exc_info:
+            executor.submit(time.sleep, 0)
+        assert exc_info.value.retry_after >= 1
+
+        first.result(timeout=60)
+        deadline = time.time() + 60
+        while executor.is_full() and time.time() < deadline:
+            time.sleep(0.05)
+        assert executor.submit(time.sleep, 0).result(timeout=60) is None
+    finally:
+        executor.shutdown()
+
+
+def test_local_executor_reports_failures():
+    failures = []
+    executor = LocalJobExecutor(max_workers=1, max_queue=0, max_tasks_per_child=0,
+                                on_failure=lambda args, exc: failures.append(args))
+    try:
+        future = executor.submit(time.sleep, -1)  # ValueError in the worker
+        with pytest.raises(ValueError):
+            future.result(timeout=60)
+        deadline = time.time() + 5
+        while not failures and time.time() < deadline:
+            time.sleep(0.05)
+        assert failures == [(-1,)]
+        assert executor.stats()["failed"] == 1
+    finally:
+        executor.shutdown()
+
+
+def test_local_executor_replaces_a_broken_pool_once():
+    executor = LocalJobExecutor(max_workers=1, max_queue=1, max_tasks_per_child=0)
+    try:
+        broken = executor._get_pool()
+        crashed = executor.submit(os._exit, 1)  # the worker dies mid-job
+        with pytest.raises(BrokenProcessPool):
+            crashed.result(timeout=60)
+        deadline = time.time() + 5
+        while executor._pool is broken and time.time() < deadline:
+            time.sleep(0.05)
+        assert executor._pool is None
+
+        replacement = executor._get_pool()
+        assert executor.submit(time.sleep, 0).result(timeout=60) is None
+        # A late failure reported by the old pool leaves the new one alone
+        with executor._lock:
+            executor._discard_pool(broken)
+        assert executor._pool is replacement
+    finally:
+        executor.shutdown()
@@ -0,0 +1,63 @@
+import sys
+import os
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(project_root)
+os.chdir(project_root)
+
+import pytest
+
+pa = pytest.importorskip("pyarrow")
+import pyarrow.parquet as pq
+import pyarrow.ipc as pa_ipc
+
+from services import exports
+from services.storage import LocalStorage
+
+SCHEMA = [
+    {"column": "Dist_nm", "standardized_header": "District_Name", "type": "String"},
+    {"column": "pop_2011", "standardized_header": "Population_2011", "type": "Int"},
+    {"column": "lit_rate", "standardized_header": "Literacy_Rate", "type": "Float"},
+]
+CSV = "Dist_nm,pop_2011,lit_rate,notes\nPune,\"9,429,408\",86.15,a\nNagpur,unknown,88.39,\nThane,11060148,,c\n"
+
+
+def test_typed_parquet_in_chunks(tmp_path, monkeypatch):
+    monkeypatch.setattr(exports, "EXPORT_CHUNK_ROWS", 2)  # 3 rows -> 2 chunks, one writer
+    src = tmp_path / "d.csv"
+    src.write_text(CSV)
+    out = tmp_path / "d.parquet"
+    stats = exports.write_columnar(str(src), ".csv", SCHEMA, "parquet", str(out))
+
+    table = pq.read_table(out)
+    assert table.schema.names == ["District_Name", "Population_2011", "Literacy_Rate", "notes"]
+    assert table.schema.field("Population_2011").type == pa.int64()
+    assert table.schema.field("Literacy_Rate").type == pa.float64()
+    assert table.column("Population_2011").to_pylist() == [9429408, None, 11060148]
+    assert table.column("Literacy_Rate").to_pylist() == [86.15, 88.39, None]
+    assert stats == {"rows": 3, "coerced_to_null": {"Population_2011": 1}}
+
+
+def test_export_is_cached_per_hash_and_schema(tmp_path):
+    storage = LocalStorage(base_dir=str(tmp_path / "store"))
+    file_hash = "ef" * 32
+    storage.save(CSV.encode(), f"{file_hash}.csv")
+
+    first, second = tmp_path / "1.arrow", tmp_path / "2.arrow"
+    assert exports.build_export(storage, file_hash, f"{file_hash}.csv", SCHEMA, "arrow", str(first)) is False
+    storage.delete(f"{file_hash}.csv")  # a hit must not need the source any more
+    assert exports.build_export(storage, file_hash, f"{file_hash}.csv", SCHEMA, "arrow", str(second)) is True
+    assert pa_ipc.open_file(str(second)).read_all().num_rows == 3
+
+    # Re-harmonized with different types: a new export, not the stale one
+    retyped = [dict(SCHEMA[1], type="Float")]
+    assert exports.export_key(file_hash, "arrow", retyped) != exports.export_key(file_hash, "arrow", SCHEMA)
+
+
+def test_dates_are_read_day_first():
+    pd = pytest.importorskip("pandas")
+    plan = [{"source": "d", "name": "d", "kind": "date"}]
+    df = pd.DataFrame({"d": ["04/03/2021", "25/12/2020", "2021-03-04", "n/a", None]}, dtype=object)
+    dates = exports.cast_chunk(df, plan)["d"]
+    assert [d.date().isoformat() if not pd.isna(d) else None for d in dates] == [
+        "2021-03-04", "2020-12-25", "2021-03-04", None, None]
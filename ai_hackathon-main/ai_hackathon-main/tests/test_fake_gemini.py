@@ -0,0 +1,93 @@
+import sys
+import os
+import json
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(project_root)
+os.chdir(project_root)
+
+import pytest
+from fastapi.testclient import TestClient
+
+from fake_gemini import FakeGemini, create_app, sample_latency
+
+CONFIG = {
+    "seed": 1,
+    "models": ["gemini-1.5-flash", "gemini-1.5-pro"],
+    "defaults": {"latency_ms": 0, "error_latency_ms": 0},
+    "per_model": {"gemini-1.5-flash": {"rate_429": 1.0}, "gemini-1.5-pro": {"rate_malformed": 1.0}},
+}
+
+
+def test_fault_injection_in_the_gemini_rest_shapes():
+    client = TestClient(create_app(FakeGemini(CONFIG)))
+    assert [m["name"] for m in client.get("/v1beta/models").json()["models"]] == [
+        "models/gemini-1.5-flash", "models/gemini-1.5-pro"]
+
+    prompt = {"contents": [{"role": "user", "parts": [{"text": "- Headers: ['District (Type: object, Unique: [])']"}]}]}
+    limited = client.post("/v1beta/models/gemini-1.5-flash:generateContent", json=prompt)
+    assert limited.status_code == 429 and limited.json()["error"]["status"] == "RESOURCE_EXHAUSTED"
+    malformed = client.post("/v1beta/models/gemini-1.5-pro:generateContent", json=prompt)
+    text = malformed.json()["candidates"][0]["content"]["parts"][0]["text"]
+    with pytest.raises(ValueError):
+        json.loads(text.removeprefix("```json\n"))
+    assert client.post("/v1beta/models/gemini-9:generateContent", json=prompt).status_code == 404
+
+    # Valid answers carry a schema for the prompt's spreadsheet columns
+    client.post("/_fake/config", json={"models": ["gemini-1.5-pro"], "defaults": {"latency_ms": 0}})
+    answer = client.post("/v1beta/models/gemini-1.5-pro:generateContent", json=prompt).json()
+    schema = json.loads(answer["candidates"][0]["content"]["parts"][0]["text"])["technical_metadata"]["schema_details"]
+    assert schema[0]["column"] == "District"
+    assert client.get("/_fake/stats").json()["models"] == {"gemini-1.5-pro": {"ok": 1}}
+    assert client.post("/_fake/config", json={"defaults": {"rate_typo": 1}}).status_code == 400
+
+
+def test_quotas_and_latency_distributions():
+    fake = FakeGemini({"models": ["m"], "defaults": {"max_concurrent": 1, "rpm": 2}})
+    assert fake.choose("m") == "ok"
+    fake.in_flight["m"] = 1
+    assert fake.choose("m") == "429_quota"
+    fake.in_flight["m"] = 0
+    assert [fake.choose("m"), fake.choose("m")] == ["ok", "429_quota"]  # third request in the minute
+
+    rng = fake.rng
+    assert sample_latency(250, rng) == 0.25
+    assert 1.0 <= sample_latency({"min": 1000, "max": 2000}, rng) <= 2.0
+    draws = sorted(sample_latency({"median": 100, "p95": 400}, rng) for _ in range(2000))
+    assert 0.08 < draws[1000] < 0.12 and 0.3 < draws[1900] < 0.5
+
+
+def test_real_client_against_a_served_fake(monkeypatch):
+    import socket
+    import threading
+    import time
+    import uvicorn
+    import pdf_service.metadata_generator as metadata_generator
+
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    fake = FakeGemini({"seed": 1, "models": ["gemini-1.5-flash", "gemini-1.5-pro", "gemini-embedding-001"],
+                       "defaults": {"latency_ms": 0, "error_latency_ms": 0},
+                       "per_model": {"gemini-1.5-pro": {"rate_429": 1.0}}})
+    server = uvicorn.Server(uvicorn.Config(create_app(fake), host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    try:
+        deadline = time.time() + 10
+        while not server.started and time.time() < deadline:
+            time.sleep(0.05)
+        client = metadata_generator.make_client("fake", base_url=f"http://127.0.0.1:{port}")
+        monkeypatch.setattr(metadata_generator, "client", client)
+        monkeypatch.setattr(metadata_generator, "_llm_slots", None)
+
+        assert metadata_generator.get_prioritized_models(client) == ["models/gemini-1.5-flash", "models/gemini-1.5-pro"]
+        prompt = "- Headers: ['District (Type: object, Unique: [])']"
+        answer = metadata_generator.generate_metadata_with_retry("gemini-1.5-flash", prompt)
+        assert json.loads(answer.text)["technical_metadata"]["schema_details"][0]["column"] == "District"
+        # A 429 from the fake goes through the client's error type into the backoff path
+        assert metadata_generator.generate_metadata_with_retry("gemini-1.5-pro", prompt, max_retries=1) is None
+        assert fake.stats["gemini-1.5-flash"] == {"ok": 1} and fake.stats["gemini-1.5-pro"] == {"429": 1}
+    finally:
+        server.should_exit = True
+        thread.join(timeout=10)
@@ -0,0 +1,59 @@
+import sys
+import os
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(project_root)
+os.chdir(project_root)
+
+from fastapi.testclient import TestClient
+
+import api
+from services.database import JsonFileDB
+from services.storage import LocalStorage
+
+HASH = "e" * 64
+
+
+def test_finished_results_revalidate_with_304(tmp_path, monkeypatch):
+    db = JsonFileDB(cache_dir=str(tmp_path / "cache"))
+    storage = LocalStorage(base_dir=str(tmp_path / "uploads"))
+    monkeypatch.setattr(api, "db", db)
+    monkeypatch.setattr(api, "storage", storage)
+    client = TestClient(api.app)
+
+    db.save_metadata(HASH, {"status": "processing", "file_hash": HASH})
+    polling = client.get(f"/status/{HASH}")
+    assert polling.headers["cache-control"] == "no-cache" and "etag" not in polling.headers
+
+    with open(tmp_path / "src.csv", "w") as f:
+        f.write("a,b\n1,2\n")
+    with open(tmp_path / "src.csv", "rb") as f:
+        storage.save_stream(f, f"{HASH}.csv")
+    db.save_metadata(HASH, {"status": "success", "file_hash": HASH, "original_filename": "src.csv",
+                            "completed_at": "2026-01-01T00:00:00.000000"})
+    done = client.get(f"/status/{HASH}")
+    etag = done.headers["etag"]
+    # Same URL may later serve a reprocessed record: cacheable, but revalidated on every use
+    assert etag.startswith('W/"') and done.headers["cache-control"] == "no-cache"
+    revalidated = client.get(f"/status/{HASH}", headers={"If-None-Match": f'W/"other", {etag}'})
+    assert revalidated.status_code == 304 and revalidated.content == b"" and revalidated.headers["etag"] == etag
+
+    download = client.get(f"/download-harmonized/{HASH}")
+    assert download.status_code == 200 and download.headers["etag"] not in (etag, None)
+    assert download.headers["cache-control"] == "no-cache"
+    # Naming the record version makes the URL immutable
+    versioned = client.get(f"/download-harmonized/{HASH}?v=2026-01-01T00:00:00.000000")
+    assert "immutable" in versioned.headers["cache-control"]
+    assert versioned.headers["etag"] == download.headers["etag"]
+    storage.delete(f"{HASH}.csv")  # a 304 never reads storage
+    assert client.get(f"/download-harmonized/{HASH}",
+                      headers={"If-None-Match": download.headers["etag"]}).status_code == 304
+
+    # Reprocessing the hash is a new record version: revalidation returns the new body with a
+    # new ETag, and the old versioned URL is no longer immutable
+    db.save_metadata(HASH, {"status": "success", "file_hash": HASH, "completed_at": "2026-02-01T00:00:00.000000"})
+    changed = client.get(f"/status/{HASH}", headers={"If-None-Match": etag})
+    assert changed.status_code == 200 and changed.headers["etag"] != etag
+    assert changed.json()["completed_at"] == "2026-02-01T00:00:00.000000"
+    stale = client.get(f"/results/{HASH}/pages?v=2026-01-01T00:00:00.000000")
+    assert stale.status_code == 200 and stale.headers["cache-control"] == "no-cache"
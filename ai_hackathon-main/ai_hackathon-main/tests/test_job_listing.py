@@ -0,0 +1,66 @@
+import sys
+import os
+
+import pytest
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(project_root)
+os.chdir(project_root)
+
+from services.database import JsonFileDB, PostgresDB, SQLALCHEMY_AVAILABLE
+
+
+def _fill(db):
+    for i in range(7):
+        file_hash = f"{i:064x}"
+        db.claim_job(file_hash, {"status": "processing", "file_hash": file_hash, "original_filename": f"Report_{i}.pdf"
+                                 if i % 2 else f"crops_{i}.csv", "task_type": "pdf" if i % 2 else "harmonize", "size": 100 * i})
+        # Final results do not repeat task_type/size; the listing keeps them
+        db.save_metadata(file_hash, {"status": "error" if i == 3 else "success", "file_hash": file_hash,
+                                     "original_filename": f"Report_{i}.pdf" if i % 2 else f"crops_{i}.csv"})
+
+
+def _check_listing(db):
+    _fill(db)
+    seen, cursor = [], None
+    while True:
+        page = db.list_jobs(limit=3, cursor=cursor)
+        seen += [item["file_hash"] for item in page["items"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert seen == [f"{i:064x}" for i in reversed(range(7))]
+
+    pdfs = db.list_jobs(task_type="pdf")["items"]
+    assert [item["size"] for item in pdfs] == [500, 300, 100]
+    assert db.list_jobs(status="error")["items"][0]["original_filename"] == "Report_3.pdf"
+    assert [item["original_filename"] for item in db.list_jobs(filename="report_", status="success")["items"]] == [
+        "Report_5.pdf", "Report_1.pdf"]
+    assert db.list_jobs(filename="%")["items"] == []
+
+    db.delete_metadata(f"{6:064x}")
+    assert db.list_jobs(limit=1)["items"][0]["file_hash"] == f"{5:064x}"
+    with pytest.raises(ValueError):
+        db.list_jobs(cursor="not-a-cursor")
+
+    # Lease heartbeats of a running job do not move it to the top of the listing
+    running = f"{2:064x}"
+    db.save_metadata(running, {"status": "processing", "file_hash": running})
+    listed = db.list_jobs(limit=50)["items"]
+    db.renew_lease(running, {"status": "processing", "file_hash": running, "lease": {"owner": "w"}})
+    assert db.list_jobs(limit=50)["items"] == listed
+    assert db.get_metadata(running)["lease"] == {"owner": "w"}
+
+
+def test_json_db_job_listing(tmp_path):
+    db = JsonFileDB(cache_dir=str(tmp_path))
+    _check_listing(db)
+    # A missing index file is rebuilt from the records on startup
+    os.remove(tmp_path / "jobs_index.db")
+    rebuilt = JsonFileDB(cache_dir=str(tmp_path))
+    assert len(rebuilt.list_jobs(limit=50)["items"]) == 6
+
+
+@pytest.mark.skipif(not SQLALCHEMY_AVAILABLE, reason="SQLAlchemy not installed")
+def test_sql_db_job_listing(tmp_path):
+    _check_listing(PostgresDB(f"sqlite:///{tmp_path / 'meta.db'}"))
@@ -0,0 +1,87 @@
+import sys
+import os
+import time
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(project_root)
+os.chdir(project_root)
+
+from services.database import JsonFileDB
+from services.leases import LeaseKeeper, new_lease, lease_is_live
+
+
+def _job(file_hash, ttl, now=None):
+    return {"status": "processing", "file_hash": file_hash, "lease": new_lease("test", ttl, now)}
+
+
+def test_claim_coalesces_live_job_and_requeues_expired(tmp_path):
+    db = JsonFileDB(cache_dir=str(tmp_path))
+    file_hash = "ab" * 32
+
+    assert db.claim_job(file_hash, _job(file_hash, 60)) is None
+    existing = db.claim_job(file_hash, _job(file_hash, 60))
+    assert existing is not None and lease_is_live(existing)
+
+    # Worker died: lease ran out, so the next claim takes over
+    db.save_metadata(file_hash, _job(file_hash, 60, now=time.time() - 120))
+    assert db.claim_job(file_hash, _job(file_hash, 60)) is None
+
+    # Legacy "processing" records without a lease count as stale; errors re-queue too
+    db.save_metadata(file_hash, {"status": "processing", "file_hash": file_hash})
+    assert db.claim_job(file_hash, _job(file_hash, 60)) is None
+    db.save_metadata(file_hash, {"status": "error", "file_hash": file_hash})
+    assert db.claim_job(file_hash, _job(file_hash, 60)) is None
+    assert not os.path.exists(db._path(file_hash) + ".lock")
+
+
+def test_claim_lock_of_a_dead_process_is_broken_at_once(tmp_path, monkeypatch):
+    import socket
+    import subprocess
+    import pytest
+    import services.database as database
+
+    db = JsonFileDB(cache_dir=str(tmp_path))
+    file_hash = "ef" * 32
+    lock_path = db._path(file_hash) + ".lock"
+    os.makedirs(os.path.dirname(lock_path), exist_ok=True)
+    crashed = subprocess.Popen([sys.executable, "-c", ""])
+    crashed.wait()
+    with open(lock_path, "w") as f:
+        f.write(f"{socket.gethostname()}:{crashed.pid}")
+    started = time.monotonic()
+    assert db.claim_job(file_hash, _job(file_hash, 60)) is None
+    assert time.monotonic() - started < 1
+
+    # A live owner keeps its lock; waiters give up (the API answers 503) before it turns stale
+    with open(lock_path, "w") as f:
+        f.write(f"{socket.gethostname()}:{os.getpid()}")
+    monkeypatch.setattr(database, "JOB_LOCK_WAIT_SECONDS", 0.2)
+    with pytest.raises(TimeoutError):
+        db.claim_job(file_hash, _job(file_hash, 60))
+
+
+def test_lease_keeper_heartbeats_until_exit(tmp_path):
+    db = JsonFileDB(cache_dir=str(tmp_path), lru_size=0)
+    file_hash = "cd" * 32
+    db.save_metadata(file_hash, _job(file_hash, 1))
+
+    with LeaseKeeper(db, file_hash, ttl=5, interval=0.05):
+        first = db.get_metadata(file_hash)["lease"]["heartbeat_at"]
+        time.sleep(0.3)
+        assert db.get_metadata(file_hash)["lease"]["heartbeat_at"] > first
+    db.save_metadata(file_hash, {"status": "success", "file_hash": file_hash})
+
+    time.sleep(0.2)
+    record = db.get_metadata(file_hash)
+    assert record["status"] == "success" and "lease" not in record
+
+
+def test_lease_keeper_hands_off_with_the_queue_ttl(tmp_path):
+    db = JsonFileDB(cache_dir=str(tmp_path), lru_size=0)
+    file_hash = "12" * 32
+    db.save_metadata(file_hash, _job(file_hash, 1))
+
+    # A PDF stage hands the job to finalize, which may sit in a queue with no heartbeat
+    with LeaseKeeper(db, file_hash, ttl=5, interval=10, handoff_ttl=900):
+        assert db.get_metadata(file_hash)["lease"]["expires_at"] < time.time() + 10
+    assert db.get_metadata(file_hash)["lease"]["expires_at"] > time.time() + 800
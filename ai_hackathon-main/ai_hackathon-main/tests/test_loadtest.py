@@ -0,0 +1,64 @@
+import sys
+import os
+import argparse
+
+import pytest
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(project_root)
+os.chdir(project_root)
+
+from loadtest import StepStats, make_csv, parse_mix, percentile
+
+
+def test_percentiles_mix_and_step_summary():
+    samples = [float(i) for i in range(1, 101)]
+    assert (percentile(samples, 50), percentile(samples, 95), percentile(samples, 99)) == (50.0, 95.0, 99.0)
+    assert percentile([], 50) is None
+
+    assert parse_mix("csv=8, PDF=2") == {"csv": 8, "pdf": 2}
+    with pytest.raises(argparse.ArgumentTypeError):
+        parse_mix("docx=1")
+
+    # Every generated file is distinct content, so no upload is served from cache
+    assert make_csv(3) != make_csv(3)
+
+    stats = StepStats(concurrency=4)
+    stats.complete = [1.0, 2.0, 3.0]
+    for status in ("success", "success", "error"):
+        stats.outcome(status)
+    stats.finish()
+    summary = stats.summary()
+    assert summary["jobs"] == 3 and summary["outcomes"] == {"error": 1, "success": 2}
+    assert summary["time_to_complete_s"]["p50"] == 2.0
+    assert "errors 1" in stats.line()
+
+
+def test_in_process_run_completes_a_job(tmp_path, monkeypatch):
+    import asyncio
+    import api
+    import harmonizer
+    import loadtest
+    import pdf_service.metadata_generator as metadata_generator
+    import pdf_service.orchestrator as orchestrator
+    from services.database import JsonFileDB
+    from services.storage import LocalStorage
+
+    # Restore everything the stub patches; jobs use the relative default dirs, so run in tmp_path
+    for module, name in ((harmonizer, "get_aikosh_metadata"), (metadata_generator, "generate_metadata"),
+                         (orchestrator, "generate_metadata"), (api, "run_local_job")):
+        monkeypatch.setattr(module, name, getattr(module, name))
+    monkeypatch.delenv("GEMINI_BASE_URL", raising=False)
+    monkeypatch.setattr(loadtest, "LOADTEST_LLM_LATENCY", 0)
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(api, "db", JsonFileDB(cache_dir=str(tmp_path / "outputs" / "cache")))
+    monkeypatch.setattr(api, "storage", LocalStorage(base_dir=str(tmp_path / "uploads")))
+    monkeypatch.setattr(api, "USE_CELERY", False)
+    monkeypatch.setattr(api, "local_executor", None)  # LOCAL_WORKERS=0: BackgroundTasks in-process
+
+    args = argparse.Namespace(url=None, concurrency=[1], jobs=1, duration=0, mix="csv=1", csv_rows=5, pdf_pages=1,
+                              poll_interval=0.01, timeout=60, download=True, warmup=0, json=None)
+    [step] = asyncio.run(loadtest.run(args))
+    # A failed download would be counted as "download_error" instead of "success"
+    assert step["outcomes"] == {"success": 1} and step["download_s"]["p50"] is not None
+    assert step["upload_s"] is None  # includes processing in this mode, so not reported
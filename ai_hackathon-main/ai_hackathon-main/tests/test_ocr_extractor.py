@@ -0,0 +1,74 @@
+import sys
+import os
+
+import tracemalloc
+
+import fitz
+import numpy as np
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(project_root)
+os.chdir(project_root)
+
+from pdf_service.ocr_extractor import plan_render, pixmap_to_array, _ocr_page
+
+MB = 1024 * 1024
+
+
+class _RecordingReader:
+    """Stands in for easyocr.Reader: records the image shapes it is given."""
+
+    def __init__(self):
+        self.shapes = []
+
+    def readtext(self, image, detail=0, paragraph=True):
+        self.shapes.append(image.shape)
+        return [f"tile{len(self.shapes)}"]
+
+
+def test_plan_keeps_small_pages_whole_and_splits_huge_ones():
+    a4 = plan_render(595, 842, budget_bytes=128 * MB, dpi=150, min_dpi=100, grayscale=True)
+    assert (a4["dpi"], a4["rows"], a4["cols"]) == (150, 1, 1)
+
+    a0 = plan_render(2384, 3370, budget_bytes=24 * MB, dpi=150, min_dpi=100, grayscale=True)
+    assert a0["dpi"] == 100
+    assert a0["rows"] * a0["cols"] > 1
+    assert a0["est_bytes"] <= 24 * MB
+
+    rgb = plan_render(2384, 3370, budget_bytes=24 * MB, dpi=150, min_dpi=100, grayscale=False)
+    assert rgb["rows"] * rgb["cols"] > a0["rows"] * a0["cols"]
+
+
+def test_ocr_page_renders_grayscale_tiles_within_budget(monkeypatch):
+    import pdf_service.ocr_extractor as ocr
+    monkeypatch.setattr(ocr, "OCR_MEMORY_BUDGET_MB", 4)
+    monkeypatch.setattr(ocr, "OCR_GRAYSCALE", True)
+
+    doc = fitz.open()
+    page = doc.new_page(width=1684, height=2384)  # A1
+    reader = _RecordingReader()
+    stats = {"peak_pixmap_bytes": 0, "peak_estimated_bytes": 0, "min_dpi": None, "tiled_pages": 0}
+
+    text = _ocr_page(reader, page, stats)
+    doc.close()
+
+    assert len(reader.shapes) > 1 and text.startswith("tile1")
+    assert all(len(shape) == 2 for shape in reader.shapes)  # single-channel
+    assert stats["tiled_pages"] == 1
+    assert stats["peak_estimated_bytes"] <= 4 * MB
+
+
+def test_pixmap_to_array_is_a_zero_copy_view():
+    doc = fitz.open()
+    page = doc.new_page()
+    page.insert_text((72, 72), "zero copy")
+    for colorspace, ndim in ((fitz.csGRAY, 2), (fitz.csRGB, 3)):
+        pix = page.get_pixmap(dpi=100, colorspace=colorspace, alpha=False)
+        tracemalloc.start()
+        arr = pixmap_to_array(pix)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        assert arr.ndim == ndim and arr.dtype == np.uint8
+        assert peak < len(pix.samples_mv) / 100
+        assert arr.tobytes() == pix.samples
+    doc.close()
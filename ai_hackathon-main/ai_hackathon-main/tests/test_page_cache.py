@@ -0,0 +1,40 @@
+import sys
+import os
+
+import fitz
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(project_root)
+os.chdir(project_root)
+
+import pdf_service.page_cache as page_cache
+from pdf_service.page_cache import hash_pages
+from pdf_service.orchestrator import run_text_stage
+
+
+def _make_pdf(path, texts):
+    doc = fitz.open()
+    for text in texts:
+        doc.new_page().insert_text((72, 72), text)
+    doc.save(str(path))
+    doc.close()
+    return str(path)
+
+
+def test_only_changed_pages_are_reextracted(tmp_path, monkeypatch):
+    monkeypatch.setattr(page_cache, "PAGE_CACHE_DIR", str(tmp_path / "page_cache"))
+    monkeypatch.setattr(page_cache, "PAGE_CACHE_ENABLED", True)
+    texts = [f"Section {n}: rainfall by district for the monsoon season" for n in range(1, 5)]
+    original = _make_pdf(tmp_path / "v1.pdf", texts)
+    reissued = _make_pdf(tmp_path / "v2.pdf", texts[:2] + ["Section 3: corrected rainfall figures"] + texts[3:])
+
+    v1, v2 = hash_pages(original), hash_pages(reissued)
+    assert [v1[n] == v2[n] for n in range(1, 5)] == [True, True, False, True]
+
+    first = run_text_stage(original)
+    assert first["page_cache"]["text"] == {"hits": 0, "lookups": 4}
+
+    second = run_text_stage(reissued)
+    assert second["page_cache"]["text"] == {"hits": 3, "lookups": 4}
+    assert [p["text"] for p in second["pages"]][2].startswith("Section 3: corrected")
+    assert [p["page"] for p in second["pages"]] == [1, 2, 3, 4]
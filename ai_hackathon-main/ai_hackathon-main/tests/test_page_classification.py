@@ -0,0 +1,66 @@
+import sys
+import os
+
+import fitz
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(project_root)
+os.chdir(project_root)
+
+from pdf_service.detector import classify_pages, detect_pdf_type
+from pdf_service.text_extractor import extract_text
+
+
+def _make_pdf(path, kinds):
+    doc = fitz.open()
+    pix = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 20, 20), False)
+    for n, kind in enumerate(kinds, start=1):
+        page = doc.new_page()
+        if kind == "scanned":
+            page.insert_image(page.rect, pixmap=pix)
+        else:
+            page.insert_text((72, 72), f"Annual report page {n} with district statistics")
+    doc.save(str(path))
+    doc.close()
+    return str(path)
+
+
+def test_mixed_document_gets_a_per_page_map(tmp_path):
+    path = _make_pdf(tmp_path / "mixed.pdf", ["digital", "digital", "scanned", "digital", "scanned"])
+    result = classify_pages(path)
+    assert result["pdf_type"] == "mixed"
+    assert [n for n, kind in result["pages"].items() if kind == "scanned"] == [3, 5]
+    assert detect_pdf_type(path) == "digital"
+
+    pages = extract_text(path, pages=[1, 2, 4])
+    assert [p["page"] for p in pages] == [1, 2, 4]
+
+
+def test_large_uniform_document_stops_early(tmp_path):
+    path = _make_pdf(tmp_path / "scan.pdf", ["scanned"] * 60)
+    result = classify_pages(path)
+    assert result["pdf_type"] == "scanned" and result["sampled"]
+    assert result["inspected"] < 60
+    assert len(result["pages"]) == 60 and set(result["pages"].values()) == {"scanned"}
+
+
+def test_large_document_with_one_scanned_annex_is_fully_classified(tmp_path):
+    kinds = ["digital"] * 59 + ["scanned"]
+    path = _make_pdf(tmp_path / "annex.pdf", kinds)
+    result = classify_pages(path)
+    assert result["pdf_type"] == "mixed" and not result["sampled"]
+    assert result["pages"][60] == "scanned"
+
+
+def test_image_pages_among_extrapolated_digital_labels_are_flagged_for_ocr(tmp_path, monkeypatch):
+    import pdf_service.detector as detector
+    monkeypatch.setattr(detector, "DETECT_SAMPLE_MIN_PAGES", 10)
+    monkeypatch.setattr(detector, "DETECT_CONFIDENCE", 0.5)  # 6 unanimous samples are enough
+    kinds = ["digital"] * 40
+    kinds[6] = "scanned"  # 0-based page 6 is not among the first samples
+    path = _make_pdf(tmp_path / "sampled.pdf", kinds)
+    result = classify_pages(path)
+    assert result["sampled"] and result["pages"][7] == "digital" and 7 in result["provisional"]
+
+    pages = extract_text(path)
+    assert [p["page"] for p in pages if p.get("needs_ocr")] == [7]
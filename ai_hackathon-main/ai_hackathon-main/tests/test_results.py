@@ -0,0 +1,58 @@
+import sys
+import os
+import json
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(project_root)
+os.chdir(project_root)
+
+from services.storage import LocalStorage
+from services.results import offload_pdf_payload, get_pages, get_tables, PAGE_CHUNK_SIZE
+
+
+def test_offloaded_pdf_record_is_slim_and_paginates(tmp_path):
+    storage = LocalStorage(base_dir=str(tmp_path))
+    n_pages = PAGE_CHUNK_SIZE * 2 + 7
+    result = {
+        "pdf_type": "digital",
+        "pages": [{"page": i + 1, "text": "lorem ipsum " * 200} for i in range(n_pages)],
+        "tables": [{"table_id": i, "page": 1, "data": [["a", "b"]] * 500} for i in range(3)],
+        "metadata": {"catalog_info": {"title": "Report"}},
+    }
+
+    record = offload_pdf_payload(storage, "abc", result)
+    assert "pages" not in record and "tables" not in record
+    assert record["page_count"] == n_pages
+    assert record["tables_index"][0]["n_rows"] == 500
+    assert len(json.dumps(record)) < 4096
+
+    window = get_pages(storage, record, offset=PAGE_CHUNK_SIZE - 2, limit=5)
+    assert [p["page"] for p in window["items"]] == list(range(PAGE_CHUNK_SIZE - 1, PAGE_CHUNK_SIZE + 4))
+    assert get_pages(storage, record, offset=n_pages - 1, limit=20)["items"][0]["page"] == n_pages
+    assert get_pages(storage, record, offset=n_pages + 5, limit=20)["items"] == []
+
+    tables = get_tables(storage, record, offset=1, limit=5)
+    assert tables["total"] == 3
+    assert [t["table_id"] for t in tables["items"]] == [1, 2]
+    assert "results/abc/table_00000.json" in storage.list("results/abc/")
+
+
+def test_compact_tables_round_trip_and_header_only_mapping(tmp_path):
+    import pandas as pd
+    from pdf_service.table_codec import clean_frame, encode_frame
+    from pdf_service.semantic_mapper import semantic_map
+
+    df = pd.DataFrame([[" District ", "Year", "Pop"], ["Pune\nCity", None, "9,429,408"], ["", "2011", float("nan")]])
+    table = {"table_id": 0, "page": 2, "whitespace": 10, **encode_frame(clean_frame(df))}
+    assert (table["n_rows"], table["n_cols"], table["header"]) == (3, 3, ["District", "Year", "Pop"])
+
+    # Mapping reads the header; a table without a grid proves the rows are never parsed
+    assert semantic_map([{k: v for k, v in table.items() if k != "csv"}])["column_mappings"]["Year"] == "temporal_year"
+
+    storage = LocalStorage(base_dir=str(tmp_path))
+    record = offload_pdf_payload(storage, "def", {"pages": [], "tables": [table]})
+    entry = record["tables_index"][0]
+    assert entry["ref"] == "results/def/table_00000.csv" and entry["n_rows"] == 3
+    item = get_tables(storage, record, offset=0, limit=5)["items"][0]
+    assert item["data"] == [["District", "Year", "Pop"], ["Pune\nCity", "", "9,429,408"], ["", "2011", ""]]
+    assert "csv" not in item and item["page"] == 2
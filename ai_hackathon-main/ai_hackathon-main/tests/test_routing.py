@@ -0,0 +1,52 @@
+import sys
+import os
+import io
+
+import fitz
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(project_root)
+os.chdir(project_root)
+
+from services.routing import classify_job, route_options, QUEUE_FAST, QUEUE_DIGITAL, QUEUE_OCR
+
+
+def _pdf(scanned: bool, pages: int = 1) -> io.BytesIO:
+    doc = fitz.open()
+    pix = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 20, 20), False)
+    for _ in range(pages):
+        page = doc.new_page()
+        if scanned:
+            page.insert_image(page.rect, pixmap=pix)
+        else:
+            page.insert_text((72, 72), "District wise crop production statistics for 2021-22. " * 6)
+    buf = io.BytesIO(doc.tobytes())
+    doc.close()
+    return buf
+
+
+def test_classify_job_by_type_size_and_content():
+    assert classify_job("harmonize", 10_000) == QUEUE_FAST
+    assert classify_job("harmonize", 50 * 1024 * 1024) == QUEUE_DIGITAL
+
+    digital = _pdf(scanned=False)
+    assert classify_job("pdf", len(digital.getvalue()), digital) == QUEUE_DIGITAL
+    assert digital.tell() == 0  # stream left where it was for the upload to storage
+
+    scanned = _pdf(scanned=True)
+    assert classify_job("pdf", len(scanned.getvalue()), scanned) == QUEUE_OCR
+
+    assert classify_job("pdf", 4, io.BytesIO(b"junk")) == QUEUE_DIGITAL
+    # Too large to open at dispatch: not read at all
+    assert classify_job("pdf", 10 ** 12, io.BytesIO(b"")) == QUEUE_OCR
+
+
+def test_route_options_carry_queue_time_limits():
+    opts = route_options(QUEUE_OCR)
+    assert opts["queue"] == QUEUE_OCR
+    assert opts["soft_time_limit"] < opts["time_limit"]
+    assert route_options(QUEUE_FAST)["time_limit"] < opts["time_limit"]
+
+    # PDF tables/finalize stay on the digital workers but keep an OCR-classified job's limits
+    tables = route_options(QUEUE_DIGITAL, limits_of=QUEUE_OCR)
+    assert tables["queue"] == QUEUE_DIGITAL and tables["time_limit"] == opts["time_limit"]
@@ -0,0 +1,69 @@
+import sys
+import os
+import io
+import pytest
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(project_root)
+os.chdir(project_root)
+
+moto = pytest.importorskip("moto")
+
+import services.storage as storage_module
+
+
+@pytest.fixture
+def s3_storage(monkeypatch):
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    monkeypatch.setenv("S3_BUCKET_NAME", "aikosh-test")
+    monkeypatch.setenv("S3_MULTIPART_THRESHOLD_MB", "5")
+    monkeypatch.setenv("S3_MULTIPART_CHUNK_MB", "5")
+    monkeypatch.setattr(storage_module, "_s3_client", None)
+    with moto.mock_aws():
+        storage = storage_module.S3Storage()
+        storage.s3.create_bucket(Bucket="aikosh-test")
+        yield storage
+
+
+def test_s3_multipart_upload_ranged_read_and_download(s3_storage, tmp_path):
+    content = os.urandom(1024) * (12 * 1024)  # 12MB -> 3 parts
+    s3_storage.save_stream(io.BytesIO(content), "big.pdf")
+
+    head = s3_storage.s3.head_object(Bucket="aikosh-test", Key="big.pdf")
+    assert "-" in head["ETag"]  # multipart ETags look like "<md5>-<parts>"
+    assert s3_storage.get_range("big.pdf", 100, 199) == content[100:200]
+
+    target = tmp_path / "big.pdf"
+    s3_storage.download_to("big.pdf", str(target))
+    assert target.read_bytes() == content
+    assert s3_storage.list("big") == ["big.pdf"]
+
+
+def test_s3_client_is_shared_per_process(s3_storage):
+    assert storage_module.S3Storage().s3 is s3_storage.s3
+
+
+def test_s3_compressed_stream_roundtrip(s3_storage, monkeypatch):
+    s3_storage.codec = "gzip"
+    content = b"state,district\n" + b"Maharashtra,Hingoli\n" * 5000
+    s3_storage.save_stream(io.BytesIO(content), "data.csv")
+    assert s3_storage.get("data.csv") == content
+    assert s3_storage.get_range("data.csv", 15, 34) == content[15:35]
+
+
+def test_s3_missing_keys_raise_file_not_found(s3_storage, tmp_path, monkeypatch):
+    from services.exports import PYARROW_AVAILABLE, build_export
+
+    with pytest.raises(FileNotFoundError):
+        s3_storage.download_to("gone.csv", str(tmp_path / "gone.csv"))
+    # Deleted between the HEAD and the ranged GETs: still a 404 for the API, not a raw ClientError
+    s3_storage.save(b"state\n", "gone.csv")
+    head = s3_storage.s3.head_object(Bucket="aikosh-test", Key="gone.csv")
+    s3_storage.delete("gone.csv")
+    monkeypatch.setattr(s3_storage.s3, "head_object", lambda **kwargs: head)
+    with pytest.raises(FileNotFoundError):
+        s3_storage.download_to("gone.csv", str(tmp_path / "gone.csv"))
+    if PYARROW_AVAILABLE:
+        with pytest.raises(FileNotFoundError):
+            build_export(s3_storage, "ab" * 32, "gone.csv", [], "parquet", str(tmp_path / "out.parquet"))
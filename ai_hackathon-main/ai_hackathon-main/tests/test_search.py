@@ -0,0 +1,68 @@
+import sys
+import os
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(project_root)
+os.chdir(project_root)
+
+from services.database import JsonFileDB
+from services.catalog import parse_temporal_range
+from services.search import SQLiteSearchIndex, reindex
+
+
+def _record(title, sector, jurisdiction, granularity, temporal, keywords=()):
+    return {
+        "status": "success",
+        "original_filename": f"{title.lower().replace(' ', '_')}.csv",
+        "catalog_info": {"title": title, "description": f"{title} statistics", "sector": sector, "keywords": list(keywords)},
+        "provenance": {"source": "Department of Agriculture", "jurisdiction": jurisdiction, "data_owner": "DoA"},
+        "spatial_temporal": {"temporal_range": temporal, "spatial_coverage": jurisdiction, "granularity": granularity},
+    }
+
+
+RECORDS = {
+    "a" * 64: _record("Crop Yield", "Agriculture", "Maharashtra", "District", "2016-2019", ["rabi", "kharif"]),
+    "b" * 64: _record("Crop Prices", "Agriculture", "Karnataka", "State", "2010-2012"),
+    "c" * 64: _record("Irrigation Wells", "Agriculture", "Maharashtra", "Village", "2021"),
+    "d" * 64: _record("School Enrolment", "Education", "Maharashtra", "District", "2015-2020"),
+}
+
+
+def test_search_filters_facets_and_ranking(tmp_path):
+    index = SQLiteSearchIndex(str(tmp_path / "search.db"))
+    for file_hash, record in RECORDS.items():
+        index.index(file_hash, record)
+
+    # "All Agriculture datasets for Maharashtra 2015-2020": temporal ranges overlap the window
+    result = index.search(filters={"sector": "agriculture", "jurisdiction": "MAHARASHTRA"}, year_from=2015, year_to=2020)
+    assert [item["title"] for item in result["items"]] == ["Crop Yield"]
+    # Each facet ignores its own filter, so the other sectors stay selectable
+    assert {f["value"]: f["count"] for f in result["facets"]["sector"]} == {"Agriculture": 1, "Education": 1}
+
+    # Prefix words over title, keywords and provenance; query syntax in user input is inert
+    assert [i["file_hash"] for i in index.search(q="crop kharif")["items"]] == ["a" * 64]
+    assert index.search(q='crop" (*')["total"] == 2
+    page = index.search(q="agri", offset=1, limit=2)
+    assert page["total"] == 4 and len(page["items"]) == 2
+
+    # Failed reprocessing or GC eviction removes the entry
+    index.update("a" * 64, {"status": "error"})
+    assert index.search(q="kharif")["total"] == 0
+
+
+def test_reindex_backfills_from_the_database(tmp_path):
+    db = JsonFileDB(cache_dir=str(tmp_path / "cache"))
+    for file_hash, record in RECORDS.items():
+        db.save_metadata(file_hash, record)
+    db.save_metadata("e" * 64, {"status": "processing", "file_hash": "e" * 64})
+    index = SQLiteSearchIndex(str(tmp_path / "search.db"))
+    assert reindex(db, index) == 4
+    assert index.search(filters={"granularity": "district"})["total"] == 2
+
+
+def test_fiscal_years_run_april_to_march():
+    assert parse_temporal_range("2011-12") == ("2011-04-01", "2012-03-31")
+    assert parse_temporal_range("2015-16") == ("2015-04-01", "2016-03-31")
+    assert parse_temporal_range("FY 2019-20") == ("2019-04-01", "2020-03-31")
+    assert parse_temporal_range("2015-2020") == ("2015-01-01", "2020-12-31")
+    assert parse_temporal_range("2011-12-05") == ("2011-12-05", "2011-12-05")  # an ISO date stays one
@@ -0,0 +1,43 @@
+import sys
+import os
+import json
+import subprocess
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(project_root)
+os.chdir(project_root)
+
+# Pipeline libraries that only workers need, and backends only loaded when configured
+# (DATABASE_URL, USE_CELERY); the API must not pay for them at startup
+HEAVY_MODULES = ["torch", "easyocr", "camelot", "pdfplumber", "fitz", "cv2", "pandas", "pyarrow",
+                 "google.genai", "harmonizer", "pdf_service.orchestrator", "sqlalchemy", "celery"]
+
+STARTUP_BUDGET_SECONDS = float(os.getenv("STARTUP_BUDGET_SECONDS", "1"))
+STARTUP_RSS_BUDGET_MB = float(os.getenv("STARTUP_RSS_BUDGET_MB", "250"))
+
+PROBE = """
+import sys, time, json, resource
+start = time.perf_counter()
+import api
+elapsed = time.perf_counter() - start
+try:
+    # Peak RSS of this image; ru_maxrss would include the parent's RSS from before exec
+    with open("/proc/self/status") as f:
+        rss_mb = next(int(l.split()[1]) for l in f if l.startswith("VmHWM:")) / 1024
+except OSError:
+    rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+print(json.dumps({"seconds": elapsed, "rss_mb": rss_mb,
+                  "loaded": [m for m in %r if m in sys.modules]}))
+""" % (HEAVY_MODULES,)
+
+
+def test_api_import_is_lean():
+    # Fresh interpreter: other tests have already imported (or mocked) the pipeline
+    env = {k: v for k, v in os.environ.items() if k not in ("DATABASE_URL", "USE_CELERY")}
+    out = subprocess.run([sys.executable, "-c", PROBE], cwd=project_root, env=env, capture_output=True,
+                         text=True, timeout=120, check=True).stdout
+    stats = json.loads(out.strip().splitlines()[-1])
+    print(f"API cold import: {stats['seconds']:.2f}s, peak RSS {stats['rss_mb']:.0f}MB")
+    assert stats["loaded"] == []
+    assert stats["seconds"] < STARTUP_BUDGET_SECONDS
+    assert stats["rss_mb"] < STARTUP_RSS_BUDGET_MB
@@ -0,0 +1,53 @@
+import sys
+import os
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(project_root)
+os.chdir(project_root)
+
+import synthesizer
+
+
+def _record(i, district, state, years, keywords):
+    return {
+        "catalog_info": {"title": f"Report {i}", "description": "", "sector": "Agriculture", "keywords": keywords},
+        "provenance": {"source": "Dept of Agriculture", "jurisdiction": state, "data_owner": ""},
+        "spatial_temporal": {"temporal_range": years, "spatial_coverage": district, "granularity": "District"},
+    }
+
+
+def test_merge_fields_is_deterministic():
+    merged = synthesizer.merge_fields([
+        _record(1, "Mumbai", "Maharashtra", "2015-2017", ["crops", "rainfall"]),
+        _record(2, "Pune", "Maharashtra", "2016-04-01 to 2020-03-31", ["Rainfall", "yield"]),
+    ])
+    assert merged["catalog_info"]["keywords"][0] == "rainfall"
+    assert set(merged["catalog_info"]["keywords"]) == {"rainfall", "crops", "yield"}
+    assert merged["spatial_temporal"]["temporal_range"] == "2015-01-01 to 2020-03-31"
+    assert merged["spatial_temporal"]["spatial_coverage"] == "Maharashtra"
+    assert merged["spatial_temporal"]["granularity"] == "State"
+
+
+def test_incremental_synthesis_reuses_cached_nodes(tmp_path, monkeypatch):
+    calls = []
+
+    def fake_llm(records, merged):
+        calls.append(len(records))
+        assert len(records) <= synthesizer.SYNTHESIS_FANOUT
+        return {"catalog_info": {"title": f"Collection of {len(records)}"}}
+
+    monkeypatch.setattr(synthesizer, "client", object())
+    monkeypatch.setattr(synthesizer, "SYNTHESIS_CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(synthesizer, "SYNTHESIS_FANOUT", 4)
+    monkeypatch.setattr(synthesizer, "_llm_synthesize", fake_llm)
+
+    records = [_record(i, f"District {i}", "Maharashtra", str(2000 + i), [f"kw{i}"]) for i in range(40)]
+    first = synthesizer.synthesize_metadata(records)
+    assert "error" not in first
+    assert first["spatial_temporal"]["temporal_range"] == "2000-01-01 to 2039-12-31"
+    full_calls = len(calls)
+
+    calls.clear()
+    second = synthesizer.synthesize_metadata(records + [_record(99, "Nagpur", "Maharashtra", "2041", ["new"])])
+    assert second["_synthesis"]["cache_hits"] > 0
+    assert len(calls) < full_calls
@@ -0,0 +1,76 @@
+import sys
+import os
+
+import fitz
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(project_root)
+os.chdir(project_root)
+
+import pdf_service.text_extractor as text_extractor
+
+
+def _make_pdf(path, pages, ruled_every=0):
+    doc = fitz.open()
+    for n in range(1, pages + 1):
+        page = doc.new_page()
+        page.insert_text((72, 72), f"Page {n} district statistics")
+        if ruled_every and n % ruled_every == 0:
+            for k in range(15):
+                page.draw_line((50, 100 + k * 20), (550, 100 + k * 20))
+    doc.save(str(path))
+    doc.close()
+    return str(path)
+
+
+def test_only_ruled_pages_count_as_complex(tmp_path):
+    path = _make_pdf(tmp_path / "ruled.pdf", 2, ruled_every=2)
+    with fitz.open(path) as doc:
+        assert not text_extractor._is_complex(doc[0], doc[0].get_text())
+        assert text_extractor._is_complex(doc[1], doc[1].get_text())
+
+
+def test_parallel_extraction_keeps_page_order(tmp_path, monkeypatch):
+    monkeypatch.setattr(text_extractor, "TEXT_ENGINE", "auto")
+    monkeypatch.setattr(text_extractor, "TEXT_PARALLEL_MIN_PAGES", 4)
+    monkeypatch.setattr(text_extractor, "TEXT_WORKERS", 3)
+    monkeypatch.setattr(text_extractor, "_cpu_count", lambda: 4)
+    path = _make_pdf(tmp_path / "long.pdf", 12, ruled_every=4)
+
+    pages = text_extractor.extract_text(path)
+    assert [p["page"] for p in pages] == list(range(1, 13))
+    assert all(p["text"].startswith(f"Page {p['page']} ") for p in pages)
+
+    subset = text_extractor.extract_text(path, pages=[2, 9, 40])
+    assert [p["page"] for p in subset] == [2, 9]
+
+
+def _extract_in_job_worker(path, cpus):
+    """Runs in a LocalJobExecutor child: extracts with `cpus` CPUs, reporting any page-range pool."""
+    started = []
+
+    class RecordingPool(text_extractor.ProcessPoolExecutor):
+        def __init__(self, max_workers, **kwargs):
+            started.append(max_workers)
+            super().__init__(max_workers=max_workers, **kwargs)
+
+    text_extractor._cpu_count = lambda: cpus
+    text_extractor.ProcessPoolExecutor = RecordingPool
+    text_extractor.TEXT_PARALLEL_MIN_PAGES = 4
+    text_extractor.TEXT_WORKERS = 3
+    pages = text_extractor._extract_pages(path, list(range(1, 13)), use_plumber=False)
+    return [p["page"] for p in pages], started
+
+
+def test_job_workers_extract_in_parallel_on_free_cpus(tmp_path):
+    from services.executor import LocalJobExecutor
+
+    path = _make_pdf(tmp_path / "long.pdf", 12)
+    assert text_extractor._jobs_sharing_cpus() == 1
+    for job_workers, parallel in ((1, [3]), (4, [])):  # 4 CPUs: free for one job, covered by four
+        executor = LocalJobExecutor(max_workers=job_workers, max_queue=0, max_tasks_per_child=0)
+        try:
+            pages, started = executor.submit(_extract_in_job_worker, path, 4).result(timeout=120)
+        finally:
+            executor.shutdown()
+        assert pages == list(range(1, 13)) and started == parallel
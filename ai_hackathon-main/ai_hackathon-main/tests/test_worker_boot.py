@@ -0,0 +1,26 @@
+import sys
+import os
+import gc
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(project_root)
+os.chdir(project_root)
+
+from services import worker_boot
+
+
+def test_preload_for_fast_queue_skips_pdf_and_ocr():
+    try:
+        stats = worker_boot.preload_pipeline(["fast"])
+    finally:
+        gc.unfreeze()
+    assert stats["preloaded"] == ["harmonize"]
+    assert "harmonizer" in sys.modules
+
+
+def test_memory_limit_is_baseline_plus_growth():
+    limit = worker_boot.memory_limit_kb(baseline_kb=500 * 1024)
+    if worker_boot.WORKER_MAX_MEMORY_GROWTH_MB > 0:
+        assert limit == (500 + worker_boot.WORKER_MAX_MEMORY_GROWTH_MB) * 1024
+    else:
+        assert limit is None